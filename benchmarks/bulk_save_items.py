@@ -0,0 +1,96 @@
+"""benchmarks/bulk_save_items.py
+
+Compare items-per-second of saving small items one at a time with save_item (the
+previous bulk_save_items implementation) against the batched INSERT path of
+bulk_save_items.
+
+Uses a throwaway SQLite database and POSIX storage directory by default; set
+TIDEPOOL_SQLITE_DB_CONNECTION_STRING to benchmark another database, e.g. Postgres,
+which is migrated with its own alembic configuration:
+
+    PYTHONPATH=. uv run python benchmarks/bulk_save_items.py --items 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from alembic import command as alembic_command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy.engine import make_url
+
+from tidepool import Item, TidepoolRepository
+from tidepool.settings.manager import settings
+
+ALEMBIC_CONFIGS = {
+    "sqlite": "tidepool/services/db/sqlite/alembic.ini",
+    "postgresql": "tidepool/services/db/postgres/alembic.ini",
+}
+
+
+def make_items(count: int, label: str) -> list[Item]:
+    return [
+        Item.from_data(
+            f"{label} {i}".encode(),
+            f"{label}-{i}.txt",
+            title=f"{label} {i}",
+        )
+        for i in range(count)
+    ]
+
+
+def use_throwaway_storage() -> None:
+    """Point the database and primary storage at a temporary directory, unless set."""
+    tmp_dir = tempfile.mkdtemp(prefix="tidepool-benchmark-")
+    if "TIDEPOOL_SQLITE_DB_CONNECTION_STRING" not in os.environ:
+        settings.update(
+            DATABASE_CONNECTION_URI=f"sqlite:///{os.path.join(tmp_dir, 'db.sqlite')}"
+        )
+    if "TIDEPOOL_POSIX_DATA_DIR" not in os.environ:
+        primary = settings.PRIMARY_STORAGE_SERVICE
+        settings.update(
+            PRIMARY_STORAGE_SERVICE={
+                **primary,
+                "config": {
+                    **primary["config"],
+                    "DATA_DIR": os.path.join(tmp_dir, "posix"),
+                },
+            }
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    use_throwaway_storage()
+    dialect = make_url(settings.DATABASE_CONNECTION_URI).get_backend_name()
+    # migrations also create the full-text search index, which create_all does not
+    alembic_command.upgrade(AlembicConfig(ALEMBIC_CONFIGS[dialect]), "head")
+    tr = TidepoolRepository()
+
+    items = make_items(args.items, "save-item")
+    t0 = time.perf_counter()
+    for i, item in enumerate(items):
+        tr.save_item(item, commit=False)
+        if i > 0 and i % args.batch_size == 0:
+            tr.db.session.commit()
+    tr.db.session.commit()
+    per_item_rate = args.items / (time.perf_counter() - t0)
+
+    items = make_items(args.items, "bulk")
+    t0 = time.perf_counter()
+    for _ in tr.bulk_save_items(iter(items), batch_size=args.batch_size):
+        pass
+    bulk_rate = args.items / (time.perf_counter() - t0)
+
+    print(f"save_item loop:   {per_item_rate:10.1f} items/s")  # noqa: T201
+    print(f"bulk_save_items:  {bulk_rate:10.1f} items/s")  # noqa: T201
+    print(f"speedup:          {bulk_rate / per_item_rate:10.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""benchmarks/item_memory.py
+
+Compare the memory held by many Item, File and ItemMetadata instances using
+__slots__ against equivalent dict-based classes (the previous implementation), and
+against ItemRow projections as yielded by TidepoolRepository.get_item_rows.
+
+Objects are built in memory only, no database or storage is touched:
+
+    PYTHONPATH=. uv run python benchmarks/item_memory.py --items 1000000
+"""
+
+import argparse
+import datetime
+import gc
+import tracemalloc
+import uuid
+
+
+def without_slots(cls: type) -> type:
+    """Return a copy of a slotted class that stores attributes in a __dict__."""
+    namespace = {
+        key: value
+        for key, value in vars(cls).items()
+        if key not in {"__slots__", "__dict__", "__weakref__", *cls.__slots__}
+    }
+    return type(f"Dict{cls.__name__}", cls.__bases__, namespace)
+
+
+def measure(label: str, count: int, build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<20} {current / 2**20:10.1f} MiB {current / count:8.0f} B/item")  # noqa: T201
+    del objects
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    from tidepool import File, Item, ItemMetadata, ItemRow
+
+    dict_classes = {
+        "Item": without_slots(Item),
+        "File": without_slots(File),
+        "ItemMetadata": without_slots(ItemMetadata),
+    }
+    now = datetime.datetime.now(datetime.UTC)
+
+    def builder(item_cls, file_cls, metadata_cls):
+        def build(i):
+            item_uuid = str(uuid.uuid4())
+            file = file_cls(
+                file_uuid=str(uuid.uuid4()),
+                item_uuid=item_uuid,
+                filename=f"file-{i}.txt",
+                mimetype="text/plain",
+                date_created=now,
+            )
+            return item_cls(
+                title=f"item {i}",
+                item_uuid=item_uuid,
+                jsonld_metadata=metadata_cls(),
+                files=[file],
+                date_created=now,
+            )
+
+        return build
+
+    dict_bytes = measure(
+        "dict-based classes",
+        args.items,
+        builder(dict_classes["Item"], dict_classes["File"], dict_classes["ItemMetadata"]),
+    )
+    slots_bytes = measure(
+        "__slots__ classes", args.items, builder(Item, File, ItemMetadata)
+    )
+    row_bytes = measure(
+        "ItemRow",
+        args.items,
+        lambda i: ItemRow(str(uuid.uuid4()), f"item {i}", now, None),
+    )
+    print(f"__slots__ saving:    {1 - slots_bytes / dict_bytes:10.1%}")  # noqa: T201
+    print(f"ItemRow saving:      {1 - row_bytes / dict_bytes:10.1%}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""benchmarks/s3_client_reuse.py
+
+Compare per-operation S3 latency when building a new S3Client for every operation
+(the previous behavior of S3StorageService.get_s3_client) against reusing the single
+pooled client now owned by each S3StorageService.
+
+Runs against the local MinIO service from compose.yaml by default:
+
+    make services-start-daemon
+    PYTHONPATH=. uv run python benchmarks/s3_client_reuse.py --operations 200
+"""
+
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+from tidepool import File
+from tidepool.services.storage import S3StorageService
+from tidepool.services.storage.s3 import S3Client
+
+
+def get_config() -> dict:
+    return {
+        "NAME": "benchmark minio instance",
+        "REGION": os.environ.get("TIDEPOOL_MINIO_REGION", "us-east-1"),
+        "ENDPOINT": os.environ.get("TIDEPOOL_MINIO_ENDPOINT", "http://localhost:9000"),
+        "ACCESS_KEY_ID": os.environ.get("TIDEPOOL_MINIO_ACCESS_KEY_ID", "tidepool"),
+        "SECRET_ACCESS_KEY": os.environ.get(
+            "TIDEPOOL_MINIO_SECRET_ACCESS_KEY", "password"
+        ),
+        "BUCKET": os.environ.get("TIDEPOOL_MINIO_BUCKET", "tidepool"),
+    }
+
+
+class UnpooledS3StorageService(S3StorageService):
+    """S3StorageService that builds a new client per operation, as before pooling."""
+
+    def get_s3_client(self) -> S3Client:
+        return S3Client(
+            self.config["BUCKET"],
+            self.config["REGION"],
+            self.config["ACCESS_KEY_ID"],
+            self.config["SECRET_ACCESS_KEY"],
+            endpoint_url=self.config.get("ENDPOINT"),
+        )
+
+
+def run(storage: S3StorageService, operations: int, payload: bytes) -> dict:
+    latencies: dict[str, list[float]] = {"store": [], "read": [], "delete": []}
+    item_uuid = f"benchmark-{uuid.uuid4()}"
+    for _ in range(operations):
+        file = File(
+            filename="payload.bin",
+            mimetype="application/octet-stream",
+            item_uuid=item_uuid,
+            file_uuid=str(uuid.uuid4()),
+            data=payload,
+        )
+        for name, operation in (
+            ("store", storage.store_file),
+            ("read", storage.read_file),
+            ("delete", storage.delete_file),
+        ):
+            t0 = time.perf_counter()
+            operation(file)
+            latencies[name].append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: dict) -> None:
+    print(f"\n{label}")  # noqa: T201
+    for name, samples in latencies.items():
+        values = sorted(samples)
+        p95 = values[int(len(values) * 0.95) - 1]
+        print(  # noqa: T201
+            f"  {name:<7} mean={statistics.mean(values):7.2f}ms "
+            f"p50={statistics.median(values):7.2f}ms p95={p95:7.2f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--operations", type=int, default=100)
+    parser.add_argument("--payload-bytes", type=int, default=4096)
+    args = parser.parse_args()
+
+    config = get_config()
+    payload = os.urandom(args.payload_bytes)
+
+    S3StorageService(config=config, replication=True).get_s3_client().s3.head_bucket(
+        Bucket=config["BUCKET"]
+    )
+
+    unpooled = UnpooledS3StorageService(config=config, replication=True)
+    report(
+        "new client per operation (before)",
+        run(unpooled, args.operations, payload),
+    )
+    pooled = S3StorageService(config=config, replication=True)
+    report(
+        "pooled client per service (after)",
+        run(pooled, args.operations, payload),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""benchmarks/search.py
+
+Time ranked full-text queries against an index of many small items.
+
+Items are loaded with bulk_save_items into a throwaway SQLite database by default;
+set TIDEPOOL_SQLITE_DB_CONNECTION_STRING to benchmark another database, e.g. Postgres:
+
+    PYTHONPATH=. uv run python benchmarks/search.py --items 100000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from alembic import command as alembic_command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy.engine import make_url
+
+from benchmarks.bulk_save_items import ALEMBIC_CONFIGS, use_throwaway_storage
+from tidepool import Item, TidepoolRepository
+from tidepool.settings.manager import settings
+
+WORDS = [
+    "anemone",
+    "barnacle",
+    "crab",
+    "kelp",
+    "limpet",
+    "mussel",
+    "octopus",
+    "periwinkle",
+    "sculpin",
+    "shrimp",
+    "snail",
+    "sponge",
+    "starfish",
+    "urchin",
+    "whelk",
+    "algae",
+    "coast",
+    "intertidal",
+    "rock",
+    "shore",
+    "tide",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    use_throwaway_storage()
+    dialect = make_url(settings.DATABASE_CONNECTION_URI).get_backend_name()
+    alembic_command.upgrade(AlembicConfig(ALEMBIC_CONFIGS[dialect]), "head")
+    tr = TidepoolRepository()
+
+    # seeded so runs index and query the same text; not used for security
+    rng = random.Random(42)  # noqa: S311
+    items = (
+        Item.from_data(
+            " ".join(rng.choices(WORDS, k=50)).encode(),
+            f"item-{i}.txt",
+            title=" ".join(rng.choices(WORDS, k=3)),
+        )
+        for i in range(args.items)
+    )
+    t0 = time.perf_counter()
+    for _ in tr.bulk_save_items(items, yield_items=False):
+        pass
+    print(f"indexed {args.items} items in {time.perf_counter() - t0:.1f}s")  # noqa: T201
+
+    timings = []
+    for _ in range(args.queries):
+        query = " ".join(rng.choices(WORDS, k=2))
+        t0 = time.perf_counter()
+        tr.search_items(query, limit=20)
+        timings.append((time.perf_counter() - t0) * 1_000)
+    timings.sort()
+    print(f"median query:  {statistics.median(timings):8.1f} ms")  # noqa: T201
+    print(f"p95 query:     {timings[int(len(timings) * 0.95)]:8.1f} ms")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
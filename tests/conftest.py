@@ -1,8 +1,13 @@
+import importlib
+
 from alembic.config import Config as AlembicConfig
 from alembic import command as alembic_command
 import pytest
+from sqlalchemy import event
 
 from tidepool import settings, Item, TidepoolRepository
+from tidepool.contexts import reset_context_registry
+from tidepool.services.db import dispose_engines, get_engine
 
 
 @pytest.fixture(autouse=True)
@@ -19,8 +24,16 @@ def _testing_settings(
     monkeypatch.setenv("TIDEPOOL_SQLITE_DB_DATA_DIR", db_primary_posix_path)
     monkeypatch.setenv("TIDEPOOL_POSIX_DATA_DIR", storage_primary_posix_path)
 
-    # reload settings from testing module
-    settings.update_from_module("tests.fixtures.settings.settings_test")
+    # reload settings from testing module, re-reading the env vars set above
+    settings.update_from_module(
+        importlib.reload(importlib.import_module("tests.fixtures.settings.settings_test"))
+    )
+
+    yield
+
+    # close pooled connections to this test's database
+    dispose_engines()
+    reset_context_registry()
 
 
 @pytest.fixture
@@ -82,3 +95,56 @@ def text_data_item():
         "hello-world.txt",
         title="Hello World Notes",
     )
+
+
+@pytest.fixture
+def api_client(repository):
+    from tidepool.api.app import api_app
+
+    api_app.config["TESTING"] = True
+    # drop any repository built for a previous test's settings
+    api_app.extensions.pop("tidepool_repository", None)
+    return api_app.test_client()
+
+
+@pytest.fixture
+def s3_storage_config():
+    return {
+        "NAME": "testing s3 storage",
+        "REGION": "us-east-1",
+        "ENDPOINT": "http://localhost:9999",
+        "ACCESS_KEY_ID": "testing",
+        "SECRET_ACCESS_KEY": "testing",
+        "BUCKET": "tidepool-testing",
+    }
+
+
+@pytest.fixture
+def replication_posix_storage(testing_settings, tmp_path):
+    testing_settings.update(
+        REPLICATION_STORAGE_SERVICES=[
+            {
+                "module": "tidepool.services.storage",
+                "class": "POSIXStorageService",
+                "config": {
+                    "NAME": "replication local filesystem storage",
+                    "DATA_DIR": str(tmp_path / "storage" / "posix-replica" / "data"),
+                },
+            }
+        ]
+    )
+    return testing_settings.REPLICATION_STORAGE_SERVICES[0]
+
+
+@pytest.fixture
+def query_counter():
+    """Count SQL statements executed against the testing database."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
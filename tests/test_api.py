@@ -0,0 +1,295 @@
+import datetime
+import json
+
+from tidepool import Item, settings
+from tidepool.api.app import get_repository
+
+
+def test_item_file_data_full(api_client, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data")
+    assert response.status_code == 200
+    assert response.data == b"Hello world!"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == "12"
+
+
+def test_item_file_data_range(api_client, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(
+        f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data",
+        headers={"Range": "bytes=6-10"},
+    )
+    assert response.status_code == 206
+    assert response.data == b"world"
+    assert response.headers["Content-Range"] == "bytes 6-10/12"
+
+
+def test_item_file_data_range_not_satisfiable(api_client, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(
+        f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data",
+        headers={"Range": "bytes=100-200"},
+    )
+    assert response.status_code == 416
+
+
+def test_item_file_data_if_range_mismatch_sends_full_file(
+    api_client, repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(
+        f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data",
+        headers={"Range": "bytes=6-10", "If-Range": '"stale-etag"'},
+    )
+    assert response.status_code == 200
+    assert response.data == b"Hello world!"
+
+
+def test_repository_is_shared_across_requests(api_client, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    assert api_client.get(f"/api/items/{item.item_uuid}").status_code == 200
+    tr = get_repository()
+    assert api_client.get(f"/api/items/{item.item_uuid}/files").status_code == 200
+    assert get_repository() is tr
+    # the request-scoped session is removed in teardown_request
+    assert not tr.db.session.registry.has()
+
+
+def test_items_keyset_pagination(api_client, repository):
+    items = [
+        Item.from_data(b"data", f"item-{i}.txt", title=f"Item {i:02d}") for i in range(7)
+    ]
+    list(repository.bulk_save_items(iter(items)))
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 3, "sort": "title", "order": "desc"}
+        if cursor:
+            params["cursor"] = cursor
+        page = api_client.get("/api/items", query_string=params).json
+        titles.extend(item["title"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert titles == [f"Item {i:02d}" for i in reversed(range(7))]
+
+
+def test_items_filters(api_client, repository, jpeg_image_item, text_data_item):
+    repository.save_item(jpeg_image_item)
+    repository.save_item(text_data_item)
+
+    page = api_client.get("/api/items", query_string={"mimetype": "image/*"}).json
+    assert [item["title"] for item in page["items"]] == [jpeg_image_item.title]
+
+    page = api_client.get("/api/items", query_string={"title_prefix": "Hello"}).json
+    assert [item["title"] for item in page["items"]] == ["Hello World Notes"]
+
+    response = api_client.get("/api/items", query_string={"created_after": "not-a-date"})
+    assert response.status_code == 400
+
+
+def test_items_metadata_filter(api_client, repository, text_file_item, text_data_item):
+    text_file_item.jsonld_metadata.set_statement("dc:creator", "Wikipedia")
+    repository.save_item(text_file_item)
+    repository.save_item(text_data_item)
+
+    page = api_client.get(
+        "/api/items", query_string={"property": "dc:creator", "value": "Wikipedia"}
+    ).json
+    assert [item["title"] for item in page["items"]] == [text_file_item.title]
+
+    response = api_client.get(
+        "/api/items",
+        query_string={"property": "dc:creator", "value": "A", "value_to": "Z"},
+    )
+    assert response.status_code == 400
+
+
+def test_items_export_ndjson(api_client, repository, jpeg_image_item, text_data_item):
+    repository.save_item(jpeg_image_item)
+    repository.save_item(text_data_item)
+
+    response = api_client.get("/api/items/export")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert sorted(line["title"] for line in lines) == sorted(
+        [jpeg_image_item.title, text_data_item.title]
+    )
+
+
+def test_items_export_updated_since(api_client, repository, text_data_item):
+    repository.save_item(text_data_item)
+    future = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=1)
+
+    response = api_client.get(
+        "/api/items/export", query_string={"updated_since": future.isoformat()}
+    )
+    assert response.data == b""
+
+
+def test_search_pagination(api_client, repository):
+    for i in range(5):
+        repository.save_item(
+            Item.from_data(b"barnacle", f"b-{i}.txt", title=f"Barnacle {i}")
+        )
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "barnacle", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = api_client.get("/api/search", query_string=params)
+        assert response.status_code == 200
+        seen.extend(item["item_uuid"] for item in response.json["items"])
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 5
+    assert api_client.get("/api/search").status_code == 400
+    response = api_client.get("/api/search", query_string={"q": "kelp", "cursor": cursor})
+    assert response.status_code == 200
+    response = api_client.get("/api/search", query_string={"q": "kelp", "cursor": "x"})
+    assert response.status_code == 400
+
+
+def test_relationships_api(api_client, repository):
+    members = [
+        {"subject": f"item-{i}", "predicate": "dcterms:isPartOf", "object": "coll"}
+        for i in range(3)
+    ]
+    response = api_client.post("/api/relationships", json=members)
+    assert response.json["count"] == 3
+
+    response = api_client.get("/api/relationships", query_string={"object": "coll"})
+    assert len(response.json) == 3
+
+    response = api_client.get(
+        "/api/relationships/traverse",
+        query_string={"start": "coll", "direction": "in"},
+    )
+    assert {r["subject"] for r in response.json["relationships"]} == {
+        "item-0",
+        "item-1",
+        "item-2",
+    }
+
+    response = api_client.delete("/api/relationships", json=members[:1])
+    assert response.json["count"] == 1
+    response = api_client.get("/api/items/coll/relationships")
+    assert len(response.json) == 2
+
+    response = api_client.post("/api/relationships", json=[{"subject": "x"}])
+    assert response.status_code == 400
+
+
+def test_item_conditional_get(api_client, monkeypatch, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    url = f"/api/items/{item.item_uuid}"
+    response = api_client.get(url)
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    # answered from the version projection alone
+    monkeypatch.setattr(get_repository(), "get_item", None)
+    response = api_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    response = api_client.get(url, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    monkeypatch.undo()
+
+    item.title = "Renamed"
+    repository.save_item(item)
+    response = api_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_item_file_data_conditional_get(api_client, repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = repository.db.get_file(item.files[0].file_uuid)
+    url = f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data"
+
+    response = api_client.get(url)
+    assert response.headers["ETag"] == f'"{file.checksum}"'
+    response = api_client.get(url, headers={"If-None-Match": f'"{file.checksum}"'})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = api_client.get(
+        url, headers={"Range": "bytes=6-10", "If-Range": f'"{file.checksum}"'}
+    )
+    assert response.status_code == 206
+    assert response.data == b"world"
+
+    metadata = api_client.get(f"/api/items/{item.item_uuid}/files/{file.file_uuid}")
+    assert metadata.headers["ETag"] not in (response.headers["ETag"], None)
+
+
+def test_item_file_data_sent_from_local_path(
+    api_client, monkeypatch, repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    url = f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data"
+    # sent from the file itself, never read through the storage service
+    monkeypatch.setattr(get_repository(), "read_file_stream", None)
+
+    response = api_client.get(url, headers={"Range": "bytes=6-10"})
+    assert response.status_code == 206
+    assert response.data == b"world"
+    assert response.headers["Content-Disposition"] == f"inline; filename={file.filename}"
+
+
+def test_item_file_data_x_accel_redirect(
+    api_client, monkeypatch, repository, text_data_item
+):
+    monkeypatch.setitem(settings.API_FILE_SERVING, "MODE", "x-accel-redirect")
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data")
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"] == (
+        f"/_tidepool/files/{item.item_uuid}/{file.file_uuid}__{file.filename}"
+    )
+
+    monkeypatch.setitem(settings.API_FILE_SERVING, "MODE", "x-sendfile")
+    response = api_client.get(f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data")
+    assert response.headers["X-Sendfile"] == str(repository.get_local_path(file))
+
+
+def test_item_file_data_x_sendfile_headers(
+    api_client, monkeypatch, repository, text_data_item
+):
+    monkeypatch.setitem(settings.API_FILE_SERVING, "MODE", "x-sendfile")
+    text_data_item.files[0].filename = 'caf\u00e9 "menu".txt'
+    text_data_item.files[0].mimetype = None
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data")
+    assert response.headers["Content-Type"] == "application/octet-stream"
+    assert response.headers["Content-Disposition"] == (
+        'inline; filename="cafe \\"menu\\".txt"; '
+        "filename*=UTF-8''caf%C3%A9%20%22menu%22.txt"
+    )
+
+
+def test_item_file_data_stream_mode(api_client, monkeypatch, repository, text_data_item):
+    monkeypatch.setitem(settings.API_FILE_SERVING, "MODE", "stream")
+    monkeypatch.setattr(get_repository(), "get_local_path", None)
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    response = api_client.get(
+        f"/api/items/{item.item_uuid}/files/{file.file_uuid}/data",
+        headers={"Range": "bytes=6-10"},
+    )
+    assert response.status_code == 206
+    assert response.data == b"world"
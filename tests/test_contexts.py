@@ -0,0 +1,61 @@
+import pytest
+from pyld import jsonld
+
+from tidepool import ItemMetadata
+from tidepool.contexts import ContextRegistry
+
+
+@pytest.mark.parametrize("context", ["http://schema.org/", "https://schema.org"])
+def test_schema_org_context_is_served_offline(context):
+    metadata = ItemMetadata()
+    metadata.data = {
+        "@context": context,
+        "@type": "Book",
+        "name": "Tidepool",
+        "url": "https://example.org/tidepool",
+    }
+    expanded = metadata.to_expanded()[0]
+    assert expanded["@type"] == ["http://schema.org/Book"]
+    assert expanded["http://schema.org/name"] == [{"@value": "Tidepool"}]
+    # the published context coerces url to an IRI, which a stub would not
+    assert expanded["http://schema.org/url"] == [{"@id": "https://example.org/tidepool"}]
+
+
+def test_unknown_remote_context_is_refused_when_offline():
+    metadata = ItemMetadata()
+    metadata.data = {"@context": "https://example.org/context.jsonld", "name": "x"}
+    with pytest.raises(jsonld.JsonLdError):
+        metadata.to_expanded()
+
+
+def test_resolved_contexts_are_reused_across_calls():
+    loads = []
+
+    class CountingRegistry(ContextRegistry):
+        def document_loader(self, url, options=None):
+            loads.append(url)
+            return super().document_loader(url, options)
+
+    registry = CountingRegistry()
+    for name in ("first", "second", "third"):
+        jsonld.expand(
+            {"@context": "https://schema.org/", "name": name}, registry.options()
+        )
+
+    assert loads == ["https://schema.org/"]
+    assert registry.options()["contextResolver"] is registry.options()["contextResolver"]
+
+
+def test_registered_context_and_cache_limits():
+    registry = ContextRegistry(
+        {"https://example.org/ctx": {"@context": {"ex": "https://example.org/"}}},
+        max_entries=2,
+    )
+    doc = registry.document_loader("https://example.org/ctx")
+    assert doc["document"] == {"@context": {"ex": "https://example.org/"}}
+
+    cache = registry._resolved_contexts  # noqa: SLF001
+    for key in ("a", "b", "c"):
+        cache[key] = key
+    assert len(cache) == 2
+    assert cache.get("a") is None
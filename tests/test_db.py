@@ -0,0 +1,153 @@
+import pytest
+from sqlalchemy import select, text, update
+
+from tidepool import Item, TidepoolRepository
+from tidepool.services.db import get_engine, session_scope
+from tidepool.services.db.base import ItemDB, MetadataProperty
+
+
+def test_repositories_share_one_engine(sqlite_db_service, testing_settings):
+    tr1, tr2 = TidepoolRepository(), TidepoolRepository()
+    engine = get_engine()
+    assert tr1.db.session.get_bind() is engine
+    assert tr2.db.session.get_bind() is engine
+    assert get_engine(testing_settings.DATABASE_CONNECTION_URI) is engine
+
+
+def test_engine_pool_options_from_settings(sqlite_db_service, testing_settings):
+    engine = get_engine()
+    assert engine.pool.size() == testing_settings.DATABASE_ENGINE_OPTIONS["pool_size"]
+    assert engine.pool._pre_ping  # noqa: SLF001
+
+
+def test_session_scope_commits_unit_of_work(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    with session_scope() as session:
+        session.get(ItemDB, item.item_uuid).title = "Updated Title"
+    assert repository.get_item(item.item_uuid).title == "Updated Title"
+
+
+def test_get_items_loads_files_without_n_plus_one(repository, query_counter):
+    items = [
+        Item.from_data(f"item {i}".encode(), f"item-{i}.txt", title=f"Item {i}")
+        for i in range(30)
+    ]
+    list(repository.bulk_save_items(iter(items)))
+    repository.db.session.expire_all()
+
+    query_counter.clear()
+    loaded_items = list(repository.db.get_items(batch_size=10))
+
+    assert len(loaded_items) == 30
+    assert all(len(item.files) == 1 for item in loaded_items)
+    # one SELECT for the items, plus one SELECT ... IN for each batch of files
+    assert len(query_counter) <= 1 + 3
+
+
+def test_get_item_loads_files_in_one_round_trip(
+    repository, text_data_item, query_counter
+):
+    item = repository.save_item(text_data_item)
+    repository.db.session.expunge_all()
+
+    query_counter.clear()
+    loaded_item = repository.get_item(item.item_uuid)
+
+    assert len(loaded_item.files) == 1
+    assert len(query_counter) <= 2
+
+
+def test_query_items_keyset_pagination_breaks_ties_on_uuid(repository):
+    # bulk inserted items share one date_created, so pages must break ties on uuid
+    items = [
+        Item.from_data(b"data", f"item-{i}.txt", title=f"Item {i}") for i in range(7)
+    ]
+    list(repository.bulk_save_items(iter(items)))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.query_items(limit=3, cursor=cursor)
+        seen.extend(item.item_uuid for item in page)
+        if not cursor:
+            break
+
+    assert sorted(seen) == sorted(item.item_uuid for item in items)
+    assert len(seen) == len(set(seen))
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_query_items_by_title_pages_across_untitled_items(repository, direction):
+    titles = ["b", "untitled", "a", "untitled", "c", "untitled"]
+    items = [
+        Item.from_data(b"data", f"item-{i}.txt", title=title)
+        for i, title in enumerate(titles)
+    ]
+    list(repository.bulk_save_items(iter(items)))
+    with session_scope() as session:
+        session.execute(
+            update(ItemDB).where(ItemDB.title == "untitled").values(title=None)
+        )
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.query_items(
+            limit=2, cursor=cursor, sort="title", direction=direction
+        )
+        seen.extend(item.title for item in page)
+        if not cursor:
+            break
+
+    expected = [None, None, None, "a", "b", "c"]
+    assert seen == (expected if direction == "asc" else expected[::-1])
+
+
+def test_query_items_by_metadata_property(repository):
+    for title, creator, date in [
+        ("One", "Rachel Carson", "1951-07-02"),
+        ("Two", ["Ed Ricketts", "John Steinbeck"], "1941-12-05"),
+        ("Three", "Ed Ricketts", "1939-01-01"),
+    ]:
+        item = Item.from_data(b"", f"{title}.txt", title=title)
+        item.jsonld_metadata.set_statement("dc:creator", creator)
+        item.jsonld_metadata.set_statement("schema:dateCreated", date)
+        repository.save_item(item)
+
+    def titles(**kwargs):
+        page, _ = repository.query_items(sort="title", **kwargs)
+        return [item.title for item in page]
+
+    assert titles(metadata_property="dc:creator", metadata_value="Ed Ricketts") == [
+        "Three",
+        "Two",
+    ]
+    assert titles(
+        metadata_property="schema:dateCreated",
+        metadata_value_from="1940-01-01",
+        metadata_value_to="1960-01-01",
+    ) == ["One", "Two"]
+    assert titles(
+        metadata_property="dc:creator", metadata_value_from="John"
+    ) == ["One", "Two"]
+
+    with pytest.raises(ValueError, match="Unsupported metadata property"):
+        titles(metadata_property="dc:creator') OR 1=1 --", metadata_value="x")
+    with pytest.raises(ValueError, match="requires a metadata property"):
+        titles(metadata_value="x")
+
+
+def test_metadata_queries_use_expression_indexes(repository):
+    repository.db.ensure_metadata_indexes(["dc:creator"])
+    query = select(ItemDB.item_uuid).where(
+        MetadataProperty("dc:creator", "sqlite").filter(value="Rachel Carson")
+    )
+    statement = query.compile(
+        dialect=repository.db.session.get_bind().dialect,
+        compile_kwargs={"literal_binds": True},
+    )
+
+    plan = repository.db.session.execute(text(f"EXPLAIN QUERY PLAN {statement}"))
+    details = [row.detail for row in plan]
+
+    assert any("ix_item_metadata_value_dc_creator" in detail for detail in details)
+    assert any("ix_item_metadata_type_dc_creator" in detail for detail in details)
+    assert not any(detail == "SCAN item" for detail in details)
@@ -0,0 +1,111 @@
+import hashlib
+import time
+
+from tidepool import TidepoolRepository
+from tidepool.fixity import FixityAuditor, IOThrottle
+
+
+def test_store_records_size_and_checksum(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = repository.db.get_file(item.files[0].file_uuid)
+    assert file.size == len(b"Hello world!")
+    assert file.checksum == hashlib.sha256(b"Hello world!").hexdigest()
+    assert file.checksum_algorithm == "sha256"
+    assert repository.get_file_size(file) == file.size
+
+
+def test_checksum_algorithm_is_configurable(
+    testing_settings, repository, text_data_item
+):
+    testing_settings.FIXITY["CHECKSUM_ALGORITHM"] = "blake2b"
+    item = repository.save_item(text_data_item)
+    assert item.files[0].checksum == hashlib.blake2b(b"Hello world!").hexdigest()
+    assert item.files[0].checksum_algorithm == "blake2b"
+
+
+def test_fixity_audit_checks_every_storage_service(
+    replication_posix_storage, repository, text_data_item, jpeg_image_item
+):
+    first = repository.save_item(text_data_item)
+    repository.save_item(jpeg_image_item)
+    replica = repository.storage.replication_services[0]
+
+    run = FixityAuditor(repository=repository).run()
+    assert run.status == "completed"
+    assert run.files_checked == 2
+    assert run.failures == 0
+
+    # corrupt the replica's copy and remove the primary's
+    _, replica_path = replica.get_file_dir_and_path(first.files[0])
+    replica_path.write_bytes(b"Hello world?")
+    _, primary_path = repository.storage.get_file_dir_and_path(first.files[0])
+    primary_path.unlink()
+
+    run = FixityAuditor(repository=repository).run()
+    failures = {
+        result.service_name: result
+        for result in repository.db.get_fixity_audit_failures(run.run_uuid)
+    }
+    assert run.failures == 2
+    assert failures[replica.name].status == "mismatch"
+    assert failures[replica.name].actual_size == failures[replica.name].expected_size
+    assert failures[repository.storage.name].status == "missing"
+
+
+def test_fixity_audit_resumes_unfinished_run(repository, text_data_item):
+    for i in range(3):
+        text_data_item.title = f"note {i}"
+        repository.save_item(text_data_item)
+        text_data_item.item_uuid = None
+        text_data_item.files[0].file_uuid = None
+
+    auditor = FixityAuditor(repository=repository, config={"AUDIT_BATCH_SIZE": 2})
+    audit_files = auditor.audit_files
+
+    def audit_files_then_stop(*args):
+        auditor.stop()
+        return audit_files(*args)
+
+    auditor.audit_files = audit_files_then_stop
+    run = auditor.run()
+    assert run.status == "running"
+    assert run.files_checked == 2
+
+    run = FixityAuditor(repository=repository, config={"AUDIT_BATCH_SIZE": 2}).run()
+    assert run.status == "completed"
+    assert run.files_checked == 3
+
+
+def test_io_throttle_limits_rate():
+    throttle = IOThrottle(bytes_per_second=1_000)
+    t0 = time.perf_counter()
+    for _ in range(4):
+        throttle.consume(500)
+    # the first 1,000 bytes are allowed as a burst, the rest take a second
+    assert time.perf_counter() - t0 >= 0.9
+
+
+def test_fixity_audit_reads_behind_storage_cache(
+    replication_posix_storage, sqlite_db_service, tmp_path, text_data_item
+):
+    backend = dict(replication_posix_storage)
+    replication_posix_storage.update(
+        {
+            "class": "CachingStorageService",
+            "config": {"DIR": str(tmp_path / "cache"), "BACKEND": backend},
+        }
+    )
+    repository = TidepoolRepository()
+    item = repository.save_item(text_data_item)
+    cache = repository.storage.replication_services[0]
+    cache.read_file(item.files[0])
+
+    # the cached copy is intact, the copy the cache reads from is not
+    _, replica_path = cache.backend.get_file_dir_and_path(item.files[0])
+    replica_path.write_bytes(b"Hello world?")
+    stats = cache.get_cache_stats()
+
+    run = FixityAuditor(repository=repository).run()
+    failures = repository.db.get_fixity_audit_failures(run.run_uuid)
+    assert [(f.service_name, f.status) for f in failures] == [(cache.name, "mismatch")]
+    assert cache.get_cache_stats() == stats
@@ -1,4 +1,6 @@
-from tidepool import Item
+from pyld import jsonld
+
+from tidepool import Item, ItemMetadata
 
 
 def test_init_item_from_file(small_jpeg_image_filepath):
@@ -12,3 +14,43 @@ def test_init_item_from_file(small_jpeg_image_filepath):
     file = item.files[0]
     assert file.mimetype == "image/jpeg"
     assert file.filename == filename
+
+
+def test_item_metadata_compaction_is_cached_until_modified(monkeypatch):
+    calls = []
+    compact = jsonld.compact
+
+    def counting_compact(*args, **kwargs):
+        calls.append(args)
+        return compact(*args, **kwargs)
+
+    monkeypatch.setattr(jsonld, "compact", counting_compact)
+    metadata = ItemMetadata()
+    metadata.set_statement("dc:title", "Tidepool")
+
+    assert metadata.to_compact()["dc:title"] == "Tidepool"
+    metadata.to_compact()
+    assert len(calls) == 1
+
+    metadata.set_statement("dc:creator", "Anonymous")
+    assert metadata.is_modified
+    assert metadata.to_compact()["dc:creator"] == "Anonymous"
+    assert len(calls) == 2
+
+
+def test_item_metadata_from_stored_jsonld_skips_compaction(monkeypatch):
+    stored = ItemMetadata()
+    stored.set_statement("dc:title", "Tidepool")
+    compacted = stored.to_compact()
+
+    monkeypatch.setattr(jsonld, "compact", None)
+    metadata = ItemMetadata.from_jsonld(compacted)
+    assert not metadata.is_modified
+    assert metadata.to_compact() == compacted
+
+
+def test_domain_objects_use_slots():
+    item = Item.from_data(b"hello", "hello.txt")
+
+    for obj in (item, item.files[0], item.jsonld_metadata):
+        assert not hasattr(obj, "__dict__")
@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from tidepool import File, TidepoolRepository
+from tidepool.services.storage import ReadRouter
+from tidepool.services.storage.router import is_missing_error
+
+
+class FakeStorageService:
+    def __init__(self, name, data=b"Hello world!", *, delay=0.0, fail=False):
+        self.name = name
+        self.data = data
+        self.delay = delay
+        self.fail = fail
+        self.reads = 0
+
+    def read_file_stream(self, _file, *, start=0, end=None, **_):
+        self.reads += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise OSError(f"{self.name} unavailable")
+        data = self.data[start:end]
+        return iter([data[i : i + 4] for i in range(0, len(data), 4)])
+
+    def get_file_size(self, _file):
+        if self.fail:
+            raise OSError(f"{self.name} unavailable")
+        return len(self.data)
+
+
+class BrokenMidStreamService(FakeStorageService):
+    def read_file_stream(self, _file, *, start=0, end=None, **_):
+        self.reads += 1
+
+        def chunks():
+            yield self.data[start:end][:4]
+            raise OSError("connection reset")
+
+        return chunks()
+
+
+@pytest.fixture
+def file():
+    return File(filename="a.txt", mimetype="text/plain", file_uuid="abc")
+
+
+def test_read_router_hedges_slow_primary(file):
+    primary = FakeStorageService("primary", delay=0.5)
+    replica = FakeStorageService("replica")
+    router = ReadRouter([primary, replica], config={"HEDGE_DEFAULT_DELAY_MS": 20})
+
+    t0 = time.perf_counter()
+    assert router.read_file(file) == b"Hello world!"
+    assert time.perf_counter() - t0 < 0.3
+    assert primary.reads == replica.reads == 1
+    router.shutdown()
+
+
+def test_read_router_fails_over_and_opens_circuit(file):
+    primary = FakeStorageService("primary", fail=True)
+    replica = FakeStorageService("replica")
+    router = ReadRouter([primary, replica], config={"FAILURE_THRESHOLD": 1})
+
+    assert router.read_file(file) == b"Hello world!"
+    assert router.get_health()["primary"]["circuit_open"]
+    assert [service.name for service in router.ranked_services()] == [
+        "replica",
+        "primary",
+    ]
+    assert router.get_file_size(file) == len(b"Hello world!")
+    router.shutdown()
+
+
+def test_read_router_resumes_failed_stream_on_another_service(file):
+    primary = BrokenMidStreamService("primary")
+    replica = FakeStorageService("replica")
+    router = ReadRouter([primary, replica])
+
+    assert b"".join(router.read_file_stream(file, start=2)) == b"llo world!"
+    assert router.get_health()["primary"]["error_rate"] > 0
+    router.shutdown()
+
+
+def test_read_router_prefers_fastest_service(file):
+    primary = FakeStorageService("primary", delay=0.05)
+    replica = FakeStorageService("replica", delay=0.01)
+    router = ReadRouter(
+        [primary, replica],
+        config={"MIN_SAMPLES": 3, "HEDGE_DEFAULT_DELAY_MS": 1},
+    )
+    # early reads are hedged to the replica, which answers first
+    for _ in range(4):
+        assert router.read_file(file) == b"Hello world!"
+    time.sleep(0.1)
+
+    assert router.ranked_services()[0] is replica
+    assert router.get_health()["replica"]["p50_ms"] < 50
+    router.shutdown()
+
+
+def test_repository_reads_fail_over_to_replica(
+    replication_posix_storage, repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    _, primary_path = repository.storage.get_file_dir_and_path(file)
+    primary_path.unlink()
+
+    assert repository.read_file_data(file) == b"Hello world!"
+
+
+def test_read_router_excludes_services(file):
+    primary = FakeStorageService("primary", fail=True)
+    replica = FakeStorageService("replica", b"stale")
+    router = ReadRouter([primary, replica])
+    with pytest.raises(OSError, match="primary unavailable"):
+        router.read_file(file, exclude={"replica"})
+    assert replica.reads == 0
+    router.shutdown()
+
+
+def test_repository_does_not_read_replicas_pending_replication(
+    testing_settings, replication_posix_storage, repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+
+    # write-behind: the replica keeps the old content until the task is done
+    testing_settings.update(REPLICATION_MODE="async")
+    file.data = b"Hello again!"
+    repository.save_item(item)
+    _, primary_path = repository.storage.get_file_dir_and_path(file)
+    primary_path.unlink()
+
+    with pytest.raises(FileNotFoundError):
+        repository.read_file_data(file)
+
+
+def test_repository_reads_primary_directly_without_routing(
+    testing_settings, replication_posix_storage, sqlite_db_service, text_data_item
+):
+    testing_settings.update(
+        READ_ROUTING={**testing_settings.READ_ROUTING, "ENABLED": False}
+    )
+    repository = TidepoolRepository()
+    item = repository.save_item(text_data_item)
+    assert repository.read_router is None
+    assert repository.read_file_data(item.files[0]) == b"Hello world!"
+    assert repository.get_storage_health() == {}
+
+
+def test_is_missing_error_handles_errors_without_response():
+    class ResponseError(Exception):
+        def __init__(self, response):
+            super().__init__("request failed")
+            self.response = response
+
+    assert is_missing_error(FileNotFoundError())
+    assert is_missing_error(ResponseError({"Error": {"Code": "NoSuchKey"}}))
+    assert not is_missing_error(ResponseError(None))
+    assert not is_missing_error(OSError())
+
+
+def test_repository_reads_primary_directly_without_replicas(
+    repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    assert repository.read_router is None
+    assert repository.read_file_data(item.files[0]) == b"Hello world!"
@@ -0,0 +1,76 @@
+from tidepool import File, Item
+from tidepool.reconcile import Reconciler, merge_join
+from tidepool.services.db import SQLDBService, session_scope
+from tidepool.services.storage import POSIXStorageService, StoredObject
+
+
+def test_merge_join_reports_both_sides():
+    expected = [("a", ["file-a"]), ("c", ["file-c"])]
+    listed = iter([StoredObject("b", 1, None), StoredObject("c", 1, None)])
+    joined = [
+        (key, files, obj.key if obj else None)
+        for key, files, obj in merge_join(expected, listed)
+    ]
+    assert joined == [("a", ["file-a"], None), ("b", None, "b"), ("c", ["file-c"], "c")]
+
+
+def test_posix_list_keys_sorted_by_full_key(tmp_path):
+    storage = POSIXStorageService(config={"NAME": "listing", "DATA_DIR": str(tmp_path)})
+    for key in ["a/x", "a-c", "ab/y", "b", "a/.partial.tmp"]:
+        path = tmp_path / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+
+    assert [obj.key for obj in storage.list_keys()] == ["a-c", "a/x", "ab/y", "b"]
+    assert [obj.key for obj in storage.list_keys("a/")] == ["a/x"]
+    assert [obj.key for obj in storage.list_keys("ab")] == ["ab/y"]
+
+
+def test_reconcile_reports_and_repairs(
+    replication_posix_storage, repository, text_data_item, jpeg_image_item
+):
+    first = repository.save_item(text_data_item)
+    second = repository.save_item(jpeg_image_item)
+    replica = repository.storage.replication_services[0]
+
+    # lose one replica copy, truncate another, and leave an orphan behind
+    _, missing_path = replica.get_file_dir_and_path(first.files[0])
+    missing_path.unlink()
+    _, truncated_path = replica.get_file_dir_and_path(second.files[0])
+    truncated_path.write_bytes(b"oops")
+    orphan_key = f"{first.item_uuid}/orphan.txt"
+    (missing_path.parent / "orphan.txt").write_bytes(b"left behind")
+
+    reconciler = Reconciler(
+        repository=repository,
+        config={"PREFIX_LENGTH": 1, "EXTRA_GRACE_SECONDS": 0},
+    )
+    issues = {(issue.service, issue.kind): issue for issue in reconciler.run()}
+    assert set(issues) == {
+        (replica.name, "missing"),
+        (replica.name, "size_mismatch"),
+        (replica.name, "extra"),
+    }
+    assert issues[(replica.name, "extra")].key == orphan_key
+    assert not any(issue.repaired for issue in issues.values())
+
+    repaired = list(reconciler.run(repair=True, delete_extra=True))
+    assert all(issue.repaired for issue in repaired)
+    assert replica.read_file(first.files[0]) == b"Hello world!"
+    assert replica.get_file_size(second.files[0]) == second.files[0].size
+    assert not (missing_path.parent / "orphan.txt").exists()
+    assert list(reconciler.run()) == []
+
+
+def test_files_by_prefix_sorted_by_storage_key(repository):
+    for item_uuid, file_uuids in [("a", ["x", "x-2"]), ("a-b", ["y"])]:
+        files = [
+            File(filename="f.txt", mimetype="text/plain", data=b"x", file_uuid=uuid)
+            for uuid in file_uuids
+        ]
+        repository.save_item(Item(title=item_uuid, item_uuid=item_uuid, files=files))
+
+    with session_scope() as session:
+        files = SQLDBService(session=session).get_files_by_prefix(item_uuid_prefix="a")
+        keys = [repository.storage.get_storage_key(file) for file in files]
+    assert keys == ["a-b/y__f.txt", "a/x-2__f.txt", "a/x__f.txt"]
@@ -0,0 +1,125 @@
+from tidepool import Relationship
+
+PART_OF = "dcterms:isPartOf"
+
+
+def test_add_relationships_skips_existing(repository):
+    relationships = [
+        Relationship("a", PART_OF, "collection"),
+        Relationship("b", PART_OF, "collection"),
+        Relationship("a", PART_OF, "collection"),
+    ]
+    assert repository.add_relationships(relationships) == 2
+    assert repository.add_relationships(relationships) == 0
+    assert len(repository.get_relationships(object="collection")) == 2
+
+
+def test_remove_relationships(repository):
+    repository.add_relationships(
+        [Relationship("a", PART_OF, "collection"), Relationship("b", PART_OF, "c")]
+    )
+    removed = repository.remove_relationships([Relationship("a", PART_OF, "collection")])
+    assert removed == 1
+    assert [r.triple for r in repository.get_relationships(predicate=PART_OF)] == [
+        ("b", PART_OF, "c")
+    ]
+
+
+def test_get_neighbors(repository):
+    repository.add_relationships(
+        [
+            Relationship("page", PART_OF, "book"),
+            Relationship("book", PART_OF, "shelf"),
+            Relationship("book", "dc:creator", "author"),
+        ]
+    )
+    assert {r.object for r in repository.get_neighbors("book")} == {"shelf", "author"}
+    assert [r.subject for r in repository.get_neighbors("book", direction="in")] == [
+        "page"
+    ]
+    assert len(repository.get_neighbors("book", predicate=PART_OF, direction="both")) == 2
+
+
+def test_traverse_collection_tree_in_one_query(repository, query_counter):
+    relationships = []
+    for i in range(20):
+        relationships.append(Relationship(f"sub-{i}", PART_OF, "root"))
+        relationships.extend(
+            Relationship(f"leaf-{i}-{j}", PART_OF, f"sub-{i}") for j in range(50)
+        )
+    relationships.append(Relationship("root", "dc:creator", "someone"))
+    repository.add_relationships(relationships)
+
+    query_counter.clear()
+    results = repository.traverse_relationships(
+        "root", predicates=[PART_OF], direction="in"
+    )
+
+    assert len(query_counter) == 1
+    assert len(results) == 20 + 20 * 50
+    depths = {relationship.subject: depth for relationship, depth in results}
+    assert depths["sub-3"] == 1
+    assert depths["leaf-3-7"] == 2
+
+
+def test_traverse_stops_at_max_depth_and_on_cycles(repository):
+    repository.add_relationships(
+        [
+            Relationship("a", PART_OF, "b"),
+            Relationship("b", PART_OF, "c"),
+            Relationship("c", PART_OF, "a"),
+            Relationship("c", PART_OF, "d"),
+        ]
+    )
+
+    results = repository.traverse_relationships("a", max_depth=2)
+    assert [(r.triple, depth) for r, depth in results] == [
+        (("a", PART_OF, "b"), 1),
+        (("b", PART_OF, "c"), 2),
+    ]
+
+    results = repository.traverse_relationships("a")
+    assert len(results) == 4
+
+
+def test_traverse_visits_shared_descendants_and_cycles_once(repository):
+    # a diamond that loops back to its start
+    repository.add_relationships(
+        [
+            Relationship("a", PART_OF, "b"),
+            Relationship("a", PART_OF, "c"),
+            Relationship("b", PART_OF, "d"),
+            Relationship("c", PART_OF, "d"),
+            Relationship("d", PART_OF, "e"),
+            Relationship("e", PART_OF, "a"),
+        ]
+    )
+    results = repository.traverse_relationships("a")
+    assert [(r.triple, depth) for r, depth in results] == [
+        (("a", PART_OF, "b"), 1),
+        (("a", PART_OF, "c"), 1),
+        (("b", PART_OF, "d"), 2),
+        (("c", PART_OF, "d"), 2),
+        (("d", PART_OF, "e"), 3),
+        (("e", PART_OF, "a"), 4),
+    ]
+
+
+def test_traverse_chain_of_diamonds_is_not_combinatorial(testing_settings, repository):
+    testing_settings.update(RELATIONSHIP_TRAVERSAL_MAX_DEPTH=40)
+    # 2**20 distinct paths lead to the last node
+    relationships = []
+    for i in range(20):
+        relationships += [
+            Relationship(f"n{i}", PART_OF, f"l{i}"),
+            Relationship(f"n{i}", PART_OF, f"r{i}"),
+            Relationship(f"l{i}", PART_OF, f"n{i + 1}"),
+            Relationship(f"r{i}", PART_OF, f"n{i + 1}"),
+        ]
+    repository.add_relationships(relationships)
+
+    results = repository.traverse_relationships("n0", max_depth=40)
+    assert len(results) == 80
+    depths = {r.triple: depth for r, depth in results}
+    assert depths[("l19", PART_OF, "n20")] == 40
+    assert depths[("n10", PART_OF, "r10")] == 21
@@ -0,0 +1,133 @@
+import pytest
+
+from tidepool import Item, TidepoolRepository, replication
+from tidepool.replication import ReplicationWorker
+
+
+@pytest.fixture
+def write_behind_repository(testing_settings, replication_posix_storage, repository):
+    testing_settings.update(REPLICATION_MODE="async")
+    return repository
+
+
+def test_write_behind_save_item_writes_primary_and_enqueues(
+    write_behind_repository, text_data_item
+):
+    tr = write_behind_repository
+    item = tr.save_item(text_data_item)
+    file = item.files[0]
+    replica = tr.storage.replication_services[0]
+
+    assert tr.storage.read_file(file) == b"Hello world!"
+    _, replica_path = replica.get_file_dir_and_path(file)
+    assert not replica_path.exists()
+
+    status = tr.get_replication_status()
+    assert status["mode"] == "async"
+    assert status["queue_depth"] == 1
+    assert status["services"][replica.name]["pending"] == 1
+
+
+def test_replication_worker_drains_outbox(write_behind_repository, text_data_item):
+    tr = write_behind_repository
+    item = tr.save_item(text_data_item)
+    file = item.files[0]
+    replica = tr.storage.replication_services[0]
+
+    worker = ReplicationWorker(repository=tr)
+    assert worker.run(once=True) == 1
+    assert replica.read_file(file) == b"Hello world!"
+    assert tr.get_replication_status()["queue_depth"] == 0
+
+    tr.delete_item(item=item)
+    assert worker.run(once=True) == 1
+    _, replica_path = replica.get_file_dir_and_path(file)
+    assert not replica_path.exists()
+    worker.shutdown()
+
+
+def test_replication_worker_retries_with_backoff(
+    monkeypatch, write_behind_repository, text_data_item
+):
+    tr = write_behind_repository
+    tr.save_item(text_data_item)
+    replica = tr.storage.replication_services[0]
+
+    def broken_store_file(file):
+        raise OSError("replica unavailable")
+
+    monkeypatch.setattr(replica, "store_file", broken_store_file)
+    worker = ReplicationWorker(repository=tr)
+    assert worker.run(once=True) == 1
+    worker.shutdown()
+
+    status = tr.get_replication_status()["services"][replica.name]
+    assert status["pending"] == 1
+    assert status["in_progress"] == 0
+
+
+def test_replication_worker_logs_tasks_out_of_attempts(
+    caplog, monkeypatch, write_behind_repository, text_data_item
+):
+    tr = write_behind_repository
+    tr.save_item(text_data_item)
+    replica = tr.storage.replication_services[0]
+
+    def broken_store_file(file):
+        raise OSError("replica unavailable")
+
+    monkeypatch.setattr(replica, "store_file", broken_store_file)
+    # alembic's logging config, applied by the migrations, disables loggers
+    monkeypatch.setattr(replication.logger, "disabled", False)
+    worker = ReplicationWorker(repository=tr, config={"MAX_ATTEMPTS": 1})
+    with caplog.at_level("ERROR", logger="tidepool.replication"):
+        assert worker.run(once=True) == 1
+    worker.shutdown()
+
+    assert "failed permanently" in caplog.text
+    assert "replica unavailable" in caplog.text
+
+
+def test_replication_worker_skips_blobs_already_on_replica(
+    write_behind_repository, testing_settings, monkeypatch
+):
+    testing_settings.PRIMARY_STORAGE_SERVICE["config"]["LAYOUT"] = "content"
+    testing_settings.REPLICATION_STORAGE_SERVICES[0]["config"]["LAYOUT"] = "content"
+    tr = TidepoolRepository()
+    first = tr.save_item(Item.from_data(b"same bytes", "first.txt"))
+    second = tr.save_item(Item.from_data(b"same bytes", "second.txt"))
+    replica = tr.storage.replication_services[0]
+
+    # the blob reached the replica some other way, e.g. a previous sync
+    first.files[0].data = b"same bytes"
+    replica.store_file(first.files[0])
+
+    stored = []
+    monkeypatch.setattr(replica, "store_file", stored.append)
+    worker = ReplicationWorker(repository=tr)
+    assert worker.run(once=True) == 2
+    assert stored == []
+
+    # the blob is still referenced by the second item, so it stays on the replica
+    tr.delete_item(item=first)
+    assert worker.run(once=True) == 0
+    assert replica.read_file(second.files[0]) == b"same bytes"
+    worker.shutdown()
+
+
+def test_enqueue_delete_drops_pending_stores_only_for_its_services(
+    write_behind_repository, text_data_item
+):
+    db = write_behind_repository.db
+    file = write_behind_repository.save_item(text_data_item).files[0]
+    db.enqueue_replication_tasks([file], ["other replica"], "store")
+    replica_name = write_behind_repository.storage.replication_services[0].name
+
+    db.enqueue_replication_tasks([file], [replica_name], "delete")
+
+    tasks = db.claim_replication_tasks()
+    assert [(task.service_name, task.action) for task in tasks] == [
+        ("other replica", "store"),
+        (replica_name, "delete"),
+    ]
+    assert tasks[0].date_created < tasks[1].date_created
@@ -1,4 +1,4 @@
-from tidepool import TidepoolRepository
+from tidepool import Item, ItemRow, TidepoolRepository
 
 
 def test_init_repository():
@@ -34,8 +34,43 @@ def test_read_file_data():
     pass
 
 
-def test_bulk_save_items():
-    pass
+def test_bulk_save_items(repository):
+    items = [
+        Item.from_data(f"item {i}".encode(), f"item-{i}.txt", title=f"Item {i}")
+        for i in range(25)
+    ]
+    saved_items = list(repository.bulk_save_items(iter(items), batch_size=10))
+
+    assert len(saved_items) == 25
+    assert len(list(repository.get_items())) == 25
+    for item in saved_items:
+        file = item.files[0]
+        assert repository.get_item(item.item_uuid).title == item.title
+        assert repository.read_file_data(file) == f"item {item.title[5:]}".encode()
+
+
+def test_bulk_save_items_upserts_existing_items(repository, text_data_item):
+    existing = repository.save_item(text_data_item)
+    existing.title = "Updated Title"
+    new_item = Item.from_data(b"new", "new.txt", title="New Item")
+
+    saved_items = list(repository.bulk_save_items(iter([existing, new_item])))
+
+    assert [item.title for item in saved_items] == ["Updated Title", "New Item"]
+    assert repository.get_item(existing.item_uuid).title == "Updated Title"
+    assert repository.get_item(new_item.item_uuid).title == "New Item"
+
+
+def test_get_item_rows(repository, text_data_item):
+    saved_item = repository.save_item(text_data_item)
+
+    rows = list(repository.get_item_rows())
+
+    assert len(rows) == 1
+    assert isinstance(rows[0], ItemRow)
+    assert rows[0].item_uuid == saved_item.item_uuid
+    assert rows[0].title == saved_item.title
+    assert rows[0].to_dict()["api_uri"] == saved_item.api_uri
 
 
 def test_bulk_update_items():
@@ -0,0 +1,104 @@
+from tidepool import Item
+from tidepool.search import build_search_document, flatten_metadata
+
+
+def test_flatten_metadata_skips_keywords():
+    values = flatten_metadata(
+        {
+            "@context": {"schema": "http://schema.org/"},
+            "@id": "abc",
+            "dc:title": "Hello",
+            "schema:keywords": ["coast", {"@value": "rocks"}],
+        }
+    )
+    assert values == ["Hello", "coast", "rocks"]
+
+
+def test_build_search_document_extracts_text_files(text_file_item, jpeg_image_item):
+    document = build_search_document(text_file_item)
+    assert document.title == "Tidepool Snippet from Wikipedia"
+    assert "Tidepool Snippet from Wikipedia" in document.metadata
+    assert "rocky intertidal shore" in document.content
+
+    assert build_search_document(jpeg_image_item).content == ""
+
+
+def test_search_title_metadata_and_file_text(repository, text_file_item, text_data_item):
+    text_file_item.jsonld_metadata.set_statement("dc:subject", "oceanography")
+    wikipedia = repository.save_item(text_file_item)
+    hello = repository.save_item(text_data_item)
+
+    def search(query):
+        results, _ = repository.search_items(query)
+        return [item.item_uuid for item, _ in results]
+
+    assert search("notes") == [hello.item_uuid]
+    assert search("oceanography") == [wikipedia.item_uuid]
+    assert search("intertidal shore") == [wikipedia.item_uuid]
+    assert search("intertid*") == [wikipedia.item_uuid]
+    assert search('hello OR "tidepool') == []
+
+
+def test_search_ranks_title_matches_first(repository):
+    in_text = repository.save_item(
+        Item.from_data(b"anemone " * 3, "notes.txt", title="Rock Pool Notes")
+    )
+    in_title = repository.save_item(
+        Item.from_data(b"nothing here", "anemone.txt", title="Anemone")
+    )
+
+    results, _ = repository.search_items("anemone")
+
+    assert [item.item_uuid for item, _ in results] == [
+        in_title.item_uuid,
+        in_text.item_uuid,
+    ]
+    assert results[0][1] > results[1][1]
+
+
+def test_search_index_follows_updates_and_deletes(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    item.title = "Greetings"
+    item.jsonld_metadata.set_statement("dc:title", "Greetings")
+    repository.save_item(item)
+
+    assert repository.search_items("notes")[0] == []
+    assert len(repository.search_items("greetings")[0]) == 1
+    # file text is read back from storage when the item is updated
+    assert len(repository.search_items("world")[0]) == 1
+
+    repository.delete_item(item=item)
+    assert repository.search_items("greetings")[0] == []
+
+
+def test_reindex_search(repository, testing_settings):
+    testing_settings.SEARCH["ENABLED"] = False
+    items = [
+        repository.save_item(Item.from_data(b"kelp", f"kelp-{i}.txt", title=f"Kelp {i}"))
+        for i in range(5)
+    ]
+    assert repository.search_items("kelp")[0] == []
+
+    testing_settings.SEARCH["ENABLED"] = True
+    assert repository.reindex_search(batch_size=2, workers=2) == 5
+
+    results, _ = repository.search_items("kelp", limit=10)
+    assert {item.item_uuid for item, _ in results} == {item.item_uuid for item in items}
+
+
+def test_search_pages_by_rank_and_uuid(repository):
+    titles = ["urchin", "urchin urchin", "urchin star", "urchin", "urchin urchin"]
+    for i, title in enumerate(titles):
+        repository.save_item(Item.from_data(b"data", f"item-{i}.txt", title=title))
+    everything, _ = repository.search_items("urchin", limit=10)
+    ranked = [(item.item_uuid, rank) for item, rank in everything]
+    assert ranked == sorted(ranked, key=lambda match: (-match[1], match[0]))
+
+    # ties in rank are broken by item_uuid, so pages split them without repeats
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.search_items("urchin", limit=2, cursor=cursor)
+        seen.extend((item.item_uuid, rank) for item, rank in page)
+        if not cursor:
+            break
+    assert seen == ranked
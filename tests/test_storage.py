@@ -0,0 +1,251 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+from tidepool import File, Item, TidepoolRepository
+from tidepool.services.storage import (
+    POSIXStorageService,
+    S3StorageService,
+    StorageFanout,
+)
+
+
+def test_posix_read_file_stream_full(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    chunks = list(repository.storage.read_file_stream(file, chunk_size=5))
+    assert chunks == [b"Hello", b" worl", b"d!"]
+
+
+def test_posix_read_file_stream_byte_range(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    stream = repository.storage.read_file_stream(file, start=6, end=11)
+    assert b"".join(stream) == b"world"
+    assert repository.get_file_size(file) == len(b"Hello world!")
+
+
+def test_s3_transfer_config_from_service_config(s3_storage_config):
+    storage = S3StorageService(
+        config={
+            **s3_storage_config,
+            "MULTIPART_PART_SIZE": 16 * 1024 * 1024,
+            "MULTIPART_CONCURRENCY": 4,
+        }
+    )
+    transfer_config = storage.get_transfer_config()
+    assert transfer_config.multipart_chunksize == 16 * 1024 * 1024
+    assert transfer_config.max_concurrency == 4
+
+
+def test_s3_store_file_streams_filepath(
+    monkeypatch, s3_storage_config, small_jpeg_image_filepath
+):
+    storage = S3StorageService(config=s3_storage_config)
+    s3client = storage.get_s3_client()
+    calls = []
+
+    def upload_fileobj(**kwargs):
+        # read the way multipart uploads do, a part at a time
+        while kwargs["Fileobj"].read(1024):
+            pass
+        calls.append(kwargs)
+
+    monkeypatch.setattr(s3client.s3, "upload_fileobj", upload_fileobj)
+    monkeypatch.setattr(storage, "get_s3_client", lambda: s3client)
+
+    file = File.from_filepath(small_jpeg_image_filepath)
+    file.item_uuid, file.file_uuid = "abc", "def"
+    storage.store_file(file)
+
+    data = Path(small_jpeg_image_filepath).read_bytes()
+    assert not calls[0]["Fileobj"].seekable()
+    assert calls[0]["Key"] == "abc/def__washington_coast_rock.jpg"
+    assert calls[0]["ExtraArgs"] == {"ContentType": "image/jpeg"}
+    assert calls[0]["Config"] is s3client.transfer_config
+    assert file.size == len(data)
+    assert file.checksum == hashlib.sha256(data).hexdigest()
+
+
+def test_s3_client_is_reused_across_operations(s3_storage_config):
+    storage = S3StorageService(config={**s3_storage_config, "MAX_POOL_CONNECTIONS": 25})
+    s3client = storage.get_s3_client()
+    assert storage.get_s3_client() is s3client
+    assert s3client.s3.meta.config.max_pool_connections == 25
+
+
+class StubStorageService:
+    def __init__(self, name, *, fail=False, barrier=None):
+        self.name = name
+        self.fail = fail
+        self.barrier = barrier
+
+    def store_file(self, file):
+        if self.barrier is not None:
+            # only passes once every service is storing at the same time
+            self.barrier.wait(timeout=5)
+        if self.fail:
+            raise OSError("storage unavailable")
+        return f"{self.name}/{file.file_uuid}"
+
+
+def test_storage_fanout_runs_services_concurrently():
+    fanout = StorageFanout(max_workers=4)
+    barrier = threading.Barrier(3)
+    services = [StubStorageService(f"service-{i}", barrier=barrier) for i in range(3)]
+    file = File(filename="a.txt", mimetype="text/plain", file_uuid="abc")
+
+    results = fanout.store_files([file], services)
+
+    assert len(results) == 3
+    assert all(result.success for result in results)
+
+
+def test_storage_fanout_reports_failure_per_service():
+    fanout = StorageFanout(max_workers=4)
+    services = [StubStorageService("ok"), StubStorageService("broken", fail=True)]
+    file = File(filename="a.txt", mimetype="text/plain", file_uuid="abc")
+
+    results = {result.service: result for result in fanout.store_files([file], services)}
+
+    assert results["ok"].success
+    assert not results["broken"].success
+    assert isinstance(results["broken"].error, OSError)
+
+
+def test_save_and_delete_item_with_replication(
+    replication_posix_storage, repository, text_data_item
+):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    assert len(repository.storage_services) == 2
+    for storage in repository.storage_services:
+        assert storage.read_file(file) == b"Hello world!"
+
+    repository.delete_item(item=item)
+    for storage in repository.storage_services:
+        _, file_path = storage.get_file_dir_and_path(file)
+        assert not file_path.exists()
+
+
+@pytest.fixture
+def content_addressed_repository(testing_settings, replication_posix_storage):
+    testing_settings.PRIMARY_STORAGE_SERVICE["config"]["LAYOUT"] = "content"
+    replication_posix_storage["config"]["LAYOUT"] = "content"
+    return TidepoolRepository()
+
+
+def test_storage_key_layouts(storage_primary_posix_path):
+    file = File(filename="a.txt", mimetype="text/plain", file_uuid="def")
+    file.item_uuid, file.content_digest = "abc", "0123" + "f" * 60
+    storage = POSIXStorageService(
+        config={"NAME": "uuid", "DATA_DIR": storage_primary_posix_path}
+    )
+    assert storage.get_storage_key(file) == "abc/def__a.txt"
+
+    storage = POSIXStorageService(
+        config={
+            "NAME": "content",
+            "DATA_DIR": storage_primary_posix_path,
+            "LAYOUT": "content",
+        }
+    )
+    assert storage.get_storage_key(file) == f"blobs/01/23/{file.content_digest}"
+    file.content_digest = None
+    assert storage.get_storage_key(file) == "abc/def__a.txt"
+
+
+def test_content_addressed_storage_deduplicates(
+    sqlite_db_service, content_addressed_repository
+):
+    tr = content_addressed_repository
+    first = tr.save_item(Item.from_data(b"same bytes", "first.txt"))
+    second = tr.save_item(Item.from_data(b"same bytes", "second.txt"))
+    first_file, second_file = first.files[0], second.files[0]
+
+    assert first_file.content_digest == hashlib.sha256(b"same bytes").hexdigest()
+    assert first_file.content_digest == second_file.content_digest
+    for storage in tr.storage_services:
+        _, blob_path = storage.get_file_dir_and_path(first_file)
+        assert blob_path.read_bytes() == b"same bytes"
+        assert len(list(Path(storage.data_dir).rglob("*.txt"))) == 0
+    assert tr.db.get_blob_ref_counts([first_file.content_digest]) == {
+        first_file.content_digest: 2
+    }
+
+    tr.delete_item(item=first)
+    for storage in tr.storage_services:
+        assert storage.read_file(second_file) == b"same bytes"
+
+    tr.delete_item(item=second)
+    assert tr.db.get_blob_ref_counts([second_file.content_digest]) == {}
+    for storage in tr.storage_services:
+        assert not storage.file_exists(second_file)
+
+
+def test_content_addressed_storage_releases_replaced_content(
+    sqlite_db_service, content_addressed_repository
+):
+    tr = content_addressed_repository
+    item = tr.save_item(Item.from_data(b"version 1", "notes.txt"))
+    old_file = tr.db.get_file(item.files[0].file_uuid)
+
+    item.files[0].data = b"version 2"
+    item = tr.save_item(item)
+    new_file = item.files[0]
+
+    assert new_file.content_digest != old_file.content_digest
+    assert tr.read_file_data(new_file) == b"version 2"
+    for storage in tr.storage_services:
+        assert not storage.file_exists(old_file)
+
+    # saving again without new data keeps the stored content
+    item.files[0].data = None
+    item = tr.save_item(item)
+    assert item.files[0].content_digest == new_file.content_digest
+    assert tr.read_file_data(item.files[0]) == b"version 2"
+
+
+def test_s3_content_addressed_store_skips_existing_blob(monkeypatch, s3_storage_config):
+    storage = S3StorageService(config={**s3_storage_config, "LAYOUT": "content"})
+    s3client = storage.get_s3_client()
+    uploads = []
+    monkeypatch.setattr(s3client.s3, "head_object", lambda **_: {})
+    monkeypatch.setattr(
+        s3client.s3, "upload_fileobj", lambda **kwargs: uploads.append(kwargs)
+    )
+
+    file = File(filename="a.txt", mimetype="text/plain", data=b"abc")
+    file.item_uuid, file.file_uuid = "abc", "def"
+    file.content_digest = hashlib.sha256(b"abc").hexdigest()
+
+    location = storage.store_file(file)
+    assert location.endswith(f"/blobs/ba/78/{file.content_digest}")
+    assert uploads == []
+
+
+def test_posix_read_file_mmap_chunks_and_readinto(repository, text_data_item):
+    item = repository.save_item(text_data_item)
+    file = item.files[0]
+    storage = repository.storage
+
+    with storage.read_file_mmap(file) as view:
+        assert view[6:11] == b"world"
+        assert len(view) == 12
+
+    with storage.read_file_mmap(file) as view:
+        kept = view[6:11]
+    assert kept == b"world"
+    kept.release()
+
+    buffer = bytearray(5)
+    chunks = [bytes(chunk) for chunk in storage.read_file_chunks(file, buffer=buffer)]
+    assert chunks == [b"Hello", b" worl", b"d!"]
+    ranged = storage.read_file_chunks(file, buffer=buffer, start=6, end=11)
+    assert [bytes(chunk) for chunk in ranged] == [b"world"]
+
+    assert storage.read_file_into(file, buffer, offset=6) == 5
+    assert buffer == b"world"
+    assert storage.read_file_into(file, bytearray(20)) == 12
@@ -0,0 +1,236 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from tidepool import File
+from tidepool.services.storage import CachingStorageService
+
+
+@pytest.fixture
+def cache_config(tmp_path):
+    return {
+        "DIR": str(tmp_path / "cache"),
+        "BACKEND": {
+            "module": "tidepool.services.storage",
+            "class": "POSIXStorageService",
+            "config": {"NAME": "backend", "DATA_DIR": str(tmp_path / "backend")},
+        },
+    }
+
+
+@pytest.fixture
+def cached_storage(cache_config):
+    return CachingStorageService(config=cache_config, replication=True)
+
+
+def make_file(file_uuid, data):
+    return File(
+        filename="a.txt",
+        mimetype="text/plain",
+        data=data,
+        item_uuid="item",
+        file_uuid=file_uuid,
+    )
+
+
+def count_backend_reads(monkeypatch, storage, delay=0.0):
+    reads = []
+    read_file_stream = storage.backend.read_file_stream
+
+    def counted(file, **kwargs):
+        reads.append(file.file_uuid)
+        time.sleep(delay)
+        return read_file_stream(file, **kwargs)
+
+    monkeypatch.setattr(storage.backend, "read_file_stream", counted)
+    return reads
+
+
+def test_cache_reads_through_and_serves_hits(monkeypatch, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    reads = count_backend_reads(monkeypatch, cached_storage)
+
+    assert cached_storage.read_file(file) == b"Hello world!"
+    assert b"".join(cached_storage.read_file_stream(file, start=6, end=11)) == b"world"
+    assert cached_storage.get_file_size(file) == 12
+
+    assert reads == ["f1"]
+    stats = cached_storage.get_cache_stats()
+    assert (stats["misses"], stats["disk_hits"]) == (1, 1)
+    assert stats["disk_bytes"] == 12
+    assert cached_storage.name == "backend"
+
+
+def test_cache_invalidated_on_store_and_delete(cached_storage):
+    file = make_file("f1", b"old content")
+    cached_storage.store_file(file)
+    assert cached_storage.read_file(file) == b"old content"
+
+    file.data = b"new content"
+    cached_storage.store_file(file)
+    assert cached_storage.get_cache_stats()["disk_entries"] == 0
+    assert cached_storage.read_file(file) == b"new content"
+
+    cached_storage.delete_file(file)
+    assert cached_storage.get_cache_stats()["disk_entries"] == 0
+    with pytest.raises(FileNotFoundError):
+        cached_storage.read_file(file)
+
+
+def test_cache_misses_on_changed_checksum(monkeypatch, cached_storage):
+    file = make_file("f1", b"old content")
+    cached_storage.store_file(file)
+    cached_storage.read_file(file)
+
+    # replaced by another process, bypassing this cache
+    cached_storage.backend.store_file(make_file("f1", b"new content"))
+    file.checksum = "0" * 64
+    reads = count_backend_reads(monkeypatch, cached_storage)
+    assert cached_storage.read_file(file) == b"new content"
+    assert reads == ["f1"]
+
+
+def test_cache_coalesces_concurrent_misses(monkeypatch, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    reads = count_backend_reads(monkeypatch, cached_storage, delay=0.2)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cached_storage.read_file(file)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"Hello world!"] * 8
+    assert reads == ["f1"]
+    assert cached_storage.get_cache_stats()["coalesced"] >= 1
+
+
+def test_cache_evicts_least_recently_used(cache_config):
+    storage = CachingStorageService(
+        config={**cache_config, "MAX_BYTES": 25}, replication=True
+    )
+    files = [make_file(f"f{i}", b"x" * 10) for i in range(3)]
+    for file in files:
+        storage.store_file(file)
+
+    storage.read_file(files[0])
+    storage.read_file(files[1])
+    storage.read_file(files[0])
+    storage.read_file(files[2])
+
+    stats = storage.get_cache_stats()
+    assert stats["evictions"] == 1
+    assert stats["disk_bytes"] == 20
+    assert storage.read_file(files[0]) == b"x" * 10
+    assert storage.get_cache_stats()["disk_hits"] == 2
+
+
+def test_cache_memory_tier_and_bypass(cache_config):
+    storage = CachingStorageService(
+        config={
+            **cache_config,
+            "MAX_ITEM_BYTES": 100,
+            "MEMORY_MAX_BYTES": 1024,
+            "MEMORY_MAX_ITEM_BYTES": 16,
+        },
+        replication=True,
+    )
+    small, large = make_file("small", b"tiny"), make_file("large", b"y" * 200)
+    storage.store_file(small)
+    storage.store_file(large)
+
+    assert storage.read_file(small) == b"tiny"
+    assert storage.read_file(small) == b"tiny"
+    assert storage.read_file(large) == b"y" * 200
+
+    stats = storage.get_cache_stats()
+    assert (stats["misses"], stats["memory_hits"], stats["bypassed"]) == (1, 1, 1)
+    assert stats["memory_bytes"] == 4
+    assert stats["disk_entries"] == 1
+
+
+def test_cache_index_survives_restart(monkeypatch, cache_config, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    cached_storage.read_file(file)
+
+    restarted = CachingStorageService(config=cache_config, replication=True)
+    reads = count_backend_reads(monkeypatch, restarted)
+    assert restarted.read_file(file) == b"Hello world!"
+    assert reads == []
+    assert restarted.get_cache_stats()["disk_hits"] == 1
+
+
+def test_cache_miss_streams_while_caching(monkeypatch, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    release = threading.Event()
+
+    def chunked(file, **kwargs):
+        yield b"Hell"
+        release.wait(timeout=5)
+        yield b"o world!"
+
+    monkeypatch.setattr(cached_storage.backend, "read_file_stream", chunked)
+    stream = cached_storage.read_file_stream(file)
+    # served before the backend has sent the rest of the file
+    assert next(stream) == b"Hell"
+    release.set()
+    assert b"".join(stream) == b"o world!"
+    assert cached_storage.get_cache_stats()["disk_bytes"] == 12
+
+    other = make_file("f2", b"Hello world!")
+    cached_storage.store_file(other)
+    monkeypatch.undo()
+    ranged = cached_storage.read_file_stream(other, start=6, end=11)
+    assert b"".join(ranged) == b"world"
+    assert cached_storage.get_cache_stats()["disk_entries"] == 1
+
+
+def test_cache_slow_reader_does_not_stall_others(monkeypatch, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    reads = count_backend_reads(monkeypatch, cached_storage)
+
+    slow = cached_storage.read_file_stream(file, chunk_size=4)
+    assert next(slow) == b"Hell"
+    # the slow reader is paused mid-file, while another reader is served in full
+    results = []
+    other = threading.Thread(
+        target=lambda: results.append(cached_storage.read_file(file))
+    )
+    other.start()
+    other.join(timeout=5)
+    assert results == [b"Hello world!"]
+    assert b"".join(slow) == b"o world!"
+
+    assert reads == ["f1"]
+    stats = cached_storage.get_cache_stats()
+    assert stats["coalesced"] + stats["disk_hits"] == 1
+
+
+def test_cache_validates_files_without_checksum(monkeypatch, cached_storage):
+    file = make_file("f1", b"Hello world!")
+    cached_storage.store_file(file)
+    file.checksum = None
+    file.date_updated = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    cached_storage.read_file(file)
+    reads = count_backend_reads(monkeypatch, cached_storage)
+
+    assert cached_storage.read_file(file) == b"Hello world!"
+    assert reads == []
+    file.date_updated += datetime.timedelta(seconds=1)
+    assert cached_storage.read_file(file) == b"Hello world!"
+    assert reads == ["f1"]
+
+    file.size = file.date_updated = None
+    assert cached_storage.read_file(file) == b"Hello world!"
+    assert cached_storage.get_cache_stats()["bypassed"] == 1
@@ -1,15 +1,18 @@
 """tidepool"""
 
-from tidepool.file import File
-from tidepool.item import Item, ItemMetadata
+from tidepool.file import File, FileVersion
+from tidepool.item import Item, ItemMetadata, ItemRow, ItemVersion
 from tidepool.relationship import Relationship
 from tidepool.repository import TidepoolRepository
 from tidepool.settings.manager import settings
 
 __all__ = [
     "File",
+    "FileVersion",
     "Item",
     "ItemMetadata",
+    "ItemRow",
+    "ItemVersion",
     "Relationship",
     "TidepoolRepository",
     "settings",
@@ -1,12 +1,29 @@
 """tidepool/api/app.py"""
 
+import datetime
 import logging
+import os
+import threading
 import time
+import unicodedata
+from pathlib import Path
+from urllib.parse import quote
 
-from flask import Flask, jsonify, g
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    send_file,
+    stream_with_context,
+)
 from flask_cors import CORS
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import dump_options_header
 
-from tidepool import TidepoolRepository
+from tidepool import File, FileVersion, Relationship, TidepoolRepository
+from tidepool.services.db import SQLDBService
 from tidepool.settings.manager import settings
 
 logger = logging.getLogger(__name__)
@@ -14,10 +31,34 @@ logger = logging.getLogger(__name__)
 api_app = Flask(__name__)
 CORS(api_app)
 
+_repository_lock = threading.Lock()
+
+API_ITEMS_DEFAULT_LIMIT = 50
+API_ITEMS_MAX_LIMIT = 1_000
+API_SEARCH_DEFAULT_LIMIT = 20
+
+
+def get_repository() -> TidepoolRepository:
+    """Return the TidepoolRepository shared by all requests to this app.
+
+    Storage services are built once, on first use.  The repository's DB session is
+    thread-local, so each request works with its own session, which is removed in
+    teardown_request.
+    """
+    tr = api_app.extensions.get("tidepool_repository")
+    if tr is None:
+        with _repository_lock:
+            tr = api_app.extensions.get("tidepool_repository")
+            if tr is None:
+                tr = TidepoolRepository(db=SQLDBService.scoped())
+                api_app.extensions["tidepool_repository"] = tr
+    return tr
+
 
 @api_app.before_request
 def before_request():
     g.start_time = time.time()
+    g.tr = get_repository()
 
 
 @api_app.after_request
@@ -26,32 +67,206 @@ def after_request(response):
     return response
 
 
+@api_app.teardown_request
+def teardown_request(_exc: BaseException | None) -> None:
+    tr = g.pop("tr", None)
+    if tr is not None:
+        tr.db.close()
+
+
 @api_app.route("/api", methods=["GET"])
 def root():
     return jsonify({"repository_name": settings.REPOSITORY_NAME})
 
 
+@api_app.route("/api/replication/status", methods=["GET"])
+def replication_status():
+    tr = g.tr
+    return jsonify(tr.get_replication_status())
+
+
+@api_app.route("/api/storage/health", methods=["GET"])
+def storage_health():
+    tr = g.tr
+    return jsonify(tr.get_storage_health())
+
+
+@api_app.route("/api/storage/cache", methods=["GET"])
+def storage_cache():
+    tr = g.tr
+    return jsonify(tr.get_storage_cache_stats())
+
+
+def parse_datetime_arg(name: str) -> datetime.datetime | None:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"'{name}' must be an ISO 8601 datetime") from exc
+    # dates are stored in UTC; naive datetimes are assumed to be UTC already
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.UTC)
+    return parsed
+
+
 @api_app.route("/api/items", methods=["GET"])
 def items():
-    # TODO: this needs pagination, simple filtering, and sorting
-    #   - this could drive a very simple datatables interface
-    tr = TidepoolRepository()
-    items = [item.to_dict() for item in tr.get_items()]
-    return jsonify(items)
+    """Return a page of items, with keyset pagination, sorting and simple filters.
+
+    Query parameters: limit, cursor, sort ("date_created" or "title"), order ("asc"
+    or "desc"), title_prefix, mimetype, created_after and created_before.  Items can
+    also be filtered on a JSON-LD metadata property, e.g. "dc:creator", with an exact
+    value or an inclusive value_from and value_to range.  Follow next_cursor in the
+    response to fetch the next page.
+    """
+    tr = g.tr
+    try:
+        limit = int(request.args.get("limit", API_ITEMS_DEFAULT_LIMIT))
+        limit = max(min(limit, API_ITEMS_MAX_LIMIT), 1)
+        page, next_cursor = tr.query_items(
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            sort=request.args.get("sort", "date_created"),
+            direction=request.args.get("order", "asc"),
+            title_prefix=request.args.get("title_prefix"),
+            mimetype=request.args.get("mimetype"),
+            created_after=parse_datetime_arg("created_after"),
+            created_before=parse_datetime_arg("created_before"),
+            metadata_property=request.args.get("property"),
+            metadata_value=request.args.get("value"),
+            metadata_value_from=request.args.get("value_from"),
+            metadata_value_to=request.args.get("value_to"),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(
+        {
+            "items": [item.to_dict() for item in page],
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@api_app.route("/api/search", methods=["GET"])
+def search():
+    """Return a page of items matching a full-text query, best match first.
+
+    Query parameters: q, limit and cursor.  Every word of q must match an item's
+    title, metadata or file text; a word ending in "*" matches as a prefix.
+    """
+    tr = g.tr
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "'q' is required"}), 400
+    try:
+        limit = int(request.args.get("limit", API_SEARCH_DEFAULT_LIMIT))
+        limit = max(min(limit, API_ITEMS_MAX_LIMIT), 1)
+        results, next_cursor = tr.search_items(
+            query,
+            limit=limit,
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(
+        {
+            "query": query,
+            "items": [{**item.to_dict(), "rank": rank} for item, rank in results],
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@api_app.route("/api/items/export", methods=["GET"])
+def items_export():
+    """Stream every item as newline-delimited JSON, optionally only recent changes.
+
+    Items are read from a server-side cursor and written out one line at a time,
+    so memory stays flat and the first line is sent immediately.
+    """
+    tr = g.tr
+    try:
+        updated_since = parse_datetime_arg("updated_since")
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    def generate_lines():
+        for item in tr.get_items(updated_since=updated_since):
+            yield item.to_json() + "\n"
+
+    # stream_with_context keeps the request, and its DB session, open while streaming
+    return api_app.response_class(
+        stream_with_context(generate_lines()),
+        mimetype="application/x-ndjson",
+    )
+
+
+def get_not_modified_response(
+    etag: str,
+    last_modified: datetime.datetime | None,
+) -> Response | None:
+    """Return a 304 response if the client's cached copy is current, else None.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        not_modified = False
+    if not not_modified:
+        return None
+    return set_validators(api_app.response_class(status=304), etag, last_modified)
+
+
+def set_validators(
+    response: Response,
+    etag: str | None,
+    last_modified: datetime.datetime | None,
+) -> Response:
+    """Add ETag, Last-Modified and the route's configured Cache-Control."""
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    cache_control = settings.API_CACHE_CONTROL.get(request.endpoint)
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def get_file_version(item_uuid: str, file_uuid: str) -> FileVersion | None:
+    """Return the version of a file, if it exists and belongs to the item."""
+    version = g.tr.get_file_version(file_uuid)
+    if version is None or version.item_uuid != item_uuid:
+        return None
+    return version
 
 
 @api_app.route("/api/items/<item_uuid>", methods=["GET"])
 def items_item(item_uuid: str):
-    # TODO: standardize this; maybe embed as @before_request
-    tr = TidepoolRepository()
+    tr = g.tr
+    version = tr.get_item_version(item_uuid)
+    if version and (
+        response := get_not_modified_response(version.etag, version.last_modified)
+    ):
+        return response
     item = tr.get_item(item_uuid=item_uuid)
-    return jsonify(item.to_dict())
+    return set_validators(
+        jsonify(item.to_dict()),
+        version and version.etag,
+        version and version.last_modified,
+    )
 
 
 @api_app.route("/api/items/<item_uuid>/delete", methods=["GET"])
 def items_item_delete(item_uuid: str):
-    # TODO: standardize this; maybe embed as @before_request
-    tr = TidepoolRepository()
+    tr = g.tr
     item = tr.get_item(item_uuid=item_uuid)
     tr.delete_item(item=item)
     return jsonify(
@@ -65,33 +280,278 @@ def items_item_delete(item_uuid: str):
 
 @api_app.route("/api/items/<item_uuid>/files", methods=["GET"])
 def items_item_files(item_uuid: str):
-    tr = TidepoolRepository()
+    tr = g.tr
+    version = tr.get_item_version(item_uuid)
+    if version and (
+        response := get_not_modified_response(version.etag, version.last_modified)
+    ):
+        return response
     item = tr.get_item(item_uuid=item_uuid)
-    return jsonify([file.to_dict() for file in item.files])
+    return set_validators(
+        jsonify([file.to_dict() for file in item.files]),
+        version and version.etag,
+        version and version.last_modified,
+    )
 
 
 @api_app.route("/api/items/<item_uuid>/files/<file_uuid>", methods=["GET"])
 def items_item_files_file(item_uuid: str, file_uuid: str):
-    tr = TidepoolRepository()
+    tr = g.tr
+    version = get_file_version(item_uuid, file_uuid)
+    if version and (
+        response := get_not_modified_response(version.etag, version.last_modified)
+    ):
+        return response
     item = tr.get_item(item_uuid=item_uuid)
     file = item.get_file(file_uuid=file_uuid)
-    return jsonify(file.to_dict())
+    return set_validators(
+        jsonify(file.to_dict()),
+        version and version.etag,
+        version and version.last_modified,
+    )
+
+
+@api_app.route("/api/items/<item_uuid>/relationships", methods=["GET"])
+def items_item_relationships(item_uuid: str):
+    """Return an item's relationships, in either or both directions.
+
+    Query parameters: predicate and direction ("out", "in" or "both", the default).
+    """
+    tr = g.tr
+    try:
+        relationships = tr.get_neighbors(
+            item_uuid,
+            predicate=request.args.get("predicate"),
+            direction=request.args.get("direction", "both"),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify([relationship.to_dict() for relationship in relationships])
+
+
+def parse_relationships_body() -> list[Relationship]:
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON list of relationships")  # noqa: TRY004
+    return [Relationship.from_dict(data) for data in payload]
+
+
+@api_app.route("/api/relationships", methods=["GET"])
+def relationships():
+    """Return relationships matching the subject, predicate and object parameters."""
+    tr = g.tr
+    subject = request.args.get("subject")
+    predicate = request.args.get("predicate")
+    object_ = request.args.get("object")
+    if subject is None and object_ is None:
+        return jsonify({"error": "'subject' or 'object' is required"}), 400
+    try:
+        limit = int(request.args.get("limit", API_ITEMS_MAX_LIMIT))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    results = tr.get_relationships(
+        subject=subject,
+        predicate=predicate,
+        object=object_,
+        limit=max(min(limit, API_ITEMS_MAX_LIMIT), 1),
+    )
+    return jsonify([relationship.to_dict() for relationship in results])
+
+
+@api_app.route("/api/relationships", methods=["POST"])
+def relationships_add():
+    """Add a JSON list of {subject, predicate, object} relationships."""
+    tr = g.tr
+    try:
+        relationships = parse_relationships_body()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    added = tr.add_relationships(relationships)
+    return jsonify({"action": "add", "count": added, "success": True}), 200
+
+
+@api_app.route("/api/relationships", methods=["DELETE"])
+def relationships_remove():
+    """Remove a JSON list of {subject, predicate, object} relationships."""
+    tr = g.tr
+    try:
+        relationships = parse_relationships_body()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    removed = tr.remove_relationships(relationships)
+    return jsonify({"action": "remove", "count": removed, "success": True}), 200
+
+
+@api_app.route("/api/relationships/traverse", methods=["GET"])
+def relationships_traverse():
+    """Return all relationships reachable from a node, with their depth.
+
+    Query parameters: start, predicate (repeatable), direction ("out" or "in") and
+    max_depth.
+    """
+    tr = g.tr
+    start = request.args.get("start")
+    if not start:
+        return jsonify({"error": "'start' is required"}), 400
+    try:
+        max_depth = request.args.get("max_depth", type=int)
+        results = tr.traverse_relationships(
+            start,
+            predicates=request.args.getlist("predicate") or None,
+            direction=request.args.get("direction", "out"),
+            max_depth=max_depth,
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(
+        {
+            "start": start,
+            "relationships": [
+                {**relationship.to_dict(), "depth": depth}
+                for relationship, depth in results
+            ],
+        }
+    )
+
+
+def get_requested_byte_range(
+    file_size: int,
+    etag: str | None,
+    last_modified: datetime.datetime | None,
+) -> tuple[int, int] | None:
+    """Return the (start, end) byte range requested for a file, if it should be honored.
+
+    The end offset is exclusive.  None is returned when the full file should be sent:
+    no Range header, a multi-range request, or an If-Range validator that no longer
+    matches the file.  An If-Range ETag must match strongly.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != "bytes" or len(byte_range.ranges) != 1:
+        return None
+
+    if_range = request.if_range
+    if if_range.etag:
+        weak = request.headers.get("If-Range", "").startswith("W/")
+        if weak or if_range.etag != etag:
+            return None
+    elif if_range.date and (
+        not last_modified or last_modified.replace(microsecond=0) > if_range.date
+    ):
+        return None
+
+    range_for_length = byte_range.range_for_length(file_size)
+    if range_for_length is None:
+        raise RequestedRangeNotSatisfiable(length=file_size)
+    return range_for_length
+
+
+def get_content_disposition(filename: str) -> str:
+    """Build an inline Content-Disposition header as send_file does.
+
+    Quotes in the filename are escaped, and a non-ASCII filename is given as an
+    ASCII approximation plus its UTF-8 form in filename* (RFC 5987).
+    """
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename)
+        simple = simple.encode("ascii", "ignore").decode("ascii")
+        # safe = RFC 5987 attr-char
+        quoted = quote(filename, safe="!#$&+-.^_`|~")
+        names = {"filename": simple, "filename*": f"UTF-8''{quoted}"}
+    else:
+        names = {"filename": filename}
+    return dump_options_header("inline", names)
+
+
+def send_local_file(
+    file: File,
+    path: Path,
+    etag: str | None,
+    last_modified: datetime.datetime | None,
+) -> Response:
+    """Send a file from local disk without reading it into Python.
+
+    By default the open file is handed to the WSGI server's file_wrapper, which
+    sends it with sendfile(2) where supported, and ranges and conditional requests
+    are answered by werkzeug.  In "x-accel-redirect" and "x-sendfile" modes only a
+    header naming the file is returned, and nginx or Apache send the bytes.
+    """
+    config = settings.API_FILE_SERVING
+    mimetype = file.mimetype or "application/octet-stream"
+    disposition = get_content_disposition(file.filename)
+    if config["MODE"] == "x-accel-redirect":
+        try:
+            relative_path = path.relative_to(
+                os.path.expandvars(config["X_ACCEL_REDIRECT_ROOT"])
+            )
+        except (TypeError, ValueError):
+            # outside the directory served by nginx, e.g. a cached remote file
+            relative_path = None
+        if relative_path is not None:
+            response = api_app.response_class(mimetype=mimetype)
+            prefix = config["X_ACCEL_REDIRECT_PREFIX"].rstrip("/")
+            response.headers["X-Accel-Redirect"] = (
+                f"{prefix}/{quote(relative_path.as_posix())}"
+            )
+            response.headers["Content-Disposition"] = disposition
+            return response
+    elif config["MODE"] == "x-sendfile":
+        response = api_app.response_class(mimetype=mimetype)
+        response.headers["X-Sendfile"] = str(path)
+        response.headers["Content-Disposition"] = disposition
+        return response
+
+    return send_file(
+        path,
+        mimetype=mimetype,
+        download_name=file.filename,
+        conditional=True,
+        etag=etag or False,
+        last_modified=last_modified,
+    )
 
 
-# TODO: support streaming
 @api_app.route("/api/items/<item_uuid>/files/<file_uuid>/data", methods=["GET"])
 def item_file_data(item_uuid: str, file_uuid: str):
-    tr = TidepoolRepository()
+    tr = g.tr
+    version = get_file_version(item_uuid, file_uuid)
+    etag = version and version.data_etag
+    last_modified = version and version.last_modified
+    if version and (response := get_not_modified_response(etag, last_modified)):
+        return response
+
     item = tr.get_item(item_uuid=item_uuid)
     file = item.get_file(file_uuid)
-    file_data = tr.read_file_data(file)
+    last_modified = last_modified or file.date_updated or file.date_created
+
+    if settings.API_FILE_SERVING["MODE"] != "stream" and (
+        local_path := tr.get_local_path(file)
+    ):
+        return set_validators(
+            send_local_file(file, local_path, etag, last_modified),
+            etag,
+            last_modified,
+        )
+
+    file_size = tr.get_file_size(file)
+
+    byte_range = get_requested_byte_range(file_size, etag, last_modified)
+    start, end = byte_range or (0, file_size)
+
     response = api_app.response_class(
-        response=file_data,
-        status=200,
+        response=tr.read_file_stream(file, start=start, end=end),
+        status=206 if byte_range else 200,
         mimetype=file.mimetype,
     )
-    response.headers["Content-Disposition"] = f'inline; filename="{file.filename}"'
-    return response
+    response.content_length = end - start
+    response.accept_ranges = "bytes"
+    if byte_range:
+        response.content_range = f"bytes {start}-{end - 1}/{file_size}"
+    response.headers["Content-Disposition"] = get_content_disposition(file.filename)
+    return set_validators(response, etag, last_modified)
 
 
 if __name__ == "__main__":
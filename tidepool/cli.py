@@ -0,0 +1,157 @@
+"""tidepool/cli.py"""
+
+import json
+import logging
+
+import click
+
+from tidepool import TidepoolRepository
+from tidepool.fixity import FixityAuditor
+from tidepool.reconcile import Reconciler
+from tidepool.replication import ReplicationWorker
+
+logger = logging.getLogger(__name__)
+
+
+@click.group()
+def main() -> None:
+    """Tidepool repository command line interface."""
+
+
+@main.command("replication-worker")
+@click.option(
+    "--once",
+    is_flag=True,
+    help="Exit when no due replication tasks remain, instead of polling.",
+)
+def replication_worker(*, once: bool) -> None:
+    """Drain the write-behind replication task outbox."""
+    worker = ReplicationWorker()
+    try:
+        processed = worker.run(once=once)
+    except KeyboardInterrupt:
+        processed = None
+    finally:
+        worker.shutdown()
+    if processed is not None:
+        click.echo(f"processed {processed} replication tasks")
+
+
+@main.command("replication-status")
+def replication_status() -> None:
+    """Show replication queue depth and lag per replication service."""
+    tr = TidepoolRepository()
+    click.echo(json.dumps(tr.get_replication_status(), indent=2))
+
+
+@main.command("replication-retry")
+@click.option("--service", "service_name", help="Only retry tasks for this service.")
+def replication_retry(service_name: str | None) -> None:
+    """Reset replication tasks that exhausted their attempts back to pending."""
+    tr = TidepoolRepository()
+    count = tr.db.retry_failed_replication_tasks(service_name=service_name)
+    click.echo(f"reset {count} failed replication tasks")
+
+
+@main.command("search-reindex")
+@click.option("--batch-size", type=int, help="Items indexed per transaction.")
+@click.option("--workers", type=int, help="Threads reading file text from storage.")
+def search_reindex(batch_size: int | None, workers: int | None) -> None:
+    """Rebuild the full-text search index of all items."""
+    tr = TidepoolRepository()
+    count = tr.reindex_search(batch_size=batch_size, workers=workers)
+    click.echo(f"indexed {count} items for search")
+
+
+@main.command("metadata-ensure-indexes")
+@click.argument("properties", nargs=-1)
+def metadata_ensure_indexes(properties: tuple[str, ...]) -> None:
+    """Create indexes for metadata PROPERTIES, default METADATA_INDEXED_PROPERTIES."""
+    tr = TidepoolRepository()
+    properties = list(properties) or tr.settings.METADATA_INDEXED_PROPERTIES
+    tr.db.ensure_metadata_indexes(properties)
+    click.echo(f"indexed metadata properties: {', '.join(properties)}")
+
+
+@main.command("fixity-audit")
+@click.option(
+    "--restart",
+    is_flag=True,
+    help="Start a new audit instead of resuming an unfinished one.",
+)
+@click.option("--workers", type=int, help="Files read and hashed concurrently.")
+@click.option(
+    "--max-bytes-per-second",
+    type=int,
+    help="Cap on bytes read per second by all workers; 0 for no limit.",
+)
+def fixity_audit(
+    *,
+    restart: bool,
+    workers: int | None,
+    max_bytes_per_second: int | None,
+) -> None:
+    """Re-hash stored files on every storage service and verify their checksums."""
+    config = {}
+    if workers:
+        config["AUDIT_WORKERS"] = workers
+    if max_bytes_per_second is not None:
+        config["AUDIT_MAX_BYTES_PER_SECOND"] = max_bytes_per_second
+    auditor = FixityAuditor(config=config)
+    try:
+        run = auditor.run(restart=restart)
+    except KeyboardInterrupt:
+        click.echo("fixity audit interrupted; run again to resume")
+        return
+    click.echo(json.dumps(run.to_dict(), indent=2))
+    for result in auditor.repository.db.get_fixity_audit_failures(run.run_uuid):
+        click.echo(
+            f"{result.status}: file {result.file_uuid} on '{result.service_name}'"
+            + (f" ({result.error})" if result.error else "")
+        )
+
+
+@main.command("reconcile")
+@click.option(
+    "--service",
+    "service_names",
+    multiple=True,
+    help="Only reconcile this storage service; may be repeated.",
+)
+@click.option(
+    "--repair",
+    is_flag=True,
+    help="Copy missing and mismatched objects from a healthy storage service.",
+)
+@click.option(
+    "--delete-extra",
+    is_flag=True,
+    help="Delete objects that no file refers to.",
+)
+@click.option("--workers", type=int, help="Partitions reconciled concurrently.")
+def reconcile(
+    *,
+    service_names: tuple[str, ...],
+    repair: bool,
+    delete_extra: bool,
+    workers: int | None,
+) -> None:
+    """Find, and optionally fix, differences between files and storage services.
+
+    Each issue is written as a line of JSON, followed by a summary.
+    """
+    reconciler = Reconciler(config={"WORKERS": workers} if workers else None)
+    counts: dict[str, int] = {}
+    for issue in reconciler.run(
+        service_names=list(service_names) or None,
+        repair=repair,
+        delete_extra=delete_extra,
+    ):
+        click.echo(json.dumps(issue.to_dict()))
+        status = "repaired" if issue.repaired else issue.kind
+        counts[status] = counts.get(status, 0) + 1
+    click.echo(json.dumps({"issues": counts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""tidepool/contexts.py"""
+# ruff: noqa: D105
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from pyld import jsonld
+from pyld.context_resolver import ContextResolver
+
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+# a verbatim copy of the published schema.org context, served for every URL
+# schema.org publishes it under, so documents using it expand without network access
+SCHEMA_ORG_CONTEXT_FILE = Path(__file__).parent / "data" / "schemaorg-context.jsonld"
+SCHEMA_ORG_CONTEXT_URLS = (
+    "http://schema.org",
+    "http://schema.org/",
+    "https://schema.org",
+    "https://schema.org/",
+    "http://schema.org/docs/jsonldcontext.jsonld",
+    "https://schema.org/docs/jsonldcontext.jsonld",
+)
+
+
+def load_bundled_contexts() -> dict[str, dict]:
+    """Return the context documents shipped with tidepool, by context URL."""
+    with open(SCHEMA_ORG_CONTEXT_FILE) as f:
+        schema_org_context = json.load(f)
+    return dict.fromkeys(SCHEMA_ORG_CONTEXT_URLS, schema_org_context)
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ttl_seconds.
+
+    Implements the get/setitem interface pyld expects of its shared context cache.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float | None, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: object = None) -> object:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key: str, value: object) -> None:
+        expires_at = None
+        if self.ttl_seconds is not None:
+            expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class ContextRegistry:
+    """Serve JSON-LD context documents locally, and reuse resolved contexts.
+
+    Registered contexts, including the bundled copy of the schema.org context,
+    never touch the network.  Other context URLs are fetched only
+    when allow_remote is True, and are then cached for ttl_seconds.  Resolved
+    (processed) contexts are kept in a cache shared by all pyld calls made with
+    options(), so the same context is not parsed again.
+    """
+
+    def __init__(
+        self,
+        contexts: dict[str, dict] | None = None,
+        *,
+        allow_remote: bool = False,
+        max_entries: int = 256,
+        ttl_seconds: float | None = 86_400,
+        remote_timeout: float = 10,
+    ):
+        self.allow_remote = allow_remote
+        self._contexts: dict[str, dict] = {
+            **load_bundled_contexts(),
+            **(contexts or {}),
+        }
+        self._remote_documents = TTLCache(max_entries, ttl_seconds)
+        self._resolved_contexts = TTLCache(max_entries, ttl_seconds)
+        self._context_resolver = ContextResolver(
+            self._resolved_contexts, self.document_loader
+        )
+        # the resolver's own cache would otherwise grow without bound
+        self._context_resolver.per_op_cache = TTLCache(max_entries, ttl_seconds)
+        self._remote_loader = None
+        if allow_remote:
+            self._remote_loader = jsonld.requests_document_loader(
+                timeout=remote_timeout
+            )
+
+    @classmethod
+    def from_settings(cls) -> "ContextRegistry":
+        contexts = {}
+        for url, filepath in settings.JSONLD_CONTEXT_FILES.items():
+            with open(filepath) as f:
+                contexts[url] = json.load(f)
+        return cls(
+            contexts,
+            allow_remote=settings.JSONLD_ALLOW_REMOTE_CONTEXTS,
+            max_entries=settings.JSONLD_CONTEXT_CACHE["MAX_ENTRIES"],
+            ttl_seconds=settings.JSONLD_CONTEXT_CACHE["TTL_SECONDS"],
+        )
+
+    def register(self, url: str, document: dict) -> None:
+        self._contexts[url] = document
+
+    def document_loader(self, url: str, options: dict | None = None) -> dict:
+        """Document loader for pyld that serves registered and cached contexts."""
+        document = self._contexts.get(url)
+        if document is None:
+            document = self._remote_documents.get(url)
+        if document is None:
+            document = self._load_remote(url, options or {})
+
+        # pyld resolves relative URLs in a context in place, so hand out a copy
+        return {
+            "contextUrl": None,
+            "documentUrl": url,
+            "document": copy.deepcopy(document),
+            "tag": "static",
+        }
+
+    def _load_remote(self, url: str, options: dict) -> dict:
+        if self._remote_loader is None:
+            raise jsonld.JsonLdError(
+                f"Remote JSON-LD context '{url}' is not registered and remote contexts "
+                "are not allowed.",
+                "jsonld.LoadDocumentError",
+                {"url": url},
+                code="loading document failed",
+            )
+        logger.debug(f"fetching remote JSON-LD context: {url}")
+        remote_doc = self._remote_loader(url, options)
+        document = remote_doc["document"]
+        if isinstance(document, str):
+            document = json.loads(document)
+        self._remote_documents[url] = document
+        return document
+
+    def options(self) -> dict:
+        """Options for pyld calls, using this registry's loader and context cache."""
+        return {
+            "documentLoader": self.document_loader,
+            "contextResolver": self._context_resolver,
+        }
+
+
+_registry: ContextRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_context_registry() -> ContextRegistry:
+    """Return the process-wide ContextRegistry, built from settings on first use."""
+    global _registry  # noqa: PLW0603
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ContextRegistry.from_settings()
+    return _registry
+
+
+def reset_context_registry() -> None:
+    global _registry  # noqa: PLW0603
+    with _registry_lock:
+        _registry = None
@@ -7,3 +7,9 @@ class ItemNotFound(Exception):
 
 class FileNotFound(Exception):
     pass
+
+
+class StorageOperationError(Exception):
+    def __init__(self, message: str, results: list | None = None):
+        super().__init__(message)
+        self.results = results or []
@@ -1,10 +1,11 @@
 """tidepool/file.py"""
 
 import datetime
+import hashlib
 import json
 import mimetypes
 from pathlib import Path
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, NamedTuple, Optional
 
 from tidepool.settings.manager import settings
 
@@ -13,6 +14,22 @@ if TYPE_CHECKING:
 
 
 class File:
+    __slots__ = (
+        "checksum",
+        "checksum_algorithm",
+        "content_digest",
+        "data",
+        "date_created",
+        "date_updated",
+        "file_uuid",
+        "filename",
+        "filepath",
+        "item",
+        "item_uuid",
+        "mimetype",
+        "size",
+    )
+
     def __init__(
         self,
         filename: str,
@@ -24,6 +41,10 @@ class File:
         date_created: datetime.datetime | None = None,
         date_updated: datetime.datetime | None = None,
         item: Optional["Item"] = None,
+        content_digest: str | None = None,
+        size: int | None = None,
+        checksum: str | None = None,
+        checksum_algorithm: str | None = None,
     ):
         self.file_uuid = file_uuid
         self.item_uuid = item_uuid
@@ -34,6 +55,11 @@ class File:
         self.date_created = date_created
         self.date_updated = date_updated
         self.item = item
+        self.content_digest = content_digest
+        # recorded when the file is stored, see StorageService.store_file
+        self.size = size
+        self.checksum = checksum
+        self.checksum_algorithm = checksum_algorithm
 
     @property
     def api_uri(self):
@@ -47,6 +73,10 @@ class File:
             "data_uri": f"{self.api_uri}/data",
             "filename": str(self.filename),
             "mimetype": str(self.mimetype),
+            "content_digest": self.content_digest,
+            "size": self.size,
+            "checksum": self.checksum,
+            "checksum_algorithm": self.checksum_algorithm,
             "date_created": self.date_created.isoformat() if self.date_created else None,
             "date_updated": self.date_updated.isoformat() if self.date_updated else None,
         }
@@ -66,3 +96,48 @@ class File:
             mimetype=mimetype,
             filepath=filepath,
         )
+
+
+def make_etag(*parts: object) -> str:
+    """Return a strong ETag value that changes whenever any of parts does."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def latest_date(*dates: datetime.datetime | None) -> datetime.datetime | None:
+    """Return the latest of dates, with naive dates taken to be UTC."""
+    return max(
+        (
+            date if date.tzinfo else date.replace(tzinfo=datetime.UTC)
+            for date in dates
+            if date is not None
+        ),
+        default=None,
+    )
+
+
+class FileVersion(NamedTuple):
+    """Read-only projection of the columns a file's API responses change with.
+
+    Enough to answer conditional requests without building the File or touching
+    storage.
+    """
+
+    file_uuid: str
+    item_uuid: str
+    size: int | None
+    checksum: str | None
+    date_created: datetime.datetime
+    date_updated: datetime.datetime | None
+
+    @property
+    def etag(self) -> str:
+        return make_etag("file", *self)
+
+    @property
+    def data_etag(self) -> str:
+        """ETag of the file's content: its checksum, once one is recorded."""
+        return self.checksum or make_etag("data", *self)
+
+    @property
+    def last_modified(self) -> datetime.datetime | None:
+        return latest_date(self.date_created, self.date_updated)
@@ -0,0 +1,214 @@
+"""tidepool/fixity.py"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tidepool import File
+from tidepool.repository import TidepoolRepository
+from tidepool.services.db.base import FixityAuditResultDB, FixityAuditRunDB
+from tidepool.services.storage import (
+    CachingStorageService,
+    POSIXStorageService,
+    StorageService,
+)
+from tidepool.services.storage.hashing import StreamDigest
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IOThrottle:
+    """Token bucket capping the bytes per second read by all audit workers together.
+
+    A rate of 0 disables throttling.
+    """
+
+    def __init__(self, bytes_per_second: int) -> None:
+        self.rate = bytes_per_second
+        self._allowance = float(bytes_per_second)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        """Account for size bytes read, sleeping while reads are ahead of the rate."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.rate, self._allowance + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._allowance -= size
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class FixityAuditor:
+    """Re-hash stored files on every storage service and compare them to FileDB.
+
+    Files are audited in batches, each file on the primary and every replication
+    service, on a bounded pool of workers whose reads share an IOThrottle.  Each
+    batch's results are committed with the run's position, so an interrupted audit
+    resumes after the last recorded batch.
+
+    Files saved before checksums were recorded are given the size and checksum
+    read from the primary, and replicas are compared against those.
+    """
+
+    def __init__(
+        self,
+        repository: TidepoolRepository | None = None,
+        config: dict | None = None,
+    ) -> None:
+        self.repository = repository or TidepoolRepository()
+        self.config = {**settings.FIXITY, **(config or {})}
+        self.throttle = IOThrottle(int(self.config["AUDIT_MAX_BYTES_PER_SECOND"]))
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, *, restart: bool = False) -> FixityAuditRunDB:
+        """Audit all files, resuming the last unfinished run unless restart is set.
+
+        Returns the audit run, which is "completed" unless stopped early.
+        """
+        db = self.repository.db
+        run = None if restart else db.get_unfinished_fixity_audit_run()
+        if run is None:
+            run = db.start_fixity_audit_run()
+            logger.info(f"started fixity audit run {run.run_uuid}")
+        else:
+            logger.info(
+                f"resuming fixity audit run {run.run_uuid} after file "
+                f"{run.last_file_uuid}"
+            )
+        run_uuid, cursor = run.run_uuid, run.last_file_uuid
+
+        executor = ThreadPoolExecutor(
+            max_workers=int(self.config["AUDIT_WORKERS"]),
+            thread_name_prefix="tidepool-fixity",
+        )
+        try:
+            while not self._stop.is_set():
+                files = db.get_files_page(
+                    after_file_uuid=cursor,
+                    limit=int(self.config["AUDIT_BATCH_SIZE"]),
+                )
+                if not files:
+                    db.complete_fixity_audit_run(run_uuid)
+                    break
+                results = self.audit_files(run_uuid, files, executor)
+                cursor = files[-1].file_uuid
+                db.record_fixity_audit_results(run_uuid, results, cursor, len(files))
+                logger.debug(f"fixity audit run {run_uuid} reached file {cursor}")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return db.get_fixity_audit_run(run_uuid)
+
+    def audit_files(
+        self,
+        run_uuid: str,
+        files: list[File],
+        executor: ThreadPoolExecutor,
+    ) -> list[FixityAuditResultDB]:
+        """Hash files on every storage service and return one result per pair."""
+        services = self.repository.storage_services
+        futures = {
+            (file.file_uuid, service.name): executor.submit(
+                self.hash_file, service, file
+            )
+            for file in files
+            for service in services
+        }
+
+        results, backfilled = [], []
+        for file in files:
+            if file.checksum is None:
+                primary_digest, _ = futures[
+                    (file.file_uuid, self.repository.storage.name)
+                ].result()
+                if primary_digest is not None:
+                    primary_digest.apply(file)
+                    backfilled.append(file)
+
+            for service in services:
+                digest, error = futures[(file.file_uuid, service.name)].result()
+                results.append(self._make_result(run_uuid, file, service, digest, error))
+
+        self.repository.db.record_file_checksums(backfilled)
+        return results
+
+    def hash_file(
+        self,
+        service: StorageService,
+        file: File,
+    ) -> tuple[StreamDigest | None, str | None]:
+        """Return the digest of a file read from a service, or why it failed.
+
+        The error is "missing" when the file is not on the service.
+        """
+        digest = StreamDigest(file.checksum_algorithm)
+        # the audit checks the copy a cache reads from, and must not fill the cache
+        if isinstance(service, CachingStorageService):
+            service = service.backend
+        # local files are read into one reused buffer, not a new bytes per chunk
+        chunks = (
+            service.read_file_chunks
+            if isinstance(service, POSIXStorageService)
+            else service.read_file_stream
+        )
+        try:
+            for chunk in chunks(file):
+                self.throttle.consume(len(chunk))
+                digest.update(chunk)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(
+                f"could not read file {file.file_uuid} from '{service.name}': {exc!r}"
+            )
+            try:
+                exists = service.file_exists(file)
+            except Exception:  # noqa: BLE001
+                exists = True
+            return None, repr(exc) if exists else "missing"
+        return digest, None
+
+    @staticmethod
+    def _make_result(
+        run_uuid: str,
+        file: File,
+        service: StorageService,
+        digest: StreamDigest | None,
+        error: str | None,
+    ) -> FixityAuditResultDB:
+        if error == "missing":
+            status, error = "missing", None
+        elif error is not None:
+            status = "error"
+        elif file.checksum is None:
+            status, error = "error", "no checksum recorded or read from the primary"
+        elif digest.size == file.size and digest.hexdigest() == file.checksum:
+            status = "ok"
+        else:
+            status = "mismatch"
+
+        if status != "ok":
+            logger.warning(
+                f"fixity audit: file {file.file_uuid} on '{service.name}' is {status}"
+            )
+        return FixityAuditResultDB(
+            run_uuid=run_uuid,
+            file_uuid=file.file_uuid,
+            service_name=service.name,
+            status=status,
+            checksum_algorithm=file.checksum_algorithm,
+            expected_checksum=file.checksum,
+            actual_checksum=digest.hexdigest() if digest else None,
+            expected_size=file.size,
+            actual_size=digest.size if digest else None,
+            error=error,
+        )
@@ -3,16 +3,27 @@
 import datetime
 import json
 import mimetypes
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from pyld import jsonld
 
 from tidepool import File
+from tidepool.contexts import get_context_registry
 from tidepool.exceptions import FileNotFound
+from tidepool.file import FileVersion, latest_date, make_etag
 from tidepool.settings.manager import settings
 
 
 class Item:
+    __slots__ = (
+        "date_created",
+        "date_updated",
+        "files",
+        "item_uuid",
+        "jsonld_metadata",
+        "title",
+    )
+
     def __init__(
         self,
         title: str,
@@ -98,6 +109,17 @@ class Item:
 
 
 class ItemMetadata:
+    """JSON-LD metadata for an Item.
+
+    Compacted and expanded forms are cached, and only recomputed after the metadata
+    changes through set_statement, set_id, set_type, register_namespace or by
+    assigning data.  Changes made by mutating data or context in place are not
+    tracked; call invalidate() after such changes.  The cached forms are shared,
+    and should be treated as read-only.
+    """
+
+    __slots__ = ("_compacted", "_data", "_expanded", "context")
+
     default_context = {
         "schema": "http://schema.org/",
         "dc": "http://purl.org/dc/elements/1.1/",
@@ -105,41 +127,123 @@ class ItemMetadata:
     }
 
     def __init__(self, context: dict | None = None):
+        self._compacted: dict | None = None
+        self._expanded: list[dict] | None = None
         self.context = {**self.default_context, **(context or {})}
         self.data = {
             "@context": self.context,
             "@type": "tidepool:DigitalObject",
         }
 
+    @property
+    def data(self) -> dict:
+        return self._data
+
+    @data.setter
+    def data(self, value: dict) -> None:
+        self._data = value
+        self.invalidate()
+
+    @property
+    def is_modified(self) -> bool:
+        """True if the metadata changed since it was last compacted."""
+        return self._compacted is None
+
+    def invalidate(self) -> None:
+        """Discard the cached compacted and expanded forms."""
+        self._compacted = None
+        self._expanded = None
+
     def register_namespace(self, prefix: str, iri: str):
         self.context[prefix] = iri
+        self.invalidate()
 
     def set_statement(self, term: str, value: str | dict | list) -> None:
         self.data[term] = value
+        self.invalidate()
 
     def set_id(self, _id: str) -> None:
         self.data["@id"] = _id
+        self.invalidate()
 
     def set_type(self, type_uri: str) -> None:
         self.data["@type"] = type_uri
+        self.invalidate()
 
     def to_compact(self) -> dict:
-        return jsonld.compact(self.data, self.context)
+        if self._compacted is None:
+            self._compacted = jsonld.compact(
+                self.data, self.context, get_context_registry().options()
+            )
+        return self._compacted
 
     def to_expanded(self) -> list[dict]:
-        return jsonld.expand(self.data)
+        if self._expanded is None:
+            self._expanded = jsonld.expand(self.data, get_context_registry().options())
+        return self._expanded
 
     @classmethod
     def from_jsonld(
         cls, jsonld_data: dict | list, context: dict | None = None
     ) -> "ItemMetadata":
         if isinstance(jsonld_data, list):
-            compacted = jsonld.compact(jsonld_data, context or {})
+            compacted = jsonld.compact(
+                jsonld_data, context or {}, get_context_registry().options()
+            )
         else:
             compacted = jsonld_data
         metadata = cls(context=compacted.get("@context", {}))
         metadata.data = compacted
+        # already compacted, e.g. as stored in ItemDB.jsonld_metadata
+        metadata._compacted = compacted
         return metadata
 
     def __str__(self) -> str:
         return json.dumps(self.to_compact(), indent=2)
+
+
+class ItemRow(NamedTuple):
+    """Read-only projection of an item row, for listing without building Items."""
+
+    item_uuid: str
+    title: str | None
+    date_created: datetime.datetime
+    date_updated: datetime.datetime | None
+
+    @property
+    def api_uri(self) -> str:
+        return f"{settings.API_BASE_URI}/items/{self.item_uuid}"
+
+    def to_dict(self) -> dict:
+        return {
+            "item_uuid": str(self.item_uuid),
+            "api_uri": self.api_uri,
+            "title": self.title,
+            "date_created": self.date_created.isoformat() if self.date_created else None,
+            "date_updated": self.date_updated.isoformat() if self.date_updated else None,
+        }
+
+
+class ItemVersion(NamedTuple):
+    """Read-only projection of the columns an item's API responses change with.
+
+    Title and metadata changes update the item's date_updated, so with the
+    versions of its files this identifies a response without loading the item.
+    """
+
+    item_uuid: str
+    date_created: datetime.datetime
+    date_updated: datetime.datetime | None
+    files: tuple[FileVersion, ...]
+
+    @property
+    def etag(self) -> str:
+        return make_etag("item", *self)
+
+    @property
+    def last_modified(self) -> datetime.datetime | None:
+        return latest_date(
+            self.date_created,
+            self.date_updated,
+            *(file.last_modified for file in self.files),
+        )
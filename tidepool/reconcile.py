@@ -0,0 +1,280 @@
+"""tidepool/reconcile.py"""
+
+import datetime
+import logging
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from itertools import groupby, product
+from operator import itemgetter
+
+from tidepool import File
+from tidepool.repository import TidepoolRepository
+from tidepool.services.db import SQLDBService, session_scope
+from tidepool.services.storage import StorageService, StoredObject, copy_file
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+HEX_DIGITS = "0123456789abcdef"
+BLOB_KEY_PREFIX = "blobs/"
+
+
+@dataclass
+class ReconcileIssue:
+    """A difference between the file table and one storage service.
+
+    kind is "missing" (a file with no object), "size_mismatch" (an object whose
+    size differs from the size recorded for its file) or "extra" (an object no file
+    refers to).
+    """
+
+    service: str
+    kind: str
+    key: str
+    file_uuid: str | None = None
+    expected_size: int | None = None
+    actual_size: int | None = None
+    repaired: bool = False
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def merge_join(
+    expected: Iterable[tuple[str, list[File]]],
+    listed: Iterator[StoredObject],
+) -> Iterator[tuple[str, list[File] | None, StoredObject | None]]:
+    """Join expected keys and listed objects, both sorted by key.
+
+    Yields (key, files, stored_object) for every key in either input, with files or
+    stored_object None on the side the key is missing from.  Only one key from each
+    side is held at a time.
+    """
+    expected_iter = iter(expected)
+    next_expected = next(expected_iter, None)
+    next_listed = next(listed, None)
+    while next_expected is not None or next_listed is not None:
+        if next_listed is None or (
+            next_expected is not None and next_expected[0] < next_listed.key
+        ):
+            yield next_expected[0], next_expected[1], None
+            next_expected = next(expected_iter, None)
+        elif next_expected is None or next_listed.key < next_expected[0]:
+            yield next_listed.key, None, next_listed
+            next_listed = next(listed, None)
+        else:
+            yield next_expected[0], next_expected[1], next_listed
+            next_expected = next(expected_iter, None)
+            next_listed = next(listed, None)
+
+
+class Reconciler:
+    """Compare the file table with what each storage service actually holds.
+
+    Every storage service is split into partitions by key prefix: the leading hex
+    digits of item UUIDs, and of content digests on services with the "content"
+    layout.  Partitions are reconciled in parallel, each by streaming the service's
+    listing of the prefix and merge-joining it with the files in that prefix,
+    streamed from the database in key order, so neither side is held in memory.
+
+    Objects outside these prefixes are not listed.  Objects modified within
+    EXTRA_GRACE_SECONDS are never reported as extra, as they may belong to a save
+    that has not committed yet.
+    """
+
+    def __init__(
+        self,
+        repository: TidepoolRepository | None = None,
+        config: dict | None = None,
+    ) -> None:
+        self.repository = repository or TidepoolRepository()
+        self.config = {**settings.RECONCILE, **(config or {})}
+        if int(self.config["PREFIX_LENGTH"]) not in (1, 2):
+            raise ValueError("RECONCILE PREFIX_LENGTH must be 1 or 2")
+
+    def partitions(self, service: StorageService) -> list[tuple[str, str]]:
+        """Return the (kind, prefix) partitions of a service, kind "item" or "blob"."""
+        prefixes = [
+            "".join(digits)
+            for digits in product(HEX_DIGITS, repeat=int(self.config["PREFIX_LENGTH"]))
+        ]
+        partitions = [("item", prefix) for prefix in prefixes]
+        if service.layout == "content":
+            partitions += [("blob", prefix) for prefix in prefixes]
+        return partitions
+
+    def run(
+        self,
+        *,
+        service_names: list[str] | None = None,
+        repair: bool = False,
+        delete_extra: bool = False,
+    ) -> Iterator[ReconcileIssue]:
+        """Reconcile storage services, yielding issues as partitions complete.
+
+        Args:
+            service_names: services to reconcile; all storage services by default
+            repair: copy missing and mismatched objects from a healthy service
+            delete_extra: delete objects that no file refers to
+        """
+        services = [
+            service
+            for service in self.repository.storage_services
+            if not service_names or service.name in service_names
+        ]
+        with ThreadPoolExecutor(
+            max_workers=int(self.config["WORKERS"]),
+            thread_name_prefix="tidepool-reconcile",
+        ) as executor:
+            futures = [
+                executor.submit(
+                    self.reconcile_partition,
+                    service,
+                    kind,
+                    prefix,
+                    repair=repair,
+                    delete_extra=delete_extra,
+                )
+                for service in services
+                for kind, prefix in self.partitions(service)
+            ]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def reconcile_partition(
+        self,
+        service: StorageService,
+        kind: str,
+        prefix: str,
+        *,
+        repair: bool = False,
+        delete_extra: bool = False,
+    ) -> list[ReconcileIssue]:
+        # each partition runs on its own thread, so it uses its own session
+        with session_scope() as session:
+            db = SQLDBService(session=session)
+            if kind == "blob":
+                key_prefix = f"{BLOB_KEY_PREFIX}{prefix}"
+                files = db.get_files_by_prefix(content_digest_prefix=prefix)
+            else:
+                key_prefix = prefix
+                files = db.get_files_by_prefix(item_uuid_prefix=prefix)
+
+            # files arrive sorted by key, so files sharing a blob are consecutive
+            keyed_files = (
+                (service.get_storage_key(file), file)
+                for file in files
+                if service.uses_content_key(file) == (kind == "blob")
+            )
+            expected = (
+                (key, [file for _, file in group])
+                for key, group in groupby(keyed_files, key=itemgetter(0))
+            )
+
+            listed = service.list_keys(key_prefix)
+            if kind == "item":
+                # with a one digit prefix, "b" also lists the blobs
+                listed = (
+                    obj for obj in listed if not obj.key.startswith(BLOB_KEY_PREFIX)
+                )
+
+            issues = []
+            grace = datetime.timedelta(seconds=int(self.config["EXTRA_GRACE_SECONDS"]))
+            cutoff = datetime.datetime.now(datetime.UTC) - grace
+            for key, key_files, stored in merge_join(expected, listed):
+                issue = self._compare(service, key, key_files, stored, cutoff)
+                if issue is None:
+                    continue
+                if issue.kind == "extra" and delete_extra:
+                    self._delete_extra(service, issue)
+                elif issue.kind != "extra" and repair:
+                    self._repair(db, service, issue, key_files)
+                issues.append(issue)
+        logger.debug(
+            f"reconciled {kind} prefix '{prefix}' on '{service.name}': "
+            f"{len(issues)} issues"
+        )
+        return issues
+
+    @staticmethod
+    def _compare(
+        service: StorageService,
+        key: str,
+        files: list[File] | None,
+        stored: StoredObject | None,
+        cutoff: datetime.datetime,
+    ) -> ReconcileIssue | None:
+        if files is None:
+            if stored.last_modified >= cutoff:
+                return None
+            return ReconcileIssue(service.name, "extra", key, actual_size=stored.size)
+
+        file = files[0]
+        if stored is None:
+            return ReconcileIssue(
+                service.name,
+                "missing",
+                key,
+                file_uuid=file.file_uuid,
+                expected_size=file.size,
+            )
+        if file.size is not None and stored.size != file.size:
+            return ReconcileIssue(
+                service.name,
+                "size_mismatch",
+                key,
+                file_uuid=file.file_uuid,
+                expected_size=file.size,
+                actual_size=stored.size,
+            )
+        return None
+
+    def _repair(
+        self,
+        db: SQLDBService,
+        target: StorageService,
+        issue: ReconcileIssue,
+        files: list[File],
+    ) -> None:
+        """Copy a file to target from the first service holding a healthy copy."""
+        file = next(
+            (file for file in files if db.get_file(file.file_uuid) is not None), None
+        )
+        if file is None:
+            issue.error = "file was deleted"
+            return
+
+        for source in self.repository.storage_services:
+            if source is target:
+                continue
+            try:
+                if not source.file_exists(file) or (
+                    file.size is not None and source.get_file_size(file) != file.size
+                ):
+                    continue
+                if issue.kind == "size_mismatch" and target.uses_content_key(file):
+                    # blobs are never overwritten, so the bad one is removed first
+                    target.delete_key(issue.key)
+                copy_file(source, target, file)
+            except Exception as exc:
+                logger.exception(
+                    f"could not copy {issue.key} from '{source.name}' to '{target.name}'"
+                )
+                issue.error = repr(exc)
+                continue
+            logger.info(f"repaired {issue.key} on '{target.name}' from '{source.name}'")
+            issue.repaired, issue.error = True, None
+            return
+        issue.error = issue.error or "no healthy copy found"
+
+    @staticmethod
+    def _delete_extra(service: StorageService, issue: ReconcileIssue) -> None:
+        try:
+            issue.repaired = service.delete_key(issue.key)
+        except Exception as exc:
+            logger.exception(f"could not delete {issue.key} from '{service.name}'")
+            issue.error = repr(exc)
+        else:
+            logger.info(f"deleted extra object {issue.key} from '{service.name}'")
@@ -1,5 +1,71 @@
 """tidepool/relationship.py"""
+# ruff: noqa: D105
+
+import datetime
+import json
 
 
 class Relationship:
-    pass
+    """A subject-predicate-object statement between two nodes.
+
+    Nodes are strings: usually item UUIDs, but any identifier, e.g. a URI, is
+    allowed.
+    """
+
+    __slots__ = (
+        "date_created",
+        "date_updated",
+        "object",
+        "predicate",
+        "relationship_uuid",
+        "subject",
+    )
+
+    def __init__(
+        self,
+        subject: str,
+        predicate: str,
+        object: str,  # noqa: A002
+        relationship_uuid: str | None = None,
+        date_created: datetime.datetime | None = None,
+        date_updated: datetime.datetime | None = None,
+    ):
+        self.relationship_uuid = relationship_uuid
+        self.subject = subject
+        self.predicate = predicate
+        self.object = object
+        self.date_created = date_created
+        self.date_updated = date_updated
+
+    def __repr__(self) -> str:
+        return f"<Relationship: {self.subject} {self.predicate} {self.object}>"
+
+    @property
+    def triple(self) -> tuple[str, str, str]:
+        return self.subject, self.predicate, self.object
+
+    def to_dict(self) -> dict:
+        return {
+            "relationship_uuid": self.relationship_uuid,
+            "subject": self.subject,
+            "predicate": self.predicate,
+            "object": self.object,
+            "date_created": self.date_created.isoformat() if self.date_created else None,
+            "date_updated": self.date_updated.isoformat() if self.date_updated else None,
+        }
+
+    def to_json(self, indent: int | None = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Relationship":
+        try:
+            return cls(
+                subject=str(data["subject"]),
+                predicate=str(data["predicate"]),
+                object=str(data["object"]),
+            )
+        except (KeyError, TypeError) as exc:
+            raise ValueError(
+                "A relationship needs a subject, predicate and object"
+            ) from exc
@@ -0,0 +1,201 @@
+"""tidepool/replication.py"""
+
+import datetime
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tidepool.repository import TidepoolRepository
+from tidepool.services.db.base import ReplicationTaskDB
+from tidepool.services.storage import copy_file
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicationWorker:
+    """Drain the replication task outbox written by write-behind replication.
+
+    Tasks are claimed in batches and run on a thread pool per replication service,
+    each sized by CONCURRENCY_PER_SERVICE, so a slow replica cannot hold up work for
+    the others.  Tasks for the same file and service within a batch run in the order
+    they were recorded.  Failed tasks are retried with exponential backoff until
+    MAX_ATTEMPTS, after which they are marked "failed".
+    """
+
+    def __init__(
+        self,
+        repository: TidepoolRepository | None = None,
+        config: dict | None = None,
+    ) -> None:
+        self.repository = repository or TidepoolRepository()
+        self.config = {**settings.REPLICATION_WORKER, **(config or {})}
+        concurrency = int(self.config["CONCURRENCY_PER_SERVICE"])
+        self.executors = {
+            service.name: ThreadPoolExecutor(
+                max_workers=concurrency,
+                thread_name_prefix=f"tidepool-replication-{i}",
+            )
+            for i, service in enumerate(self.repository.storage.replication_services)
+        }
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, *, once: bool = False) -> int:
+        """Process replication tasks until stopped, returning the number processed.
+
+        Args:
+            once: exit as soon as no due tasks remain, instead of polling for more
+        """
+        processed = 0
+        while not self._stop.is_set():
+            count = self.run_batch()
+            processed += count
+            if count == 0:
+                if once:
+                    break
+                self._stop.wait(self.config["POLL_INTERVAL_SECONDS"])
+        return processed
+
+    def run_batch(self) -> int:
+        tasks = self.repository.db.claim_replication_tasks(
+            limit=self.config["BATCH_SIZE"],
+            lease_seconds=self.config["LEASE_SECONDS"],
+        )
+        if not tasks:
+            return 0
+
+        groups: dict[tuple[str, str], list[ReplicationTaskDB]] = defaultdict(list)
+        for task in tasks:
+            groups[(task.service_name, task.file_uuid)].append(task)
+
+        # blobs referenced again since their delete was enqueued must be kept
+        referenced_blobs = set(
+            self.repository.db.get_blob_ref_counts(
+                [
+                    task.content_digest
+                    for task in tasks
+                    if task.action == "delete" and task.content_digest
+                ]
+            )
+        )
+
+        futures = []
+        for (service_name, _), group in groups.items():
+            executor = self.executors.get(service_name)
+            if executor is None:
+                # the replication service is no longer configured
+                error = KeyError(f"No replication storage service named '{service_name}'")
+                for task in group:
+                    self._record_outcome(task, error)
+                continue
+            futures.append(
+                executor.submit(self._replicate_group, group, referenced_blobs)
+            )
+        for future in as_completed(futures):
+            for task, error in future.result():
+                self._record_outcome(task, error)
+        self.repository.db.session.commit()
+        return len(tasks)
+
+    def _replicate_group(
+        self,
+        tasks: list[ReplicationTaskDB],
+        referenced_blobs: set[str] | None = None,
+    ) -> list[tuple[ReplicationTaskDB, BaseException | None]]:
+        """Run tasks for a single file and service in order, stopping on a failure.
+
+        Tasks after a failed one are not attempted; they are returned as deferred,
+        and retried later without counting against their attempts.
+        """
+        outcomes: list[tuple[ReplicationTaskDB, BaseException | None]] = []
+        for i, task in enumerate(tasks):
+            try:
+                self.replicate(task, referenced_blobs)
+            except Exception as exc:
+                logger.exception(
+                    f"replication task {task.task_uuid} ({task.action} of file "
+                    f"{task.file_uuid} on '{task.service_name}') failed"
+                )
+                outcomes.append((task, exc))
+                outcomes.extend((deferred, DeferredTask()) for deferred in tasks[i + 1 :])
+                break
+            outcomes.append((task, None))
+        return outcomes
+
+    def replicate(
+        self,
+        task: ReplicationTaskDB,
+        referenced_blobs: set[str] | None = None,
+    ) -> None:
+        """Apply one replication task to its replication service.
+
+        Args:
+            task: replication task to apply
+            referenced_blobs: content digests still referenced by files; deletes of
+                these blobs from content-layout services are skipped
+        """
+        service = self.repository.get_replication_service(task.service_name)
+        file = task.to_file()
+        content_key = service.uses_content_key(file)
+        if task.action == "delete":
+            if content_key and file.content_digest in (referenced_blobs or set()):
+                logger.debug(f"blob {file.content_digest} is referenced, not deleting")
+                return
+            service.delete_file(file)
+        elif task.action == "store" and content_key and service.file_exists(file):
+            # the blob is already on the replica, so nothing needs to be sent
+            logger.debug(f"blob {file.content_digest} already on '{service.name}'")
+        elif task.action == "store":
+            copy_file(self.repository.storage, service, file)
+        else:
+            raise ValueError(f"Unknown replication action: '{task.action}'")
+        logger.debug(
+            f"replicated {task.action} of file {task.file_uuid} to '{task.service_name}'"
+        )
+
+    def _record_outcome(
+        self,
+        task: ReplicationTaskDB,
+        error: BaseException | None,
+    ) -> None:
+        db = self.repository.db
+        if error is None:
+            db.complete_replication_task(task.task_uuid, commit=False)
+            return
+
+        now = datetime.datetime.now(datetime.UTC)
+        if isinstance(error, DeferredTask):
+            db.fail_replication_task(
+                task.task_uuid,
+                task.last_error,
+                now + datetime.timedelta(seconds=self.config["BACKOFF_BASE_SECONDS"]),
+                count_attempt=False,
+                commit=False,
+            )
+            return
+
+        attempts = task.attempts + 1
+        retry_at = None
+        if attempts < self.config["MAX_ATTEMPTS"] and not isinstance(error, KeyError):
+            delay = min(
+                self.config["BACKOFF_BASE_SECONDS"] * 2 ** (attempts - 1),
+                self.config["BACKOFF_MAX_SECONDS"],
+            )
+            retry_at = now + datetime.timedelta(seconds=delay)
+        else:
+            logger.error(f"replication task {task.task_uuid} failed permanently: {error}")
+        db.fail_replication_task(task.task_uuid, repr(error), retry_at, commit=False)
+
+    def shutdown(self) -> None:
+        self.stop()
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+
+
+class DeferredTask(Exception):  # noqa: N818
+    """Marker for a task skipped because an earlier task for its file failed."""
+
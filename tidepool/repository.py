@@ -1,25 +1,52 @@
 """tidepool/repository.py"""
 # ruff: noqa: D105
 
+import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from importlib import import_module
-from typing import Generator, Iterator
+from itertools import batched
+from pathlib import Path
+from typing import Any, Generator, Iterator
 
-from tidepool import File, Item
-from tidepool.exceptions import ItemNotFound
+from tidepool import File, FileVersion, Item, ItemRow, ItemVersion, Relationship
+from tidepool.exceptions import ItemNotFound, StorageOperationError
+from tidepool.search import build_search_document
 from tidepool.services.db import SQLDBService
-from tidepool.services.storage import StorageService
+from tidepool.services.storage import (
+    CachingStorageService,
+    ReadRouter,
+    StorageFanout,
+    StorageResult,
+    StorageService,
+)
+from tidepool.services.storage.hashing import StreamDigest, compute_content_digest
 from tidepool.settings.manager import settings
 
 logger = logging.getLogger(__name__)
 
 
 class TidepoolRepository:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        db: SQLDBService | None = None,
+        storage: StorageService | None = None,
+    ) -> None:
         self.name = settings.REPOSITORY_NAME
         self.settings = settings
-        self.db = SQLDBService()
-        self.storage = self.load_primary_storage_service()
+        self.db = db or SQLDBService()
+        self.storage = storage or self.load_primary_storage_service()
+        self.storage_fanout = StorageFanout(
+            max_workers=settings.STORAGE_FANOUT_MAX_WORKERS
+        )
+        # without routing, or with nothing to route between, reads go straight to
+        # the primary storage service
+        self.read_router = (
+            ReadRouter(self.storage_services, config=settings.READ_ROUTING)
+            if settings.READ_ROUTING["ENABLED"] and self.storage.replication_services
+            else None
+        )
 
     def __repr__(self) -> str:
         return f"<TidepoolRepository: {self.name}>"
@@ -31,23 +58,175 @@ class TidepoolRepository:
         )
         return storage_class(config=settings.PRIMARY_STORAGE_SERVICE["config"])
 
+    @property
+    def storage_services(self) -> list[StorageService]:
+        """Primary storage service followed by all replication storage services."""
+        return [self.storage, *self.storage.replication_services]
+
+    @property
+    def write_behind_replication(self) -> bool:
+        """True when replication is deferred to the replication task outbox."""
+        return settings.REPLICATION_MODE == "async" and bool(
+            self.storage.replication_services
+        )
+
+    def get_replication_service(self, name: str) -> StorageService:
+        for replication_service in self.storage.replication_services:
+            if replication_service.name == name:
+                return replication_service
+        raise KeyError(f"No replication storage service named '{name}'")
+
+    @property
+    def content_addressed(self) -> bool:
+        """True when any storage service stores files under their content digest."""
+        return any(service.layout == "content" for service in self.storage_services)
+
+    def _set_content_digests(
+        self,
+        files: list[File],
+        previous_digests: dict[str, str] | None = None,
+    ) -> None:
+        """Hash the content of files about to be stored, for content-addressed storage.
+
+        Their size and checksum are computed in the same pass, as a blob that is
+        already stored is not written again.  Files without data or a filepath keep
+        the digest of their stored content.
+        """
+        previous_digests = previous_digests or {}
+        for file in files:
+            if file.data or file.filepath:
+                if self.content_addressed:
+                    digest = StreamDigest()
+                    file.content_digest = compute_content_digest(
+                        file, stream_digest=digest
+                    )
+                    digest.apply(file)
+            elif not file.content_digest and file.file_uuid:
+                file.content_digest = previous_digests.get(str(file.file_uuid))
+
+    def _storage_operations(
+        self,
+        action: str,
+        files: list[File],
+        services: list[StorageService],
+        orphaned_blobs: list[File],
+    ) -> list[tuple[str, File, StorageService]]:
+        """Return the (action, file, service) operations to apply.
+
+        A blob on a content-layout service may be shared by other files, so it is
+        only deleted as one of orphaned_blobs, once nothing references it.
+        """
+        operations = []
+        for service in services:
+            operations.extend(
+                (action, file, service)
+                for file in files
+                if action != "delete" or not service.uses_content_key(file)
+            )
+            operations.extend(
+                ("delete", blob, service)
+                for blob in orphaned_blobs
+                if service.uses_content_key(blob)
+            )
+        return operations
+
+    def _apply_storage_action(
+        self,
+        action: str,
+        files: list[File],
+        orphaned_blobs: list[File] | None = None,
+    ) -> None:
+        """Store or delete files on the primary and replication storage services.
+
+        With write-behind replication only the primary is written inline, and a
+        replication task is recorded for each file and replication service.
+
+        Args:
+            action: "store" or "delete"
+            files: files to store or delete
+            orphaned_blobs: files whose content-addressed blobs are no longer
+                referenced, and are deleted from content-layout services
+        """
+        orphaned_blobs = orphaned_blobs or []
+        if not self.write_behind_replication:
+            results = self.storage_fanout.run_operations(
+                self._storage_operations(
+                    action, files, self.storage_services, orphaned_blobs
+                )
+            )
+            self._raise_for_storage_errors(results)
+            return
+
+        results = self.storage_fanout.run_operations(
+            self._storage_operations(action, files, [self.storage], orphaned_blobs)
+        )
+        self._raise_for_storage_errors(results)
+        for service in self.storage.replication_services:
+            operations = self._storage_operations(
+                action, files, [service], orphaned_blobs
+            )
+            # deletes first, as enqueuing a delete drops pending stores of its file
+            for task_action in ("delete", "store"):
+                task_files = [
+                    file
+                    for operation, file, _ in operations
+                    if operation == task_action
+                ]
+                if task_files:
+                    self.db.enqueue_replication_tasks(
+                        task_files, [service.name], task_action, commit=False
+                    )
+
+    def _raise_for_storage_errors(self, results: list[StorageResult]) -> None:
+        errors = [result for result in results if result.error is not None]
+        if errors:
+            self.db.session.rollback()
+            msg = ", ".join(
+                f"{result.action} of file {result.file_uuid} on '{result.service}': "
+                f"{result.error!r}"
+                for result in errors
+            )
+            raise StorageOperationError(msg, results=results)
+
     def save_item(self, item: Item, *, commit: bool = True) -> Item:
         # save item to DB
         item = self.db.save_item(item, commit=False)
 
         # save files to DB
+        previous_digests = self.db.get_content_digests(
+            [str(file.file_uuid) for file in item.files if file.file_uuid]
+        )
+        self._set_content_digests(item.files, previous_digests)
+        saved_files = []
         for file in item.files:
             file.item_uuid = item.item_uuid
-            saved_file = self.db.save_file(file, commit=False)
-
-            # save files to storage
-            self.storage.store_file(saved_file)
-            logger.debug(f"file saved to primary storage service: {self.storage.name}")
-            for i, replication_service in enumerate(self.storage.replication_services):
-                replication_service.store_file(saved_file)
-                logger.debug(
-                    f"file saved to replication storage service #{i + 1}: {replication_service.name}"
-                )
+            saved_files.append(self.db.save_file(file, commit=False))
+
+        # count blob references before storing, see SQLDBService.update_blob_refs
+        orphaned = set(
+            self.db.update_blob_refs(
+                added=[file.content_digest for file in saved_files],
+                removed=list(previous_digests.values()),
+            )
+        )
+        orphaned_blobs = [
+            File(
+                filename=file.filename,
+                mimetype=file.mimetype,
+                file_uuid=file.file_uuid,
+                item_uuid=file.item_uuid,
+                content_digest=previous_digests[str(file.file_uuid)],
+            )
+            for file in saved_files
+            if previous_digests.get(str(file.file_uuid)) in orphaned
+        ]
+
+        # save files to all storage services concurrently
+        self._apply_storage_action("store", saved_files, orphaned_blobs)
+        self.db.record_file_checksums(saved_files)
+
+        item.files = saved_files
+        self._index_items([item])
 
         if commit:
             self.db.session.commit()
@@ -59,12 +238,104 @@ class TidepoolRepository:
     def bulk_save_items(
         self, items: Iterator[Item], yield_items=True, batch_size=1_000
     ) -> Generator[Item]:
-        for i, item in enumerate(items):
-            saved_item = self.save_item(item, commit=False)
-            if i > 0 and i % batch_size == 0:
+        """Save many Items, committing once per batch.
+
+        New Items are inserted with batched multi-row INSERTs; only Items whose UUID
+        already exists take the per-item upsert path of save_item.
+        """
+        for batch in batched(items, batch_size, strict=False):
+            saved_items = self._bulk_save_batch(list(batch))
+            self.db.session.commit()
+            if yield_items:
+                yield from saved_items
+
+    def _bulk_save_batch(self, items: list[Item]) -> list[Item]:
+        existing_uuids = self.db.get_existing_item_uuids(
+            [str(item.item_uuid) for item in items if item.item_uuid]
+        )
+
+        new_items, seen_uuids = [], set()
+        for item in items:
+            if item.item_uuid in existing_uuids or item.item_uuid in seen_uuids:
+                continue
+            new_items.append(item)
+            if item.item_uuid:
+                seen_uuids.add(item.item_uuid)
+
+        if new_items:
+            new_files = [file for item in new_items for file in item.files]
+            self._set_content_digests(new_files)
+            self.db.bulk_insert_items(new_items, commit=False)
+            self.db.update_blob_refs(added=[file.content_digest for file in new_files])
+            self._apply_storage_action("store", new_files)
+            self.db.record_file_checksums(new_files)
+            self._index_items(new_items)
+
+        new_item_ids = {id(item) for item in new_items}
+        return [
+            item if id(item) in new_item_ids else self.save_item(item, commit=False)
+            for item in items
+        ]
+
+    def _index_items(self, items: list[Item]) -> None:
+        """Update the full-text index entries of items, in the current transaction."""
+        if not settings.SEARCH["ENABLED"]:
+            return
+        self.db.index_search_documents(
+            [build_search_document(item, self.storage) for item in items]
+        )
+
+    def search_items(
+        self,
+        query: str,
+        *,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple[Item, float]], str | None]:
+        """Return a page of (Item, rank) pairs for a full-text query.
+
+        See SQLDBService.search_items.
+        """
+        return self.db.search_items(query, limit=limit, cursor=cursor)
+
+    def reindex_search(
+        self,
+        *,
+        batch_size: int | None = None,
+        workers: int | None = None,
+    ) -> int:
+        """Rebuild the full-text index of all items, returning the number indexed.
+
+        Items are read a page at a time, the text of each page's files is read from
+        storage by a pool of workers, and each page is written and committed by this
+        thread, so the database sees a single writer.  Existing entries are replaced
+        in place, so search keeps working during a reindex, and entries of items that
+        no longer exist are dropped at the end.
+        """
+        batch_size = batch_size or settings.SEARCH["REINDEX_BATCH_SIZE"]
+        workers = workers or settings.SEARCH["REINDEX_WORKERS"]
+        search_index = self.db.search_index
+
+        count = 0
+        cursor = None
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="tidepool-reindex"
+        ) as executor:
+            while True:
+                page, cursor = self.db.query_items(limit=batch_size, cursor=cursor)
+                build = partial(build_search_document, storage=self.storage)
+                documents = list(executor.map(build, page))
+                search_index.index_documents(documents)
                 self.db.session.commit()
-            yield saved_item
+                count += len(documents)
+                logger.debug(f"reindexed {count} items for search")
+                if cursor is None:
+                    break
+
+        search_index.remove_orphans()
+        search_index.optimize()
         self.db.session.commit()
+        return count
 
     def get_item(self, item_uuid: str) -> Item:
         item = self.db.get_item(item_uuid)
@@ -72,8 +343,26 @@ class TidepoolRepository:
             raise ItemNotFound
         return item
 
-    def get_items(self):
-        yield from self.db.get_items()
+    def get_items(self, updated_since: datetime.datetime | None = None):
+        yield from self.db.get_items(updated_since=updated_since)
+
+    def get_item_version(self, item_uuid: str) -> ItemVersion | None:
+        return self.db.get_item_version(item_uuid)
+
+    def get_file_version(self, file_uuid: str) -> FileVersion | None:
+        return self.db.get_file_version(file_uuid)
+
+    def get_item_rows(
+        self, updated_since: datetime.datetime | None = None
+    ) -> Iterator[ItemRow]:
+        yield from self.db.get_item_rows(updated_since=updated_since)
+
+    def query_items(self, **kwargs: Any) -> tuple[list[Item], str | None]:
+        """Return a page of Items and the cursor for the next page.
+
+        See SQLDBService.query_items for supported pagination, sorting and filters.
+        """
+        return self.db.query_items(**kwargs)
 
     def delete_item(
         self,
@@ -88,11 +377,22 @@ class TidepoolRepository:
         if not item:
             item = self.get_item(item_uuid)
 
-        for file in item.files:
-            self.storage.delete_file(file)
-            for replication_service in self.storage.replication_services:
-                replication_service.delete_file(file)
+        orphaned = set(
+            self.db.update_blob_refs(
+                removed=[file.content_digest for file in item.files]
+            )
+        )
+        orphaned_blobs = list(
+            {
+                file.content_digest: file
+                for file in item.files
+                if file.content_digest in orphaned
+            }.values()
+        )
+        self._apply_storage_action("delete", item.files, orphaned_blobs)
 
+        if settings.SEARCH["ENABLED"]:
+            self.db.remove_from_search_index([str(item.item_uuid)])
         for file in item.files:
             self.db.delete_file(file, commit=False)
         self.db.delete_item(item, commit=False)
@@ -104,5 +404,132 @@ class TidepoolRepository:
 
         return True
 
+    def add_relationships(
+        self,
+        relationships: list[Relationship],
+        *,
+        commit: bool = True,
+    ) -> int:
+        """Add relationships, skipping existing ones; returns the number added."""
+        return self.db.add_relationships(relationships, commit=commit)
+
+    def remove_relationships(
+        self,
+        relationships: list[Relationship],
+        *,
+        commit: bool = True,
+    ) -> int:
+        return self.db.remove_relationships(relationships, commit=commit)
+
+    def get_relationships(
+        self,
+        *,
+        subject: str | None = None,
+        predicate: str | None = None,
+        object: str | None = None,  # noqa: A002
+        limit: int | None = None,
+    ) -> list[Relationship]:
+        return self.db.get_relationships(
+            subject=subject, predicate=predicate, object=object, limit=limit
+        )
+
+    def get_neighbors(
+        self,
+        node: str,
+        *,
+        predicate: str | None = None,
+        direction: str = "out",
+    ) -> list[Relationship]:
+        """Relationships from node ("out"), to node ("in"), or both ("both")."""
+        if direction not in ("out", "in", "both"):
+            raise ValueError(f"Unsupported direction: '{direction}'")
+        relationships = []
+        if direction in ("out", "both"):
+            relationships += self.db.get_relationships(
+                subject=node, predicate=predicate
+            )
+        if direction in ("in", "both"):
+            relationships += self.db.get_relationships(object=node, predicate=predicate)
+        return relationships
+
+    def traverse_relationships(
+        self,
+        start: str,
+        *,
+        predicates: list[str] | None = None,
+        direction: str = "out",
+        max_depth: int | None = None,
+    ) -> list[tuple[Relationship, int]]:
+        """Return (Relationship, depth) pairs reachable from start.
+
+        See SQLDBService.traverse_relationships.
+        """
+        max_depth = min(
+            max_depth or settings.RELATIONSHIP_TRAVERSAL_MAX_DEPTH,
+            settings.RELATIONSHIP_TRAVERSAL_MAX_DEPTH,
+        )
+        return self.db.traverse_relationships(
+            start,
+            predicates=predicates,
+            direction=direction,
+            max_depth=max_depth,
+        )
+
+    def _unreadable_services(self, file: File) -> set[str]:
+        """Names of replicas that may not hold the current content of a file yet."""
+        if not self.write_behind_replication:
+            return set()
+        return self.db.get_unreplicated_service_names(str(file.file_uuid))
+
     def read_file_data(self, file: File) -> bytes:
-        return self.storage.read_file(file)
+        if self.read_router is None:
+            return self.storage.read_file(file)
+        return self.read_router.read_file(
+            file, exclude=self._unreadable_services(file)
+        )
+
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[bytes]:
+        if self.read_router is None:
+            return self.storage.read_file_stream(file, start=start, end=end)
+        return self.read_router.read_file_stream(
+            file, start=start, end=end, exclude=self._unreadable_services(file)
+        )
+
+    def get_local_path(self, file: File) -> Path | None:
+        """Return where a file is on local disk, if the primary storage keeps it there."""
+        return self.storage.local_path(file)
+
+    def get_file_size(self, file: File) -> int:
+        if file.size is not None:
+            return file.size
+        if self.read_router is None:
+            return self.storage.get_file_size(file)
+        return self.read_router.get_file_size(
+            file, exclude=self._unreadable_services(file)
+        )
+
+    def get_storage_health(self) -> dict[str, dict]:
+        """Recent read latency and error rate of each storage service, when routed."""
+        if self.read_router is None:
+            return {}
+        return self.read_router.get_health()
+
+    def get_storage_cache_stats(self) -> dict[str, dict]:
+        """Hit and miss counts of each storage service behind a read-through cache."""
+        return {
+            service.name: service.get_cache_stats()
+            for service in self.storage_services
+            if isinstance(service, CachingStorageService)
+        }
+
+    def get_replication_status(self) -> dict:
+        return {
+            "mode": settings.REPLICATION_MODE,
+            **self.db.get_replication_status(),
+        }
@@ -0,0 +1,91 @@
+"""tidepool/search.py"""
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+from tidepool import File, Item
+from tidepool.services.storage import StorageService
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchDocument:
+    """Text indexed for one item, in fields weighted from title down to content."""
+
+    item_uuid: str
+    title: str
+    metadata: str
+    content: str
+
+
+def flatten_metadata(value: object) -> list[str]:
+    """Return the literal values of compacted JSON-LD, skipping keywords like @id."""
+    if isinstance(value, dict):
+        values = []
+        for key, child in value.items():
+            if key.startswith("@") and key != "@value":
+                continue
+            values.extend(flatten_metadata(child))
+        return values
+    if isinstance(value, list):
+        return [text for child in value for text in flatten_metadata(child)]
+    if isinstance(value, bool) or value is None:
+        return []
+    return [str(value)]
+
+
+def is_text_mimetype(mimetype: str | None) -> bool:
+    if not mimetype:
+        return False
+    for pattern in settings.SEARCH["TEXT_MIMETYPES"]:
+        if pattern.endswith("/*"):
+            if mimetype.startswith(pattern.removesuffix("*")):
+                return True
+        elif mimetype == pattern:
+            return True
+    return False
+
+
+def extract_file_text(file: File, storage: StorageService | None = None) -> str:
+    """Return up to SEARCH["MAX_TEXT_BYTES"] of a text file's content, else "".
+
+    The text is read from the file's data or filepath when set, as for a file about
+    to be stored, and otherwise from storage.
+    """
+    if not settings.SEARCH["INDEX_FILE_TEXT"] or not is_text_mimetype(file.mimetype):
+        return ""
+
+    max_bytes = settings.SEARCH["MAX_TEXT_BYTES"]
+    try:
+        if file.data:
+            data = file.data[:max_bytes]
+            if isinstance(data, str):
+                return data
+        elif file.filepath:
+            with open(Path(file.filepath), "rb") as f:
+                data = f.read(max_bytes)
+        elif storage is not None:
+            data = b"".join(storage.read_file_stream(file, end=max_bytes))
+        else:
+            return ""
+    except OSError:
+        logger.exception(f"could not read text of file {file.file_uuid} for search")
+        return ""
+    return data.decode("utf-8", errors="replace")
+
+
+def build_search_document(
+    item: Item,
+    storage: StorageService | None = None,
+) -> SearchDocument:
+    return SearchDocument(
+        item_uuid=str(item.item_uuid),
+        title=item.title or "",
+        metadata=" ".join(flatten_metadata(item.jsonld_metadata.to_compact())),
+        content="\n".join(
+            text for file in item.files if (text := extract_file_text(file, storage))
+        ),
+    )
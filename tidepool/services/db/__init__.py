@@ -1,8 +1,17 @@
 """tidepool/services/db"""
 
-from tidepool.services.db.base import DBService, SQLDBService
+from tidepool.services.db.base import (
+    DBService,
+    SQLDBService,
+    dispose_engines,
+    get_engine,
+    session_scope,
+)
 
 __all__ = [
     "DBService",
     "SQLDBService",
+    "dispose_engines",
+    "get_engine",
+    "session_scope",
 ]
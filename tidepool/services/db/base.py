@@ -1,15 +1,64 @@
 """tidepool/services/db.py"""
 
+import base64
+import datetime
+import json
 import logging
+import re
+import threading
 import uuid
-from typing import Iterator, Optional
+from collections import Counter
+from contextlib import contextmanager
+from itertools import batched
+from typing import ClassVar, Iterator, Optional
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, create_engine, JSON
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    Index,
+    cast,
+    create_engine,
+    literal_column,
+    make_url,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql.expression import ColumnClause, ColumnElement, TableValuedAlias
+from sqlalchemy.engine import Engine
+from sqlalchemy import and_, delete, insert, literal, or_, select, union_all, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session, declarative_base, relationship, sessionmaker
+from sqlalchemy.orm import (
+    Session,
+    declarative_base,
+    relationship,
+    joinedload,
+    scoped_session,
+    selectinload,
+    sessionmaker,
+)
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql import func
 
-from tidepool import File, Item, ItemMetadata
+from tidepool import (
+    File,
+    FileVersion,
+    Item,
+    ItemMetadata,
+    ItemRow,
+    ItemVersion,
+    Relationship,
+)
+from tidepool.search import SearchDocument
+from tidepool.services.db.search import SearchIndex
 from tidepool.settings.manager import settings
 
 logger = logging.getLogger(__name__)
@@ -17,10 +66,85 @@ logger = logging.getLogger(__name__)
 Base = declarative_base()
 
 
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+_engines: dict[str, Engine] = {}
+_sessionmakers: dict[str, sessionmaker] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine_options(connection_uri: str) -> dict:
+    """Engine and connection pool options from settings.DATABASE_ENGINE_OPTIONS.
+
+    In-memory SQLite databases use a single connection per thread, so queue pool
+    sizing options are dropped for them.
+    """
+    options = dict(settings.DATABASE_ENGINE_OPTIONS)
+    url = make_url(connection_uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    return options
+
+
+def get_engine(connection_uri: str | None = None) -> Engine:
+    """Return the process-wide engine, and connection pool, for a database URI.
+
+    Engines are created once per DATABASE_CONNECTION_URI and then shared by every
+    SQLDBService in the process.
+    """
+    connection_uri = connection_uri or settings.DATABASE_CONNECTION_URI
+    engine = _engines.get(connection_uri)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(connection_uri)
+            if engine is None:
+                engine = create_engine(
+                    connection_uri,
+                    **get_engine_options(connection_uri),
+                )
+                _engines[connection_uri] = engine
+                _sessionmakers[connection_uri] = sessionmaker(bind=engine)
+    return engine
+
+
+def get_sessionmaker(connection_uri: str | None = None) -> sessionmaker:
+    connection_uri = connection_uri or settings.DATABASE_CONNECTION_URI
+    get_engine(connection_uri)
+    return _sessionmakers[connection_uri]
+
+
+def dispose_engines() -> None:
+    """Close all pooled connections and forget all engines, e.g. after a fork."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _sessionmakers.clear()
+
+
 def create_db_session() -> Session:
-    engine = create_engine(settings.DATABASE_CONNECTION_URI)
-    local_session = sessionmaker(bind=engine)
-    return local_session()
+    return get_sessionmaker()()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Provide a session for a single unit of work.
+
+    The session is committed if the block succeeds, rolled back if it raises, and
+    always closed, returning its connection to the pool.
+    """
+    session = create_db_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 
 class DBService:
@@ -37,16 +161,34 @@ class ItemDB(Base):
         default=lambda: str(uuid.uuid4()),
     )
     title = Column(String, index=True)
-    jsonld_metadata = Column(JSON, nullable=False, default={})
+    # JSONB on Postgres, for containment queries backed by a GIN index
+    jsonld_metadata = Column(
+        JSON().with_variant(JSONB(), "postgresql"),
+        nullable=False,
+        default={},
+    )
+    # dates are set client-side, so values are stored in one format and keyset
+    # pagination and date filters on SQLite compare exactly
     date_created = Column(
         DateTime(timezone=True),
+        default=utcnow,
         server_default=func.now(),
         nullable=False,
     )
-    date_updated = Column(DateTime(timezone=True), onupdate=func.now())
+    date_updated = Column(DateTime(timezone=True), index=True, onupdate=utcnow)
 
     files = relationship("FileDB", back_populates="item")
 
+    __table_args__ = (
+        Index("ix_item_date_created_item_uuid", "date_created", "item_uuid"),
+        # untitled items sort as "", see ITEM_SORT_COLUMNS
+        Index(
+            "ix_item_title_item_uuid",
+            func.coalesce(title, literal_column("''")),
+            "item_uuid",
+        ),
+    )
+
     def to_item(self) -> "Item":
         return Item(
             item_uuid=self.item_uuid,
@@ -82,12 +224,20 @@ class FileDB(Base):
     )
     filename = Column(String, index=True)
     mimetype = Column(String, index=True)
+    # SHA-256 of the file's content, set when a storage service uses the content
+    # layout; see StorageBlobDB
+    content_digest = Column(String(64), index=True)
+    # recorded as the file is written to the primary storage service
+    size = Column(BigInteger)
+    checksum = Column(String(128))
+    checksum_algorithm = Column(String(32))
     date_created = Column(
         DateTime(timezone=True),
+        default=utcnow,
         server_default=func.now(),
         nullable=False,
     )
-    date_updated = Column(DateTime(timezone=True), onupdate=func.now())
+    date_updated = Column(DateTime(timezone=True), onupdate=utcnow)
 
     item = relationship("ItemDB", back_populates="files")
 
@@ -97,20 +247,53 @@ class FileDB(Base):
             item_uuid=self.item_uuid,
             filename=self.filename,
             mimetype=self.mimetype,
+            content_digest=self.content_digest,
+            size=self.size,
+            checksum=self.checksum,
+            checksum_algorithm=self.checksum_algorithm,
             date_created=self.date_created,
             date_updated=self.date_updated,
         )
 
     @classmethod
     def from_file(cls, file: "File") -> "FileDB":
+        # size and checksum are only set once known, so merging a File saved
+        # without them keeps the values recorded when its content was stored
+        fixity = {
+            name: getattr(file, name)
+            for name in ("size", "checksum", "checksum_algorithm")
+            if getattr(file, name) is not None
+        }
         return cls(
             file_uuid=file.file_uuid,
             item_uuid=file.item_uuid,
             filename=file.filename,
             mimetype=file.mimetype,
+            content_digest=file.content_digest,
+            **fixity,
         )
 
 
+class StorageBlobDB(Base):
+    """Number of files referencing each content-addressed blob.
+
+    Storage services with the "content" layout store one blob per distinct
+    content_digest; a blob is deleted from them only once its ref_count drops to 0.
+    """
+
+    __tablename__ = "storage_blob"
+
+    content_digest = Column(String(64), primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    date_created = Column(
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
+        nullable=False,
+    )
+    date_updated = Column(DateTime(timezone=True), onupdate=utcnow)
+
+
 class RelationshipDB(Base):
     __tablename__ = "relationship"
 
@@ -121,27 +304,326 @@ class RelationshipDB(Base):
         default=lambda: str(uuid.uuid4()),
     )
 
-    subject = Column(String, index=True)
-    predicate = Column(String, index=True)
-    object = Column(String, index=True)
+    # subject and object lookups, and traversal in either direction, are served by
+    # the composite indexes below
+    subject = Column(String, nullable=False)
+    predicate = Column(String, index=True, nullable=False)
+    object = Column(String, nullable=False)
 
     date_created = Column(
         DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
+        nullable=False,
+    )
+    date_updated = Column(DateTime(timezone=True), onupdate=utcnow)
+
+    __table_args__ = (
+        Index(
+            "ix_relationship_subject_predicate_object",
+            "subject",
+            "predicate",
+            "object",
+            unique=True,
+        ),
+        Index(
+            "ix_relationship_object_predicate_subject",
+            "object",
+            "predicate",
+            "subject",
+        ),
+    )
+
+    def to_relationship(self) -> "Relationship":
+        return Relationship(
+            relationship_uuid=self.relationship_uuid,
+            subject=self.subject,
+            predicate=self.predicate,
+            object=self.object,
+            date_created=self.date_created,
+            date_updated=self.date_updated,
+        )
+
+
+class ReplicationTaskDB(Base):
+    """Outbox of pending replication work for write-behind replication.
+
+    Rows are written in the same transaction as the item and files they replicate,
+    then drained by a ReplicationWorker.  A row is removed once its task succeeds.
+    """
+
+    __tablename__ = "replication_task"
+
+    task_uuid = Column(
+        String(36),
+        primary_key=True,
+        index=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    action = Column(String, nullable=False)
+    service_name = Column(String, index=True, nullable=False)
+    item_uuid = Column(String(36), nullable=False)
+    file_uuid = Column(String(36), index=True, nullable=False)
+    filename = Column(String, nullable=False)
+    mimetype = Column(String)
+    content_digest = Column(String(64))
+    status = Column(String, index=True, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    # set client-side: the server default has one second resolution on SQLite, and
+    # tasks for the same file must be claimed in the order they were enqueued
+    date_created = Column(
+        DateTime(timezone=True),
+        default=utcnow,
         server_default=func.now(),
         nullable=False,
     )
     date_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
+    def to_file(self) -> "File":
+        return File(
+            file_uuid=self.file_uuid,
+            item_uuid=self.item_uuid,
+            filename=self.filename,
+            mimetype=self.mimetype,
+            content_digest=self.content_digest,
+        )
+
+
+class FixityAuditRunDB(Base):
+    """One pass of the fixity audit over every file, resumable from last_file_uuid.
+
+    Files are audited in file_uuid order, and last_file_uuid and the counters are
+    committed with each batch of results, so an interrupted run picks up after the
+    last recorded batch.
+    """
+
+    __tablename__ = "fixity_audit_run"
+
+    run_uuid = Column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    status = Column(String, index=True, nullable=False, default="running")
+    last_file_uuid = Column(String(36))
+    files_checked = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    date_created = Column(
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
+        nullable=False,
+    )
+    date_updated = Column(DateTime(timezone=True), onupdate=utcnow)
+    date_completed = Column(DateTime(timezone=True))
+
+    def to_dict(self) -> dict:
+        return {
+            "run_uuid": self.run_uuid,
+            "status": self.status,
+            "last_file_uuid": self.last_file_uuid,
+            "files_checked": self.files_checked,
+            "failures": self.failures,
+            "date_created": self.date_created.isoformat() if self.date_created else None,
+            "date_completed": (
+                self.date_completed.isoformat() if self.date_completed else None
+            ),
+        }
+
+
+class FixityAuditResultDB(Base):
+    """Outcome of re-hashing one file on one storage service during an audit run.
+
+    status is "ok", "mismatch" (size or checksum differ from those recorded),
+    "missing" or "error".
+    """
+
+    __tablename__ = "fixity_audit_result"
+
+    result_uuid = Column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    run_uuid = Column(
+        String(36),
+        ForeignKey("fixity_audit_run.run_uuid", ondelete="CASCADE"),
+        nullable=False,
+    )
+    file_uuid = Column(String(36), index=True, nullable=False)
+    service_name = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    checksum_algorithm = Column(String(32))
+    expected_checksum = Column(String(128))
+    actual_checksum = Column(String(128))
+    expected_size = Column(BigInteger)
+    actual_size = Column(BigInteger)
+    error = Column(Text)
+    date_created = Column(
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_fixity_audit_result_run_uuid_status", "run_uuid", "status"),
+    )
+
+
+METADATA_PROPERTY_PATTERN = re.compile(r"^[\w.:\-]+$")
+
+
+class MetadataProperty:
+    """SQL expressions for one top-level property of ItemDB.jsonld_metadata.
+
+    Property names are written into the SQL as literals, not bound parameters, so
+    queries repeat the exact expressions of the indexes created by
+    SQLDBService.ensure_metadata_indexes, which the query planner requires to use
+    them.  Names are therefore limited to word characters, ".", ":" and "-".
+    """
+
+    def __init__(self, name: str, dialect_name: str):
+        if not METADATA_PROPERTY_PATTERN.match(name):
+            raise ValueError(f"Unsupported metadata property: '{name}'")
+        self.name = name
+        self.dialect_name = dialect_name
+        self.column = ItemDB.__table__.c.jsonld_metadata
+
+    @property
+    def index_suffix(self) -> str:
+        return re.sub(r"\W", "_", self.name).lower()
+
+    def _literal(self, value: str) -> ColumnClause:
+        return literal_column(f"'{value}'")
+
+    @property
+    def value(self) -> ColumnElement:
+        """The property's value, as text, where it holds a single value."""
+        if self.dialect_name == "postgresql":
+            return self.column.op("->>", return_type=String)(self._literal(self.name))
+        return func.json_extract(self.column, self._literal(f'$."{self.name}"'))
+
+    @property
+    def value_type(self) -> ColumnElement:
+        """The JSON type of the property's value, e.g. "array"."""
+        if self.dialect_name == "postgresql":
+            return func.jsonb_typeof(self.column.op("->")(self._literal(self.name)))
+        return func.json_type(self.column, self._literal(f'$."{self.name}"'))
+
+    def list_values(self) -> TableValuedAlias:
+        """Table of the values in the property's list, as text."""
+        if self.dialect_name == "postgresql":
+            return func.jsonb_array_elements_text(
+                self.column.op("->")(self._literal(self.name))
+            ).table_valued("value")
+        return func.json_each(
+            self.column, self._literal(f'$."{self.name}"')
+        ).table_valued("value")
+
+    def index_ddl(self) -> list[str]:
+        """CREATE INDEX statements for the value and value type expressions."""
+        if self.dialect_name == "postgresql":
+            value = f"(jsonld_metadata ->> '{self.name}')"
+            value_type = f"jsonb_typeof(jsonld_metadata -> '{self.name}')"
+        else:
+            value = f"json_extract(jsonld_metadata, '$.\"{self.name}\"')"
+            value_type = f"json_type(jsonld_metadata, '$.\"{self.name}\"')"
+        return [
+            (
+                f"CREATE INDEX IF NOT EXISTS ix_item_metadata_value_{self.index_suffix} "
+                f"ON item ({value})"
+            ),
+            (
+                f"CREATE INDEX IF NOT EXISTS ix_item_metadata_type_{self.index_suffix} "
+                f"ON item ({value_type})"
+            ),
+        ]
+
+    def filter(
+        self,
+        value: str | None = None,
+        value_from: str | None = None,
+        value_to: str | None = None,
+    ) -> ColumnElement[bool]:
+        """Clause matching items whose property equals value, or is in a range.
+
+        A property holding a list matches when any of its values does.  Values are
+        compared as text, so ISO 8601 dates compare in date order.
+
+        Each case is its own SELECT, so each can use an index: on Postgres equality
+        is a JSONB containment test backed by the GIN index on jsonld_metadata, and
+        ranges use the value index; on SQLite both use the value index.  Lists are
+        found through the value type index and then searched.
+        """
+        if value is not None and (value_from is not None or value_to is not None):
+            raise ValueError("Pass either a value or a value range, not both")
+        if value is None and value_from is None and value_to is None:
+            raise ValueError(f"No value given for metadata property '{self.name}'")
+
+        def matches(expression: ColumnElement) -> ColumnElement[bool]:
+            if value is not None:
+                return expression == value
+            conditions = []
+            if value_from is not None:
+                conditions.append(expression >= value_from)
+            if value_to is not None:
+                conditions.append(expression <= value_to)
+            return and_(*conditions)
+
+        item_uuid = ItemDB.__table__.c.item_uuid
+        if self.dialect_name == "postgresql" and value is not None:
+            selects = [
+                select(item_uuid).where(
+                    self.column.op("@>")(cast(json.dumps({self.name: value}), JSONB))
+                ),
+                select(item_uuid).where(
+                    self.column.op("@>")(cast(json.dumps({self.name: [value]}), JSONB))
+                ),
+            ]
+        else:
+            list_values = self.list_values()
+            selects = [
+                select(item_uuid).where(matches(self.value)),
+                select(item_uuid).where(
+                    self.value_type == "array",
+                    select(list_values.c.value)
+                    .where(matches(list_values.c.value))
+                    .exists(),
+                ),
+            ]
+        return item_uuid.in_(union_all(*selects))
+
 
 class SQLDBService(DBService):
-    def __init__(self, session: Session | None = None):
+    def __init__(self, session: Session | scoped_session | None = None):
         self.session = session or create_db_session()
 
-    def _get_item_db(self, item_uuid: str) -> ItemDB | None:
-        return self.session.get(ItemDB, item_uuid)
+    @classmethod
+    def scoped(cls) -> "SQLDBService":
+        """SQLDBService whose session is thread-local, e.g. one per web request.
+
+        Call close() at the end of each unit of work to discard the current
+        thread's session.
+        """
+        return cls(session=scoped_session(get_sessionmaker()))
+
+    def close(self) -> None:
+        """Close the session, returning its connection to the engine's pool."""
+        if isinstance(self.session, scoped_session):
+            self.session.remove()
+        else:
+            self.session.close()
+
+    def _get_item_db(self, item_uuid: str, *, with_files: bool = False) -> ItemDB | None:
+        options = [selectinload(ItemDB.files)] if with_files else []
+        return self.session.get(ItemDB, item_uuid, options=options)
 
-    def _get_file_db(self, file_uuid: str) -> FileDB | None:
-        return self.session.get(FileDB, file_uuid)
+    def _get_file_db(self, file_uuid: str, *, with_item: bool = False) -> FileDB | None:
+        options = [joinedload(FileDB.item)] if with_item else []
+        return self.session.get(FileDB, file_uuid, options=options)
 
     def save_item(self, item: "Item", *, commit: bool = True) -> "Item":
         """Save an Item to the Database.
@@ -201,9 +683,173 @@ class SQLDBService(DBService):
 
         return new_file
 
+    def get_existing_item_uuids(self, item_uuids: list[str]) -> set[str]:
+        """Return the subset of item_uuids that already exist in the item table."""
+        if not item_uuids:
+            return set()
+        query = select(ItemDB.item_uuid).where(ItemDB.item_uuid.in_(item_uuids))
+        return set(self.session.scalars(query))
+
+    def bulk_insert_items(
+        self,
+        items: list["Item"],
+        *,
+        commit: bool = True,
+    ) -> list["Item"]:
+        """Insert new Items, and their Files, with batched multi-row INSERTs.
+
+        UUIDs and creation dates are assigned client-side and set on the passed
+        Items and Files, so rows are neither merged, refreshed nor re-selected.  All
+        Items must be new; use save_item to update existing ones.
+        """
+        now = datetime.datetime.now(datetime.UTC)
+        item_rows, file_rows = [], []
+        for item in items:
+            if not item.item_uuid:
+                item.item_uuid = str(uuid.uuid4())
+                item.jsonld_metadata.set_id(item.item_uuid)
+            item.date_created = now
+            item_rows.append(
+                {
+                    "item_uuid": item.item_uuid,
+                    "title": item.title,
+                    "jsonld_metadata": item.jsonld_metadata.to_compact(),
+                    "date_created": now,
+                }
+            )
+            for file in item.files:
+                file.file_uuid = file.file_uuid or str(uuid.uuid4())
+                file.item_uuid = item.item_uuid
+                file.date_created = now
+                file_rows.append(
+                    {
+                        "file_uuid": file.file_uuid,
+                        "item_uuid": file.item_uuid,
+                        "filename": file.filename,
+                        "mimetype": file.mimetype,
+                        "content_digest": file.content_digest,
+                        "date_created": now,
+                    }
+                )
+
+        try:
+            if item_rows:
+                self.session.execute(insert(ItemDB), item_rows)
+            if file_rows:
+                self.session.execute(insert(FileDB), file_rows)
+            if commit:
+                self.session.commit()
+            else:
+                self.session.flush()
+        except SQLAlchemyError:
+            logger.exception("Error bulk inserting Items")
+            self.session.rollback()
+            raise
+
+        return items
+
+    def record_file_checksums(self, files: list["File"]) -> None:
+        """Save the size and checksum set on files as they were stored."""
+        rows = [
+            {
+                "file_uuid": str(file.file_uuid),
+                "size": file.size,
+                "checksum": file.checksum,
+                "checksum_algorithm": file.checksum_algorithm,
+            }
+            for file in files
+            if file.checksum is not None
+        ]
+        if not rows:
+            return
+        self.session.execute(update(FileDB), rows)
+        for row in rows:
+            key = identity_key(FileDB, row["file_uuid"])
+            if (file_db := self.session.identity_map.get(key)) is not None:
+                self.session.expire(file_db)
+
+    def get_content_digests(self, file_uuids: list[str]) -> dict[str, str]:
+        """Return the content digest of each existing file that has one."""
+        if not file_uuids:
+            return {}
+        query = select(FileDB.file_uuid, FileDB.content_digest).where(
+            FileDB.file_uuid.in_(file_uuids),
+            FileDB.content_digest.is_not(None),
+        )
+        return dict(self.session.execute(query).all())
+
+    def get_blob_ref_counts(self, content_digests: list[str]) -> dict[str, int]:
+        """Return the ref_count of each of content_digests that is referenced."""
+        if not content_digests:
+            return {}
+        query = select(StorageBlobDB.content_digest, StorageBlobDB.ref_count).where(
+            StorageBlobDB.content_digest.in_(content_digests),
+            StorageBlobDB.ref_count > 0,
+        )
+        return dict(self.session.execute(query).all())
+
+    def update_blob_refs(
+        self,
+        *,
+        added: list[str | None] = (),
+        removed: list[str | None] = (),
+    ) -> list[str]:
+        """Count references to content-addressed blobs in and out.
+
+        Each digest in added gains a reference, and each in removed loses one, in a
+        single upsert per call.  Blobs left without references are dropped, and
+        their digests returned, so the caller can delete them from storage before
+        committing.  On Postgres the updated rows stay locked until then, so a
+        concurrent save of the same content waits rather than skipping an upload of
+        a blob that is about to be deleted.
+        """
+        changes = Counter(digest for digest in added if digest)
+        changes.subtract(digest for digest in removed if digest)
+        changes = {digest: delta for digest, delta in changes.items() if delta}
+        if not changes:
+            return []
+
+        now = utcnow()
+        table = StorageBlobDB.__table__
+        dialect_insert = (
+            postgresql_insert if self.dialect_name == "postgresql" else sqlite_insert
+        )
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.content_digest],
+            set_={
+                "ref_count": table.c.ref_count + statement.excluded.ref_count,
+                "date_updated": now,
+            },
+        )
+        # sorted, so concurrent transactions lock rows in the same order
+        self.session.execute(
+            statement,
+            [
+                {"content_digest": digest, "ref_count": delta, "date_created": now}
+                for digest, delta in sorted(changes.items())
+            ],
+        )
+
+        decremented = [digest for digest, delta in changes.items() if delta < 0]
+        if not decremented:
+            return []
+        orphaned = list(
+            self.session.scalars(
+                delete(StorageBlobDB)
+                .where(
+                    StorageBlobDB.content_digest.in_(decremented),
+                    StorageBlobDB.ref_count <= 0,
+                )
+                .returning(StorageBlobDB.content_digest)
+            )
+        )
+        logger.debug(f"{len(orphaned)} content-addressed blobs no longer referenced")
+        return orphaned
+
     def get_item(self, item_uuid: str) -> Optional["Item"]:
         """Retrieve an Item by its UUID and convert it to the domain model."""
-        item_db = self._get_item_db(item_uuid)
+        item_db = self._get_item_db(item_uuid, with_files=True)
         if not item_db:
             return None
 
@@ -214,7 +860,7 @@ class SQLDBService(DBService):
 
     def get_file(self, file_uuid: str) -> Optional["File"]:
         """Retrieve a File by its UUID and convert it to the domain model."""
-        file_db = self._get_file_db(file_uuid)
+        file_db = self._get_file_db(file_uuid, with_item=True)
         if not file_db:
             return None
         item = file_db.item.to_item()
@@ -222,15 +868,341 @@ class SQLDBService(DBService):
         file.item = item
         return file
 
-    def get_items(self, batch_size=100) -> Iterator["Item"]:
-        """Yield all Items from the item table."""
-        query = self.session.query(ItemDB).yield_per(batch_size)
-        for item_db in query:
+    FILE_VERSION_COLUMNS = (
+        FileDB.file_uuid,
+        FileDB.item_uuid,
+        FileDB.size,
+        FileDB.checksum,
+        FileDB.date_created,
+        FileDB.date_updated,
+    )
+
+    def get_item_version(self, item_uuid: str) -> ItemVersion | None:
+        """Return the dates of an item and the versions of its files, if it exists.
+
+        Metadata is not selected and no ORM objects are created, so this is much
+        cheaper than get_item.
+        """
+        item_row = self.session.execute(
+            select(ItemDB.item_uuid, ItemDB.date_created, ItemDB.date_updated).where(
+                ItemDB.item_uuid == item_uuid
+            )
+        ).first()
+        if item_row is None:
+            return None
+        file_rows = self.session.execute(
+            select(*self.FILE_VERSION_COLUMNS)
+            .where(FileDB.item_uuid == item_uuid)
+            .order_by(FileDB.file_uuid)
+        )
+        return ItemVersion(
+            *item_row,
+            files=tuple(FileVersion._make(row) for row in file_rows),
+        )
+
+    def get_file_version(self, file_uuid: str) -> FileVersion | None:
+        row = self.session.execute(
+            select(*self.FILE_VERSION_COLUMNS).where(FileDB.file_uuid == file_uuid)
+        ).first()
+        return None if row is None else FileVersion._make(row)
+
+    RELATIONSHIP_BATCH_SIZE = 500
+
+    # title is nullable, and a row comparison with NULL is never true, so untitled
+    # items are sorted, and compared with cursors, as having the title ""
+    ITEM_SORT_COLUMNS: ClassVar[dict] = {
+        "date_created": ItemDB.date_created,
+        # a literal, not a bound parameter, so SQLite matches the expression index
+        "title": func.coalesce(ItemDB.title, literal_column("''")),
+    }
+
+    @staticmethod
+    def encode_cursor(sort: str, direction: str, item_db: ItemDB) -> str:
+        value = getattr(item_db, sort)
+        if sort == "title":
+            value = value or ""
+        elif isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        payload = json.dumps([sort, direction, value, item_db.item_uuid])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str, direction: str) -> tuple:
+        try:
+            cursor_sort, cursor_direction, value, item_uuid = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+        except ValueError as exc:
+            raise ValueError("Invalid cursor") from exc
+        if (cursor_sort, cursor_direction) != (sort, direction):
+            raise ValueError("Cursor does not match the requested sort and direction")
+        if sort == "date_created":
+            value = datetime.datetime.fromisoformat(value)
+        return value, item_uuid
+
+    def query_items(
+        self,
+        *,
+        limit: int = 50,
+        cursor: str | None = None,
+        sort: str = "date_created",
+        direction: str = "asc",
+        title_prefix: str | None = None,
+        mimetype: str | None = None,
+        created_after: datetime.datetime | None = None,
+        created_before: datetime.datetime | None = None,
+        metadata_property: str | None = None,
+        metadata_value: str | None = None,
+        metadata_value_from: str | None = None,
+        metadata_value_to: str | None = None,
+    ) -> tuple[list["Item"], str | None]:
+        """Return one page of Items, using keyset pagination.
+
+        Pages are ordered by (sort, item_uuid), backed by composite indexes, and a
+        cursor resumes after the last item of the previous page, so every page
+        costs the same however deep it is.
+
+        Args:
+            limit: maximum number of items in the page
+            cursor: opaque next_cursor returned with the previous page
+            sort: "date_created" or "title"
+            direction: "asc" or "desc"
+            title_prefix: only items whose title starts with this string
+            mimetype: only items with a file of this mimetype; a trailing "/*", e.g.
+                "image/*", matches any subtype
+            created_after: only items created at or after this datetime
+            created_before: only items created before this datetime
+            metadata_property: only items whose JSON-LD metadata has this property,
+                e.g. "dc:creator", with the value given by metadata_value, or within
+                metadata_value_from and metadata_value_to (inclusive); see
+                MetadataProperty.filter
+            metadata_value: value the metadata property must equal
+            metadata_value_from: lowest value of the metadata property
+            metadata_value_to: highest value of the metadata property
+
+        Returns:
+            the page of Items, and the cursor for the next page, or None if this is
+            the last page
+        """
+        if sort not in self.ITEM_SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort: '{sort}'")
+        if direction not in ("asc", "desc"):
+            raise ValueError(f"Unsupported sort direction: '{direction}'")
+
+        sort_column = self.ITEM_SORT_COLUMNS[sort]
+        keyset = tuple_(sort_column, ItemDB.item_uuid)
+
+        query = select(ItemDB).options(selectinload(ItemDB.files))
+        if cursor:
+            value, item_uuid = self.decode_cursor(cursor, sort, direction)
+            if direction == "asc":
+                query = query.where(keyset > tuple_(value, item_uuid))
+            else:
+                query = query.where(keyset < tuple_(value, item_uuid))
+        if title_prefix:
+            query = query.where(ItemDB.title.startswith(title_prefix, autoescape=True))
+        if mimetype:
+            if mimetype.endswith("/*"):
+                file_filter = FileDB.mimetype.startswith(
+                    mimetype.removesuffix("*"), autoescape=True
+                )
+            else:
+                file_filter = FileDB.mimetype == mimetype
+            query = query.where(ItemDB.files.any(file_filter))
+        if created_after:
+            query = query.where(ItemDB.date_created >= created_after)
+        if created_before:
+            query = query.where(ItemDB.date_created < created_before)
+        if metadata_property:
+            query = query.where(
+                MetadataProperty(metadata_property, self.dialect_name).filter(
+                    value=metadata_value,
+                    value_from=metadata_value_from,
+                    value_to=metadata_value_to,
+                )
+            )
+        elif any(
+            value is not None
+            for value in (metadata_value, metadata_value_from, metadata_value_to)
+        ):
+            raise ValueError("A metadata value requires a metadata property")
+
+        if direction == "asc":
+            query = query.order_by(sort_column.asc(), ItemDB.item_uuid.asc())
+        else:
+            query = query.order_by(sort_column.desc(), ItemDB.item_uuid.desc())
+
+        # fetch one extra row to learn whether there is a next page
+        item_dbs = list(self.session.scalars(query.limit(limit + 1)))
+        next_cursor = None
+        if len(item_dbs) > limit:
+            item_dbs = item_dbs[:limit]
+            next_cursor = self.encode_cursor(sort, direction, item_dbs[-1])
+
+        items = []
+        for item_db in item_dbs:
+            item = item_db.to_item()
+            item.files = [file.to_file() for file in item_db.files]
+            items.append(item)
+        return items, next_cursor
+
+    def ensure_metadata_indexes(self, properties: list[str]) -> None:
+        """Create any missing expression indexes for queried metadata properties."""
+        for name in properties:
+            for ddl in MetadataProperty(name, self.dialect_name).index_ddl():
+                logger.debug(ddl)
+                self.session.execute(text(ddl))
+        self.session.commit()
+
+    def get_items(
+        self,
+        batch_size=100,
+        updated_since: datetime.datetime | None = None,
+    ) -> Iterator["Item"]:
+        """Yield all Items from the item table.
+
+        Items are fetched batch_size rows at a time from a server-side cursor where
+        the database supports one, and the files of each batch are loaded with a
+        single SELECT ... IN query, so each batch costs a constant number of queries
+        regardless of how many items it holds.
+
+        Args:
+            batch_size: number of items fetched per round trip
+            updated_since: only Items created or updated at or after this datetime
+        """
+        query = (
+            select(ItemDB)
+            .options(selectinload(ItemDB.files))
+            .execution_options(yield_per=batch_size)
+        )
+        if updated_since:
+            query = query.where(
+                or_(
+                    ItemDB.date_created >= updated_since,
+                    ItemDB.date_updated >= updated_since,
+                )
+            )
+        for item_db in self.session.scalars(query):
             files = [file.to_file() for file in item_db.files]
             item = item_db.to_item()
             item.files = files
             yield item
 
+    def get_item_rows(
+        self,
+        batch_size: int = 1_000,
+        updated_since: datetime.datetime | None = None,
+    ) -> Iterator[ItemRow]:
+        """Yield a lightweight, read-only ItemRow per item.
+
+        Only the listed columns are selected, through a server-side cursor, and no
+        ORM objects, Items, Files or ItemMetadata are created.
+        """
+        query = select(
+            ItemDB.item_uuid,
+            ItemDB.title,
+            ItemDB.date_created,
+            ItemDB.date_updated,
+        ).execution_options(yield_per=batch_size)
+        if updated_since:
+            query = query.where(
+                or_(
+                    ItemDB.date_created >= updated_since,
+                    ItemDB.date_updated >= updated_since,
+                )
+            )
+        for row in self.session.execute(query):
+            yield ItemRow._make(row)
+
+    def get_items_by_uuid(self, item_uuids: list[str]) -> list["Item"]:
+        """Return the Items for item_uuids, in the same order, skipping missing ones."""
+        if not item_uuids:
+            return []
+        query = (
+            select(ItemDB)
+            .options(selectinload(ItemDB.files))
+            .where(ItemDB.item_uuid.in_(item_uuids))
+        )
+        items = {}
+        for item_db in self.session.scalars(query):
+            item = item_db.to_item()
+            item.files = [file.to_file() for file in item_db.files]
+            items[item.item_uuid] = item
+        return [items[item_uuid] for item_uuid in item_uuids if item_uuid in items]
+
+    @property
+    def dialect_name(self) -> str:
+        return self.session.get_bind().dialect.name
+
+    @property
+    def search_index(self) -> SearchIndex:
+        return SearchIndex.for_dialect(self.dialect_name, self.session)
+
+    def index_search_documents(self, documents: list[SearchDocument]) -> None:
+        """Add or replace the full-text index entries of items, without committing."""
+        self.search_index.index_documents(documents)
+
+    def remove_from_search_index(self, item_uuids: list[str]) -> None:
+        self.search_index.remove_items(item_uuids)
+
+    @staticmethod
+    def encode_search_cursor(query: str, rank: float, item_uuid: str) -> str:
+        payload = json.dumps(["search", query, rank, item_uuid])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_search_cursor(cursor: str, query: str) -> tuple[float, str]:
+        try:
+            kind, cursor_query, rank, item_uuid = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+        except ValueError as exc:
+            raise ValueError("Invalid cursor") from exc
+        if (
+            kind != "search"
+            or cursor_query != query
+            or not isinstance(rank, (int, float))
+            or not isinstance(item_uuid, str)
+        ):
+            raise ValueError("Cursor does not match the requested search")
+        return float(rank), item_uuid
+
+    def search_items(
+        self,
+        query: str,
+        *,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple["Item", float]], str | None]:
+        """Return one page of Items matching a full-text query, best match first.
+
+        Every word of the query must match the item's title, metadata or file text;
+        a word ending in "*" matches as a prefix.  Pages are keyset paginated on
+        (rank, item_uuid), and a cursor resumes after the last match of the previous
+        page.
+
+        Args:
+            query: words to search for
+            limit: maximum number of items in the page
+            cursor: opaque next_cursor returned with the previous page
+
+        Returns:
+            the page of (Item, rank) pairs, where a higher rank is a better match,
+            and the cursor for the next page, or None if this is the last page
+        """
+        after = self.decode_search_cursor(cursor, query) if cursor else None
+        # fetch one extra row to learn whether there is a next page
+        matches = self.search_index.search(query, limit + 1, after)
+        next_cursor = None
+        if len(matches) > limit:
+            matches = matches[:limit]
+            item_uuid, rank = matches[-1]
+            next_cursor = self.encode_search_cursor(query, rank, item_uuid)
+
+        ranks = dict(matches)
+        items = self.get_items_by_uuid([item_uuid for item_uuid, _ in matches])
+        return [(item, ranks[item.item_uuid]) for item in items], next_cursor
+
     def delete_item(self, item: "Item", *, commit: bool = True):
         item_db = self._get_item_db(item.item_uuid)
         self.session.delete(item_db)
@@ -250,3 +1222,517 @@ class SQLDBService(DBService):
         else:
             self.session.flush()
         return True
+
+    def add_relationships(
+        self,
+        relationships: list["Relationship"],
+        *,
+        commit: bool = True,
+    ) -> int:
+        """Insert relationships with batched INSERTs, skipping existing ones.
+
+        Returns the number of relationships inserted.
+        """
+        insert_for_dialect = {
+            "postgresql": postgresql_insert,
+            "sqlite": sqlite_insert,
+        }[self.dialect_name]
+        now = datetime.datetime.now(datetime.UTC)
+        rows = {
+            relationship.triple: {
+                "relationship_uuid": relationship.relationship_uuid
+                or str(uuid.uuid4()),
+                "subject": relationship.subject,
+                "predicate": relationship.predicate,
+                "object": relationship.object,
+                "date_created": now,
+            }
+            for relationship in relationships
+        }
+        statement = insert_for_dialect(RelationshipDB.__table__).on_conflict_do_nothing(
+            index_elements=["subject", "predicate", "object"]
+        )
+        count = 0
+        try:
+            batch_size = self.RELATIONSHIP_BATCH_SIZE
+            for batch in batched(rows.values(), batch_size, strict=False):
+                count += self.session.execute(statement, list(batch)).rowcount
+            if commit:
+                self.session.commit()
+            else:
+                self.session.flush()
+        except SQLAlchemyError:
+            logger.exception("Error adding Relationships")
+            self.session.rollback()
+            raise
+        return count
+
+    def remove_relationships(
+        self,
+        relationships: list["Relationship"],
+        *,
+        commit: bool = True,
+    ) -> int:
+        """Delete relationships by subject, predicate and object.
+
+        Returns the number of relationships deleted.
+        """
+        triples = {relationship.triple for relationship in relationships}
+        keyset = tuple_(
+            RelationshipDB.subject, RelationshipDB.predicate, RelationshipDB.object
+        )
+        count = 0
+        for batch in batched(triples, self.RELATIONSHIP_BATCH_SIZE, strict=False):
+            result = self.session.execute(
+                delete(RelationshipDB).where(keyset.in_(batch))
+            )
+            count += result.rowcount
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return count
+
+    def get_relationships(
+        self,
+        *,
+        subject: str | None = None,
+        predicate: str | None = None,
+        object: str | None = None,  # noqa: A002
+        limit: int | None = None,
+    ) -> list["Relationship"]:
+        """Return relationships matching a subject, predicate and object.
+
+        Any combination may be given, e.g. only a subject for the outbound neighbors
+        of a node.
+        """
+        query = select(RelationshipDB)
+        if subject is not None:
+            query = query.where(RelationshipDB.subject == subject)
+        if predicate is not None:
+            query = query.where(RelationshipDB.predicate == predicate)
+        if object is not None:
+            query = query.where(RelationshipDB.object == object)
+        query = query.order_by(
+            RelationshipDB.subject, RelationshipDB.predicate, RelationshipDB.object
+        ).limit(limit)
+        return [
+            relationship_db.to_relationship()
+            for relationship_db in self.session.scalars(query)
+        ]
+
+    def traverse_relationships(
+        self,
+        start: str,
+        *,
+        predicates: list[str] | None = None,
+        direction: str = "out",
+        max_depth: int = 10,
+    ) -> list[tuple["Relationship", int]]:
+        """Return every relationship reachable from a node, with a single query.
+
+        A recursive CTE walks the reachable nodes hop by hop inside the database,
+        each hop an index lookup on (subject, predicate) or (object, predicate).
+        The walk is a UNION over (node, depth), so a node reached along several
+        paths, through shared descendants or around a cycle, is expanded at most
+        once per depth rather than once per path.
+
+        Args:
+            start: node to start from
+            predicates: only follow relationships with these predicates, e.g.
+                ["dcterms:isPartOf"]; all predicates by default
+            direction: "out" follows relationships from subject to object, "in"
+                from object to subject, e.g. from a collection to its members
+            max_depth: maximum number of hops from start
+
+        Returns:
+            (Relationship, depth) pairs, ordered by depth, where depth is the fewest
+            hops needed to reach the relationship, starting at 1
+        """
+        if direction not in ("out", "in"):
+            raise ValueError(f"Unsupported traversal direction: '{direction}'")
+        if max_depth < 1:
+            raise ValueError("max_depth must be at least 1")
+
+        relationship = RelationshipDB.__table__
+        step = relationship.alias("step")
+        near, far = (
+            ("subject", "object") if direction == "out" else ("object", "subject")
+        )
+        walk = select(
+            literal(start, String).label("node"),
+            literal(0).label("depth"),
+        ).cte("walk", recursive=True)
+
+        # nodes at max_depth - 1 are reached, for their relationships at max_depth,
+        # but not expanded further
+        next_hop = (
+            select(step.c[far], (walk.c.depth + 1).label("depth"))
+            .join(walk, step.c[near] == walk.c.node)
+            .where(walk.c.depth < max_depth - 1)
+        )
+        if predicates:
+            next_hop = next_hop.where(step.c.predicate.in_(predicates))
+        walk = walk.union(next_hop)
+
+        reached = (
+            select(walk.c.node, func.min(walk.c.depth).label("depth"))
+            .group_by(walk.c.node)
+            .subquery()
+        )
+        # select plain columns, not ORM entities, as trees can be very large
+        query = (
+            select(
+                relationship.c.relationship_uuid,
+                relationship.c.subject,
+                relationship.c.predicate,
+                relationship.c.object,
+                relationship.c.date_created,
+                relationship.c.date_updated,
+                (reached.c.depth + 1).label("depth"),
+            )
+            .join(reached, relationship.c[near] == reached.c.node)
+            .where(reached.c.depth < max_depth)
+            .order_by(reached.c.depth, relationship.c.subject, relationship.c.object)
+        )
+        if predicates:
+            query = query.where(relationship.c.predicate.in_(predicates))
+        return [
+            (
+                Relationship(
+                    relationship_uuid=row.relationship_uuid,
+                    subject=row.subject,
+                    predicate=row.predicate,
+                    object=row.object,
+                    date_created=row.date_created,
+                    date_updated=row.date_updated,
+                ),
+                row.depth,
+            )
+            for row in self.session.execute(query)
+        ]
+
+    def enqueue_replication_tasks(
+        self,
+        files: list["File"],
+        service_names: list[str],
+        action: str,
+        *,
+        commit: bool = True,
+    ) -> list[ReplicationTaskDB]:
+        """Record pending replication tasks for files on replication services.
+
+        When a delete is enqueued, pending store tasks for the same file and service
+        are dropped, as there is no longer anything to replicate.
+        """
+        now = datetime.datetime.now(datetime.UTC)
+        tasks = []
+        for file in files:
+            if action == "delete":
+                self.session.query(ReplicationTaskDB).filter(
+                    ReplicationTaskDB.file_uuid == str(file.file_uuid),
+                    ReplicationTaskDB.service_name.in_(service_names),
+                    ReplicationTaskDB.action == "store",
+                    ReplicationTaskDB.status == "pending",
+                ).delete(synchronize_session=False)
+            for service_name in service_names:
+                task = ReplicationTaskDB(
+                    task_uuid=str(uuid.uuid4()),
+                    action=action,
+                    service_name=service_name,
+                    item_uuid=str(file.item_uuid),
+                    file_uuid=str(file.file_uuid),
+                    filename=file.filename,
+                    mimetype=file.mimetype,
+                    content_digest=file.content_digest,
+                    status="pending",
+                    attempts=0,
+                    next_attempt_at=now,
+                    date_created=now,
+                )
+                self.session.add(task)
+                tasks.append(task)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return tasks
+
+    def get_unreplicated_service_names(self, file_uuid: str) -> set[str]:
+        """Return the services with outstanding or failed replication tasks for a file.
+
+        Those services may hold an older version of the file, or none at all.
+        """
+        query = (
+            select(ReplicationTaskDB.service_name)
+            .where(
+                ReplicationTaskDB.file_uuid == file_uuid,
+                ReplicationTaskDB.status.in_(["pending", "in_progress", "failed"]),
+            )
+            .distinct()
+        )
+        return set(self.session.scalars(query))
+
+    def claim_replication_tasks(
+        self,
+        limit: int = 100,
+        lease_seconds: int = 300,
+    ) -> list[ReplicationTaskDB]:
+        """Claim a batch of due replication tasks for a worker.
+
+        Claimed tasks are marked "in_progress" and leased until now + lease_seconds;
+        tasks whose lease expires without being completed, e.g. after a worker
+        crash, become claimable again.  On Postgres, rows locked by another worker
+        are skipped.
+
+        The returned tasks are detached from the session, so they can be read from
+        worker threads without triggering database access.
+        """
+        now = datetime.datetime.now(datetime.UTC)
+        query = (
+            select(ReplicationTaskDB)
+            .where(
+                ReplicationTaskDB.status.in_(["pending", "in_progress"]),
+                ReplicationTaskDB.next_attempt_at <= now,
+            )
+            .order_by(ReplicationTaskDB.date_created, ReplicationTaskDB.task_uuid)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        tasks = list(self.session.scalars(query))
+        lease_until = now + datetime.timedelta(seconds=lease_seconds)
+        for task in tasks:
+            task.status = "in_progress"
+            task.next_attempt_at = lease_until
+        self.session.flush()
+        for task in tasks:
+            self.session.expunge(task)
+        self.session.commit()
+        return tasks
+
+    def complete_replication_task(
+        self,
+        task_uuid: str,
+        *,
+        commit: bool = True,
+    ) -> None:
+        self.session.query(ReplicationTaskDB).filter(
+            ReplicationTaskDB.task_uuid == task_uuid
+        ).delete(synchronize_session=False)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+
+    def fail_replication_task(
+        self,
+        task_uuid: str,
+        error: str | None,
+        retry_at: datetime.datetime | None,
+        *,
+        count_attempt: bool = True,
+        commit: bool = True,
+    ) -> None:
+        """Record a failed attempt; retry at retry_at, or mark failed when None."""
+        values = {
+            ReplicationTaskDB.status: "pending" if retry_at else "failed",
+            ReplicationTaskDB.last_error: error,
+        }
+        if retry_at:
+            values[ReplicationTaskDB.next_attempt_at] = retry_at
+        if count_attempt:
+            values[ReplicationTaskDB.attempts] = ReplicationTaskDB.attempts + 1
+        self.session.query(ReplicationTaskDB).filter(
+            ReplicationTaskDB.task_uuid == task_uuid
+        ).update(values, synchronize_session=False)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+
+    def retry_failed_replication_tasks(self, service_name: str | None = None) -> int:
+        """Reset failed replication tasks to pending, returning the number reset."""
+        query = self.session.query(ReplicationTaskDB).filter(
+            ReplicationTaskDB.status == "failed"
+        )
+        if service_name:
+            query = query.filter(ReplicationTaskDB.service_name == service_name)
+        count = query.update(
+            {
+                ReplicationTaskDB.status: "pending",
+                ReplicationTaskDB.attempts: 0,
+                ReplicationTaskDB.next_attempt_at: datetime.datetime.now(datetime.UTC),
+            },
+            synchronize_session=False,
+        )
+        self.session.commit()
+        return count
+
+    def get_files_page(
+        self,
+        *,
+        after_file_uuid: str | None = None,
+        limit: int = 100,
+    ) -> list["File"]:
+        """Return up to limit Files in file_uuid order, after after_file_uuid."""
+        query = select(FileDB).order_by(FileDB.file_uuid).limit(limit)
+        if after_file_uuid is not None:
+            query = query.where(FileDB.file_uuid > after_file_uuid)
+        return [file_db.to_file() for file_db in self.session.scalars(query)]
+
+    def get_files_by_prefix(
+        self,
+        *,
+        item_uuid_prefix: str | None = None,
+        content_digest_prefix: str | None = None,
+        batch_size: int = 1_000,
+    ) -> Iterator["File"]:
+        """Yield Files whose item UUID, or content digest, starts with a prefix.
+
+        Both columns are indexed, and prefixes are matched as ranges rather than
+        with LIKE, so each prefix is an index range scan on any database.
+
+        Files are yielded in order of their storage key, as listed by storage
+        services: by content digest when matching a digest prefix, otherwise by
+        "{item_uuid}/{file_uuid}__{filename}".  Keys are compared byte by byte, the
+        order of Python strings, whatever the database's collation.
+        """
+
+        def prefix_range(column: Column, prefix: str) -> ColumnElement[bool]:
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            return and_(column >= prefix, column < upper)
+
+        def binary(expression: ColumnElement) -> ColumnElement:
+            # SQLite compares text byte by byte already
+            if self.dialect_name == "postgresql":
+                return expression.collate("C")
+            return expression
+
+        query = select(FileDB).execution_options(yield_per=batch_size)
+        if item_uuid_prefix:
+            query = query.where(prefix_range(FileDB.item_uuid, item_uuid_prefix))
+        if content_digest_prefix:
+            query = query.where(
+                prefix_range(FileDB.content_digest, content_digest_prefix)
+            ).order_by(binary(FileDB.content_digest))
+        else:
+            # the key built as the storage service builds it, where a missing
+            # filename is formatted as "None"
+            storage_key = (
+                FileDB.item_uuid
+                + "/"
+                + FileDB.file_uuid
+                + "__"
+                + func.coalesce(FileDB.filename, "None")
+            )
+            query = query.order_by(binary(storage_key))
+        for file_db in self.session.scalars(query):
+            yield file_db.to_file()
+
+    def start_fixity_audit_run(self) -> FixityAuditRunDB:
+        run = FixityAuditRunDB(
+            run_uuid=str(uuid.uuid4()),
+            status="running",
+            files_checked=0,
+            failures=0,
+        )
+        self.session.add(run)
+        self.session.commit()
+        return run
+
+    def get_fixity_audit_run(self, run_uuid: str) -> FixityAuditRunDB | None:
+        return self.session.get(FixityAuditRunDB, run_uuid)
+
+    def get_unfinished_fixity_audit_run(self) -> FixityAuditRunDB | None:
+        """Return the most recently started audit run that has not completed."""
+        query = (
+            select(FixityAuditRunDB)
+            .where(FixityAuditRunDB.status == "running")
+            .order_by(FixityAuditRunDB.date_created.desc())
+            .limit(1)
+        )
+        return self.session.scalars(query).first()
+
+    def record_fixity_audit_results(
+        self,
+        run_uuid: str,
+        results: list[FixityAuditResultDB],
+        last_file_uuid: str,
+        files_checked: int,
+        *,
+        commit: bool = True,
+    ) -> None:
+        """Save a batch of audit results and advance the run past its files."""
+        self.session.add_all(results)
+        failures = sum(result.status != "ok" for result in results)
+        self.session.execute(
+            update(FixityAuditRunDB)
+            .where(FixityAuditRunDB.run_uuid == run_uuid)
+            .values(
+                last_file_uuid=last_file_uuid,
+                files_checked=FixityAuditRunDB.files_checked + files_checked,
+                failures=FixityAuditRunDB.failures + failures,
+                date_updated=utcnow(),
+            )
+        )
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+
+    def complete_fixity_audit_run(self, run_uuid: str) -> None:
+        self.session.execute(
+            update(FixityAuditRunDB)
+            .where(FixityAuditRunDB.run_uuid == run_uuid)
+            .values(status="completed", date_completed=utcnow())
+        )
+        self.session.commit()
+
+    def get_fixity_audit_failures(
+        self,
+        run_uuid: str,
+        limit: int = 1_000,
+    ) -> list[FixityAuditResultDB]:
+        query = (
+            select(FixityAuditResultDB)
+            .where(
+                FixityAuditResultDB.run_uuid == run_uuid,
+                FixityAuditResultDB.status != "ok",
+            )
+            .order_by(FixityAuditResultDB.file_uuid)
+            .limit(limit)
+        )
+        return list(self.session.scalars(query))
+
+    def get_replication_status(self) -> dict:
+        """Summarize queue depth and replication lag per replication service."""
+        now = datetime.datetime.now(datetime.UTC)
+        query = (
+            select(
+                ReplicationTaskDB.service_name,
+                ReplicationTaskDB.status,
+                func.count(),
+                func.min(ReplicationTaskDB.date_created),
+            )
+            .group_by(ReplicationTaskDB.service_name, ReplicationTaskDB.status)
+        )
+        services: dict[str, dict] = {}
+        for service_name, status, count, oldest_created in self.session.execute(query):
+            service = services.setdefault(
+                service_name,
+                {"pending": 0, "in_progress": 0, "failed": 0, "lag_seconds": 0.0},
+            )
+            service[status] = count
+            if status in ("pending", "in_progress") and oldest_created is not None:
+                oldest = oldest_created
+                if oldest.tzinfo is None:
+                    oldest = oldest.replace(tzinfo=datetime.UTC)
+                lag = max((now - oldest).total_seconds(), 0.0)
+                service["lag_seconds"] = max(service["lag_seconds"], lag)
+        return {
+            "queue_depth": sum(
+                service["pending"] + service["in_progress"]
+                for service in services.values()
+            ),
+            "services": services,
+        }
@@ -0,0 +1,38 @@
+"""Use JSONB for item metadata
+
+Revision ID: 851f71930aff
+Revises: a0557b8d393a
+Create Date: 2026-10-18 18:05:41.226103
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '851f71930aff'
+down_revision: Union[str, None] = 'a0557b8d393a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('item', 'jsonld_metadata',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=False,
+               postgresql_using='jsonld_metadata::jsonb')
+    # supports @> containment, for metadata equality queries
+    op.create_index('ix_item_metadata_path_ops', 'item', ['jsonld_metadata'], unique=False, postgresql_using='gin', postgresql_ops={'jsonld_metadata': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_item_metadata_path_ops', table_name='item', postgresql_using='gin')
+    op.alter_column('item', 'jsonld_metadata',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=False,
+               postgresql_using='jsonld_metadata::json')
@@ -0,0 +1,43 @@
+"""Add item full-text search index
+
+Revision ID: a0557b8d393a
+Revises: bdef9b8f3a9c
+Create Date: 2026-10-18 17:32:10.512047
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0557b8d393a'
+down_revision: Union[str, None] = 'bdef9b8f3a9c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('item_search',
+    sa.Column('item_uuid', sa.String(length=36), nullable=False),
+    sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+    sa.ForeignKeyConstraint(['item_uuid'], ['item.item_uuid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_uuid')
+    )
+    op.create_index('ix_item_search_document', 'item_search', ['document'], unique=False, postgresql_using='gin')
+    # index existing items by title and metadata; run `tidepool search-reindex` to
+    # also index the text of their files
+    op.execute(
+        "INSERT INTO item_search (item_uuid, document) "
+        "SELECT item_uuid, "
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(jsonb_to_tsvector('english', jsonld_metadata::jsonb, '[\"string\"]'), 'B') "
+        "FROM item"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_item_search_document', table_name='item_search', postgresql_using='gin')
+    op.drop_table('item_search')
@@ -0,0 +1,35 @@
+"""Index item titles with NULL as the empty string for keyset pagination
+
+Revision ID: c81a71a58c90
+Revises: 880ea77eb0cc
+Create Date: 2026-10-18 21:14:07.512306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81a71a58c90'
+down_revision: Union[str, None] = '880ea77eb0cc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # items are paged by (coalesce(title, ''), item_uuid), so untitled items are
+    # not lost by row comparisons with NULL
+    op.drop_index('ix_item_title_item_uuid', table_name='item')
+    op.create_index(
+        'ix_item_title_item_uuid',
+        'item',
+        [sa.text("coalesce(title, '')"), 'item_uuid'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_item_title_item_uuid', table_name='item')
+    op.create_index('ix_item_title_item_uuid', 'item', ['title', 'item_uuid'], unique=False)
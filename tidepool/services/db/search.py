@@ -0,0 +1,321 @@
+"""tidepool/services/db/search.py"""
+
+import logging
+import re
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session, scoped_session
+
+from tidepool.search import SearchDocument
+from tidepool.settings.manager import settings
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TERM_PATTERN = re.compile(r"\w+\*?")
+
+
+class SearchIndex:
+    """Full-text index of items, kept in the same database as the items.
+
+    Subclasses implement the index for one database dialect.  Writes join the
+    session's current transaction, so the index is committed, or rolled back,
+    together with the items it describes.
+    """
+
+    def __init__(self, session: Session | scoped_session):
+        self.session = session
+
+    @classmethod
+    def for_dialect(
+        cls,
+        dialect_name: str,
+        session: Session | scoped_session,
+    ) -> "SearchIndex":
+        index_classes = {
+            "sqlite": SQLiteSearchIndex,
+            "postgresql": PostgresSearchIndex,
+        }
+        if dialect_name not in index_classes:
+            raise NotImplementedError(f"Full-text search unsupported for {dialect_name}")
+        return index_classes[dialect_name](session)
+
+    @staticmethod
+    def parse_terms(query: str) -> list[str]:
+        """Split a user query into words, each optionally ending in a prefix "*"."""
+        return SEARCH_TERM_PATTERN.findall(query)
+
+    def index_documents(self, documents: list[SearchDocument]) -> None:
+        raise NotImplementedError
+
+    def remove_items(self, item_uuids: list[str]) -> None:
+        raise NotImplementedError
+
+    def remove_orphans(self) -> None:
+        """Remove entries of items that no longer exist."""
+        raise NotImplementedError
+
+    def optimize(self) -> None:
+        """Compact the index after bulk changes, where the database supports it."""
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        after: tuple[float, str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Return (item_uuid, rank) pairs matching query, best match first.
+
+        Matches are ordered by rank, highest first, then by item_uuid, and after is
+        the (rank, item_uuid) of the last match of the previous page, so a page is
+        found through the index however deep it is.
+        """
+        raise NotImplementedError
+
+
+class SQLiteSearchIndex(SearchIndex):
+    """FTS5 index, ranked with bm25.
+
+    The FTS5 table item_search is keyed by an integer rowid, so item_search_document
+    maps each item_uuid to its rowid, letting an item's entry be replaced or removed
+    without scanning the index.
+    """
+
+    def _get_doc_ids(self, item_uuids: list[str]) -> dict[str, int]:
+        if not item_uuids:
+            return {}
+        rows = self.session.execute(
+            text(
+                "SELECT item_uuid, doc_id FROM item_search_document "
+                "WHERE item_uuid IN :item_uuids"
+            ).bindparams(bindparam("item_uuids", expanding=True)),
+            {"item_uuids": item_uuids},
+        )
+        return dict(rows.all())
+
+    def _delete_doc_ids(self, doc_ids: list[int]) -> None:
+        if not doc_ids:
+            return
+        self.session.execute(
+            text("DELETE FROM item_search WHERE rowid IN :doc_ids").bindparams(
+                bindparam("doc_ids", expanding=True)
+            ),
+            {"doc_ids": doc_ids},
+        )
+
+    def index_documents(self, documents: list[SearchDocument]) -> None:
+        if not documents:
+            return
+        doc_ids = self._get_doc_ids([document.item_uuid for document in documents])
+        self._delete_doc_ids(list(doc_ids.values()))
+
+        new_uuids = [
+            document.item_uuid
+            for document in documents
+            if document.item_uuid not in doc_ids
+        ]
+        if new_uuids:
+            self.session.execute(
+                text("INSERT INTO item_search_document (item_uuid) VALUES (:item_uuid)"),
+                [{"item_uuid": item_uuid} for item_uuid in new_uuids],
+            )
+            doc_ids.update(self._get_doc_ids(new_uuids))
+
+        self.session.execute(
+            text(
+                "INSERT INTO item_search (rowid, title, metadata, content) "
+                "VALUES (:doc_id, :title, :metadata, :content)"
+            ),
+            [
+                {
+                    "doc_id": doc_ids[document.item_uuid],
+                    "title": document.title,
+                    "metadata": document.metadata,
+                    "content": document.content,
+                }
+                for document in documents
+            ],
+        )
+
+    def remove_items(self, item_uuids: list[str]) -> None:
+        doc_ids = self._get_doc_ids(item_uuids)
+        if not doc_ids:
+            return
+        self._delete_doc_ids(list(doc_ids.values()))
+        self.session.execute(
+            text("DELETE FROM item_search_document WHERE doc_id IN :doc_ids").bindparams(
+                bindparam("doc_ids", expanding=True)
+            ),
+            {"doc_ids": list(doc_ids.values())},
+        )
+
+    def remove_orphans(self) -> None:
+        orphans = (
+            "SELECT doc_id FROM item_search_document AS d WHERE NOT EXISTS "
+            "(SELECT 1 FROM item WHERE item.item_uuid = d.item_uuid)"
+        )
+        self.session.execute(text(f"DELETE FROM item_search WHERE rowid IN ({orphans})"))
+        self.session.execute(
+            text(f"DELETE FROM item_search_document WHERE doc_id IN ({orphans})")
+        )
+
+    def optimize(self) -> None:
+        self.session.execute(
+            text("INSERT INTO item_search (item_search) VALUES ('optimize')")
+        )
+
+    @staticmethod
+    def to_match_expression(terms: list[str]) -> str:
+        # quote every term, so FTS5 operators and column filters in user input are
+        # matched as plain words
+        return " ".join(
+            f'"{term.removesuffix("*")}"*' if term.endswith("*") else f'"{term}"'
+            for term in terms
+        )
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        after: tuple[float, str] | None = None,
+    ) -> list[tuple[str, float]]:
+        terms = self.parse_terms(query)
+        if not terms:
+            return []
+        weights = settings.SEARCH["WEIGHTS"]
+        # bm25 scores are negative, lower is better, so pages continue upwards
+        keyset = (
+            "WHERE rank > :after_rank "
+            "OR (rank = :after_rank AND item_uuid > :after_uuid) "
+            if after
+            else ""
+        )
+        after_rank, after_uuid = after or (None, None)
+        rows = self.session.execute(
+            text(
+                "SELECT item_uuid, rank FROM ("
+                "SELECT d.item_uuid AS item_uuid, "
+                "bm25(item_search, :title_weight, :metadata_weight, :content_weight) "
+                "AS rank "
+                "FROM item_search "
+                "JOIN item_search_document AS d ON d.doc_id = item_search.rowid "
+                "WHERE item_search MATCH :match"
+                f") {keyset}"
+                "ORDER BY rank, item_uuid "
+                "LIMIT :limit"
+            ),
+            {
+                "match": self.to_match_expression(terms),
+                "title_weight": weights["title"],
+                "metadata_weight": weights["metadata"],
+                "content_weight": weights["content"],
+                "after_rank": None if after_rank is None else -after_rank,
+                "after_uuid": after_uuid,
+                "limit": limit,
+            },
+        )
+        # bm25 scores are negative, lower is better; report higher as better
+        return [(item_uuid, -rank) for item_uuid, rank in rows]
+
+
+class PostgresSearchIndex(SearchIndex):
+    """tsvector index, with a GIN index, ranked with ts_rank_cd.
+
+    Title, metadata and content are weighted A, B and C in a single tsvector.
+    """
+
+    @property
+    def config(self) -> str:
+        return settings.SEARCH["POSTGRES_TEXT_SEARCH_CONFIG"]
+
+    def index_documents(self, documents: list[SearchDocument]) -> None:
+        if not documents:
+            return
+        self.session.execute(
+            text(
+                "INSERT INTO item_search (item_uuid, document) VALUES (:item_uuid, "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :title), 'A') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :metadata), 'B') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :content), 'C')) "
+                "ON CONFLICT (item_uuid) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            [
+                {
+                    "config": self.config,
+                    "item_uuid": document.item_uuid,
+                    "title": document.title,
+                    "metadata": document.metadata,
+                    "content": document.content,
+                }
+                for document in documents
+            ],
+        )
+
+    def remove_items(self, item_uuids: list[str]) -> None:
+        if not item_uuids:
+            return
+        self.session.execute(
+            text("DELETE FROM item_search WHERE item_uuid IN :item_uuids").bindparams(
+                bindparam("item_uuids", expanding=True)
+            ),
+            {"item_uuids": item_uuids},
+        )
+
+    def remove_orphans(self) -> None:
+        self.session.execute(
+            text(
+                "DELETE FROM item_search AS s WHERE NOT EXISTS "
+                "(SELECT 1 FROM item WHERE item.item_uuid = s.item_uuid)"
+            )
+        )
+
+    @staticmethod
+    def to_tsquery_expression(terms: list[str]) -> str:
+        return " & ".join(
+            f"{term.removesuffix('*')}:*" if term.endswith("*") else term
+            for term in terms
+        )
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        after: tuple[float, str] | None = None,
+    ) -> list[tuple[str, float]]:
+        terms = self.parse_terms(query)
+        if not terms:
+            return []
+        weights = settings.SEARCH["WEIGHTS"]
+        keyset = (
+            "WHERE rank < :after_rank "
+            "OR (rank = :after_rank AND item_uuid > :after_uuid) "
+            if after
+            else ""
+        )
+        after_rank, after_uuid = after or (None, None)
+        # ts_rank_cd takes weights from 0 to 1, in {D, C, B, A} order
+        top = max(weights.values())
+        rank_weights = "{{0, {}, {}, {}}}".format(
+            *(weights[field] / top for field in ("content", "metadata", "title"))
+        )
+        rows = self.session.execute(
+            text(
+                "SELECT item_uuid, rank FROM ("
+                "SELECT s.item_uuid AS item_uuid, "
+                "ts_rank_cd(CAST(:rank_weights AS float4[]), s.document, q) AS rank "
+                "FROM item_search AS s, "
+                "to_tsquery(CAST(:config AS regconfig), :tsquery) AS q "
+                "WHERE s.document @@ q"
+                f") AS matches {keyset}"
+                "ORDER BY rank DESC, item_uuid "
+                "LIMIT :limit"
+            ),
+            {
+                "rank_weights": rank_weights,
+                "config": self.config,
+                "tsquery": self.to_tsquery_expression(terms),
+                "after_rank": after_rank,
+                "after_uuid": after_uuid,
+                "limit": limit,
+            },
+        )
+        return [(item_uuid, float(rank)) for item_uuid, rank in rows]
@@ -30,6 +30,17 @@ target_metadata = Base.metadata
 config.set_main_option("sqlalchemy.url", settings.DATABASE_CONNECTION_URI)
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # full-text search tables are managed by hand written migrations, see
+    # tidepool/services/db/search.py
+    if type_ == "table" and name.startswith("item_search"):
+        return False
+    # metadata expression indexes are created by `tidepool metadata-ensure-indexes`
+    if type_ == "index" and name.startswith("ix_item_metadata_"):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -48,6 +59,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -68,7 +80,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,52 @@
+"""Add item full-text search index
+
+Revision ID: 8d0824be4401
+Revises: 03f4f0f66887
+Create Date: 2026-10-18 17:32:10.512047
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d0824be4401'
+down_revision: Union[str, None] = '03f4f0f66887'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # maps item_uuid to the integer rowid of the item's FTS5 entry
+    op.create_table('item_search_document',
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('item_uuid', sa.String(length=36), nullable=False),
+    sa.PrimaryKeyConstraint('doc_id')
+    )
+    op.create_index(op.f('ix_item_search_document_item_uuid'), 'item_search_document', ['item_uuid'], unique=True)
+    op.execute(
+        "CREATE VIRTUAL TABLE item_search USING fts5("
+        "title, metadata, content, tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    # index existing items by title and metadata; run `tidepool search-reindex` to
+    # also index the text of their files
+    op.execute(
+        "INSERT INTO item_search_document (item_uuid) SELECT item_uuid FROM item"
+    )
+    op.execute(
+        "INSERT INTO item_search (rowid, title, metadata, content) "
+        "SELECT d.doc_id, coalesce(item.title, ''), "
+        "coalesce((SELECT group_concat(value, ' ') FROM json_tree(item.jsonld_metadata) "
+        "WHERE type IN ('text', 'integer', 'real') "
+        "AND fullkey NOT LIKE '$.\"@context\"%' "
+        "AND (key = '@value' OR key NOT LIKE '@%')), ''), '' "
+        "FROM item JOIN item_search_document AS d ON d.item_uuid = item.item_uuid"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE item_search")
+    op.drop_index(op.f('ix_item_search_document_item_uuid'), table_name='item_search_document')
+    op.drop_table('item_search_document')
@@ -0,0 +1,62 @@
+"""Add composite relationship indexes
+
+Revision ID: 9cf0e71e0822
+Revises: 8d0824be4401
+Create Date: 2026-10-18 17:03:09.301711
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9cf0e71e0822'
+down_revision: Union[str, None] = '8d0824be4401'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # drop incomplete and duplicate relationships, which the new constraints reject
+    op.execute(
+        "DELETE FROM relationship WHERE subject IS NULL OR predicate IS NULL "
+        "OR object IS NULL"
+    )
+    op.execute(
+        "DELETE FROM relationship WHERE relationship_uuid NOT IN ("
+        "SELECT min(relationship_uuid) FROM relationship "
+        "GROUP BY subject, predicate, object)"
+    )
+    with op.batch_alter_table('relationship') as batch_op:
+        batch_op.alter_column('subject',
+               existing_type=sa.VARCHAR(),
+               nullable=False)
+        batch_op.alter_column('predicate',
+               existing_type=sa.VARCHAR(),
+               nullable=False)
+        batch_op.alter_column('object',
+               existing_type=sa.VARCHAR(),
+               nullable=False)
+        batch_op.drop_index(batch_op.f('ix_relationship_object'))
+        batch_op.drop_index(batch_op.f('ix_relationship_subject'))
+        batch_op.create_index('ix_relationship_object_predicate_subject', ['object', 'predicate', 'subject'], unique=False)
+        batch_op.create_index('ix_relationship_subject_predicate_object', ['subject', 'predicate', 'object'], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('relationship') as batch_op:
+        batch_op.drop_index('ix_relationship_subject_predicate_object')
+        batch_op.drop_index('ix_relationship_object_predicate_subject')
+        batch_op.create_index(batch_op.f('ix_relationship_subject'), ['subject'], unique=False)
+        batch_op.create_index(batch_op.f('ix_relationship_object'), ['object'], unique=False)
+        batch_op.alter_column('object',
+               existing_type=sa.VARCHAR(),
+               nullable=True)
+        batch_op.alter_column('predicate',
+               existing_type=sa.VARCHAR(),
+               nullable=True)
+        batch_op.alter_column('subject',
+               existing_type=sa.VARCHAR(),
+               nullable=True)
@@ -1,11 +1,20 @@
 """tidepool/services/storage"""
 
-from tidepool.services.storage.base import StorageService
+from tidepool.services.storage.base import StorageService, StoredObject, copy_file
+from tidepool.services.storage.cache import CachingStorageService
+from tidepool.services.storage.fanout import StorageFanout, StorageResult
 from tidepool.services.storage.posix import POSIXStorageService
+from tidepool.services.storage.router import ReadRouter
 from tidepool.services.storage.s3 import S3StorageService
 
 __all__ = [
     "StorageService",
+    "StoredObject",
+    "copy_file",
+    "CachingStorageService",
+    "StorageFanout",
+    "StorageResult",
     "POSIXStorageService",
+    "ReadRouter",
     "S3StorageService",
 ]
@@ -1,8 +1,13 @@
 """tidepool/services/storage/base.py"""
 
+import datetime
 import logging
+import tempfile
 from abc import abstractmethod
+from collections.abc import Iterator
 from importlib import import_module
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
 
 from tidepool import File
 from tidepool.settings.manager import settings
@@ -10,6 +15,20 @@ from tidepool.settings.manager import settings
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# "uuid": one object per file, at {item_uuid}/{file_uuid}__{filename}
+# "content": one object per distinct content, at blobs/ab/cd/{sha256 digest}
+STORAGE_LAYOUTS = ("uuid", "content")
+
+
+class StoredObject(NamedTuple):
+    """An object found when listing a storage service."""
+
+    key: str
+    size: int
+    last_modified: datetime.datetime
+
 
 class StorageService:
     def __init__(
@@ -19,6 +38,10 @@ class StorageService:
         replication: bool = False,
     ):
         self.config = config
+        if self.layout not in STORAGE_LAYOUTS:
+            raise ValueError(
+                f"Unsupported storage layout for '{self.name}': '{self.layout}'"
+            )
         if not replication:
             self.replication_services: list["StorageService"] = (
                 self.load_replication_storage_services()
@@ -43,11 +66,72 @@ class StorageService:
     def name(self):
         return self.config["NAME"]
 
+    @property
+    def chunk_size(self) -> int:
+        return int(self.config.get("CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+
+    @property
+    def layout(self) -> str:
+        return self.config.get("LAYOUT", "uuid")
+
+    def uses_content_key(self, file: File) -> bool:
+        """True when a file is stored as a blob shared by all files with its content.
+
+        Files saved before a service switched to the content layout have no digest
+        and stay where they are.
+        """
+        return self.layout == "content" and bool(file.content_digest)
+
+    def get_storage_key(self, file: File) -> str:
+        """Return the path of a file within this service, e.g. an S3 object key."""
+        if self.uses_content_key(file):
+            digest = file.content_digest
+            return f"blobs/{digest[:2]}/{digest[2:4]}/{digest}"
+        return f"{file.item_uuid}/{file.file_uuid}__{file.filename}"
+
+    def local_path(self, file: File) -> Path | None:  # noqa: ARG002
+        """Return where a stored file is on local disk, if this service keeps it there.
+
+        Such files can be sent by the operating system or a front-end web server,
+        without passing through Python.
+        """
+        return None
+
+    @abstractmethod
+    def file_exists(
+        self,
+        file: File,
+    ) -> bool: ...
+
+    @abstractmethod
+    def list_keys(
+        self,
+        prefix: str = "",
+    ) -> Iterator[StoredObject]:
+        """Yield every stored object whose key starts with prefix, sorted by key.
+
+        Keys are compared as strings, so listings can be merged with keys computed
+        by get_storage_key.
+        """
+
+    @abstractmethod
+    def delete_key(
+        self,
+        key: str,
+    ) -> bool: ...
+
     @abstractmethod
     def store_file(
         self,
         file: File,
-    ) -> str | None: ...
+    ) -> str | None:
+        """Write a file's data or filepath, returning where it was stored.
+
+        The byte size and checksum of the content are computed in the same pass as
+        the write, and set on the file's size, checksum and checksum_algorithm.
+        None is returned, and nothing written, for a file with neither data nor a
+        filepath.
+        """
 
     @abstractmethod
     def delete_file(
@@ -60,3 +144,65 @@ class StorageService:
         self,
         file: File,
     ) -> bytes: ...
+
+    @abstractmethod
+    def get_file_size(
+        self,
+        file: File,
+    ) -> int: ...
+
+    @abstractmethod
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None,
+    ) -> Iterator[bytes]:
+        """Yield the bytes of a stored file in chunks.
+
+        Args:
+            file: File to read
+            start: first byte offset to read (inclusive)
+            end: byte offset to stop reading at (exclusive); None reads to the end
+            chunk_size: maximum size of each yielded chunk; defaults to the service
+                CHUNK_SIZE config, or 1MB
+        """
+
+
+def iter_file_chunks(
+    f: BinaryIO,
+    start: int,
+    end: int | None,
+    chunk_size: int,
+) -> Iterator[bytes]:
+    """Yield bytes start to end of an open local file, closing it when done."""
+    with f:
+        f.seek(start)
+        remaining = None if end is None else max(end - start, 0)
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def copy_file(source: StorageService, target: StorageService, file: File) -> str | None:
+    """Copy a stored file from one storage service to another.
+
+    The file is streamed from the source through a temporary file, never into
+    memory, and stored on the target under the target's own key.
+    """
+    with tempfile.TemporaryDirectory(prefix="tidepool-copy-") as tmp:
+        filepath = Path(tmp) / "data"
+        with open(filepath, "wb") as f:
+            f.writelines(source.read_file_stream(file))
+        file.data, file.filepath = None, filepath
+        try:
+            return target.store_file(file)
+        finally:
+            file.filepath = None
@@ -0,0 +1,505 @@
+"""tidepool/services/storage/cache.py"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from importlib import import_module
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+from tidepool import File
+from tidepool.services.storage.base import (
+    StorageService,
+    StoredObject,
+    iter_file_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_CACHE = {
+    "MAX_BYTES": 1024 * 1024 * 1024,
+    "MAX_ITEM_BYTES": 100 * 1024 * 1024,
+    "MEMORY_MAX_BYTES": 0,
+    "MEMORY_MAX_ITEM_BYTES": 256 * 1024,
+}
+
+# temporary files left by a process that died mid-fetch are removed after this long
+STALE_TEMP_FILE_SECONDS = 3600
+
+
+class CacheEntry(NamedTuple):
+    """A cached file: the validator it was cached under, and its size."""
+
+    validator: str
+    size: int
+
+
+class CacheFill:
+    """A file being fetched into the cache, readable while it is being written."""
+
+    def __init__(self, temp_path: Path) -> None:
+        self.temp_path = temp_path
+        self.written = 0
+        self.done = False
+        self.error: BaseException | None = None
+        self._condition = threading.Condition()
+
+    def wrote(self, size: int) -> None:
+        with self._condition:
+            self.written += size
+            self._condition.notify_all()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        with self._condition:
+            self.done, self.error = True, error
+            self._condition.notify_all()
+
+    def wait(self, position: int) -> int:
+        """Wait until more than position bytes are written, or the fetch ends.
+
+        Returns how many bytes are written, which is position once the whole file
+        has been read, and raises the error the fetch failed with, if any.
+        """
+        with self._condition:
+            while self.written <= position and not self.done:
+                self._condition.wait()
+            if self.error is not None:
+                raise self.error
+            return self.written
+
+
+class CachingStorageService(StorageService):
+    """Read-through cache in front of another storage service.
+
+    Reads are served from a size-bounded LRU cache on local disk, and optionally
+    from a small in-memory LRU tier for files of up to MEMORY_MAX_ITEM_BYTES.  On a
+    miss for a whole file, one background thread fetches it from the backend into
+    the cache, and every reader that missed, the first and any concurrent ones,
+    streams it from the partly written cache file at its own pace, so a slow reader
+    holds up neither the fetch nor the others.  Missed byte ranges, and files
+    larger than MAX_ITEM_BYTES, are read from the backend directly.
+
+    Entries are keyed by {item_uuid}/{file_uuid} and a validator: the file's
+    checksum, or its size and modification time when it has no checksum.  A file
+    whose content changed is so never served stale, even when it was replaced by
+    another process, and a file with none of these is never cached.  Storing or
+    deleting a file through this service drops its entry.  The index of the disk
+    cache is rebuilt from DIR on startup.
+
+    Config:
+        BACKEND: settings of the wrapped service, {"module", "class", "config"}
+        DIR: directory holding cached files
+        NAME: defaults to the name of the backend
+    """
+
+    def __init__(self, config: dict, *, replication: bool = False) -> None:
+        backend_settings = config["BACKEND"]
+        backend_class = getattr(
+            import_module(backend_settings["module"]),
+            backend_settings["class"],
+        )
+        # replication services are loaded by this service, not the backend
+        self.backend: StorageService = backend_class(
+            config=backend_settings["config"],
+            replication=True,
+        )
+        super().__init__(config, replication=replication)
+        self.cache_config = {**DEFAULT_STORAGE_CACHE, **config}
+        self.cache_dir = Path(os.path.expandvars(self.config["DIR"]))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._disk: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._disk_bytes = 0
+        self._memory: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+        self._memory_bytes = 0
+        # fetches in flight, by the name of the entry they will become
+        self._inflight: dict[str, CacheFill] = {}
+        # bumped by every invalidation, so a fetch that raced one is not cached
+        self._epoch = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bypassed": 0,
+            "evictions": 0,
+        }
+        self._load_index()
+
+    @property
+    def name(self) -> str:
+        return self.config.get("NAME") or self.backend.name
+
+    @property
+    def layout(self) -> str:
+        return self.backend.layout
+
+    @property
+    def chunk_size(self) -> int:
+        if "CHUNK_SIZE" in self.config:
+            return int(self.config["CHUNK_SIZE"])
+        return self.backend.chunk_size
+
+    @staticmethod
+    def cache_key(file: File) -> str:
+        return f"{file.item_uuid}/{file.file_uuid}"
+
+    @classmethod
+    def _key_hash(cls, file: File) -> str:
+        return hashlib.sha256(cls.cache_key(file).encode()).hexdigest()
+
+    @staticmethod
+    def validator(file: File) -> str | None:
+        """Return what a cached copy of a file must have been cached under.
+
+        This is the file's checksum, or else its size and modification time, or
+        None for a file with none of these, which cannot be cached.
+        """
+        if file.checksum:
+            return file.checksum
+        modified = file.date_updated or file.date_created
+        parts = []
+        if file.size is not None:
+            parts.append(f"s{file.size}")
+        if modified is not None:
+            parts.append(f"t{int(modified.timestamp() * 1_000_000)}")
+        return "-".join(parts) or None
+
+    def _entry_path(self, key_hash: str, validator: str) -> Path:
+        return self.cache_dir / key_hash[:2] / f"{key_hash}.{validator}"
+
+    def _load_index(self) -> None:
+        """Index the files already in DIR, least recently modified first."""
+        found = []
+        now = time.time()
+        for path in self.cache_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.startswith("."):
+                if now - stat.st_mtime > STALE_TEMP_FILE_SECONDS:
+                    path.unlink(missing_ok=True)
+                continue
+            key_hash, _, validator = path.name.partition(".")
+            found.append((stat.st_mtime, key_hash, validator, stat.st_size))
+
+        for _, key_hash, validator, size in sorted(found):
+            previous = self._disk.pop(key_hash, None)
+            if previous is not None:
+                self._disk_bytes -= previous.size
+                self._entry_path(key_hash, previous.validator).unlink(missing_ok=True)
+            self._disk[key_hash] = CacheEntry(validator, size)
+            self._disk_bytes += size
+        with self._lock:
+            self._evict()
+        logger.debug(
+            f"storage cache '{self.name}' loaded {len(self._disk)} entries, "
+            f"{self._disk_bytes} bytes"
+        )
+
+    def _is_current(self, validator: str, file: File) -> bool:
+        return validator == self.validator(file)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _get_memory(self, key_hash: str, file: File) -> bytes | None:
+        with self._lock:
+            cached = self._memory.get(key_hash)
+            if cached is None or not self._is_current(cached[0], file):
+                return None
+            self._memory.move_to_end(key_hash)
+            return cached[1]
+
+    def _put_memory(self, key_hash: str, validator: str, data: bytes) -> None:
+        with self._lock:
+            previous = self._memory.pop(key_hash, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous[1])
+            self._memory[key_hash] = (validator, data)
+            self._memory_bytes += len(data)
+            self._evict()
+
+    def _get_disk(self, key_hash: str, file: File) -> tuple[Path, CacheEntry] | None:
+        with self._lock:
+            entry = self._disk.get(key_hash)
+            if entry is None or not self._is_current(entry.validator, file):
+                return None
+            self._disk.move_to_end(key_hash)
+            return self._entry_path(key_hash, entry.validator), entry
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until both tiers fit.  Holds the lock."""
+        while self._disk and self._disk_bytes > self.cache_config["MAX_BYTES"]:
+            key_hash, entry = self._disk.popitem(last=False)
+            self._disk_bytes -= entry.size
+            # readers holding the file open can still finish reading it
+            self._entry_path(key_hash, entry.validator).unlink(missing_ok=True)
+            self._stats["evictions"] += 1
+        while self._memory and self._memory_bytes > self.cache_config["MEMORY_MAX_BYTES"]:
+            _, (_, data) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, file: File) -> None:
+        """Drop a file from the cache."""
+        key_hash = self._key_hash(file)
+        with self._lock:
+            self._epoch += 1
+            entry = self._disk.pop(key_hash, None)
+            if entry is not None:
+                self._disk_bytes -= entry.size
+                self._entry_path(key_hash, entry.validator).unlink(missing_ok=True)
+            cached = self._memory.pop(key_hash, None)
+            if cached is not None:
+                self._memory_bytes -= len(cached[1])
+
+    def _cacheable(self, file: File) -> bool:
+        if self.validator(file) is None:
+            return False
+        size = file.size
+        if size is None:
+            size = self.backend.get_file_size(file)
+        return size <= self.cache_config["MAX_ITEM_BYTES"]
+
+    def _read_through(self, key_hash: str, file: File) -> tuple[CacheFill, BinaryIO]:
+        """Start fetching a file into the cache, or join the fetch in flight.
+
+        Returns the fetch and the partly written file, opened for reading.  It is
+        opened under the lock, before the fetch can rename or remove it.
+        """
+        path = self._entry_path(key_hash, self.validator(file))
+        with self._lock:
+            # only a fetch of the same version of the file is joined
+            fill = self._inflight.get(path.name)
+            if fill is not None:
+                self._stats["coalesced"] += 1
+                return fill, open(fill.temp_path, "rb")
+
+            path.parent.mkdir(exist_ok=True)
+            # written under a temporary name, so a partial file is never indexed
+            temp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+            writer = open(temp_path, "wb")  # noqa: SIM115
+            fill = self._inflight[path.name] = CacheFill(temp_path)
+            reader = open(temp_path, "rb")  # noqa: SIM115
+            epoch = self._epoch
+        threading.Thread(
+            target=self._fill,
+            args=(key_hash, file, fill, writer, epoch),
+            name="tidepool-cache-fill",
+            daemon=True,
+        ).start()
+        return fill, reader
+
+    @staticmethod
+    def _follow(fill: CacheFill, f: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+        """Yield a file being fetched into the cache, as fast as it is written."""
+        with f:
+            position = 0
+            while (written := fill.wait(position)) > position:
+                while position < written:
+                    chunk = f.read(min(chunk_size, written - position))
+                    position += len(chunk)
+                    yield chunk
+
+    def _fill(
+        self,
+        key_hash: str,
+        file: File,
+        fill: CacheFill,
+        f: BinaryIO,
+        epoch: int,
+    ) -> None:
+        """Fetch a file from the backend into the cache, in a thread of its own."""
+        validator = self.validator(file)
+        error = None
+        try:
+            with f:
+                for chunk in self.backend.read_file_stream(file):
+                    f.write(chunk)
+                    # readers only read what is flushed to the file
+                    f.flush()
+                    fill.wrote(len(chunk))
+        except BaseException as exc:  # noqa: BLE001
+            logger.debug(f"could not cache file {file.file_uuid}: {exc!r}")
+            error = exc
+        try:
+            cached = False
+            with self._lock:
+                del self._inflight[self._entry_path(key_hash, validator).name]
+                if error is None:
+                    cached = self._index_fill(key_hash, file, validator, fill, epoch)
+                # readers holding the file open can still finish reading it
+                fill.temp_path.unlink(missing_ok=True)
+            if (
+                cached
+                and self.cache_config["MEMORY_MAX_BYTES"]
+                and fill.written <= self.cache_config["MEMORY_MAX_ITEM_BYTES"]
+            ):
+                path = self._entry_path(key_hash, validator)
+                with contextlib.suppress(FileNotFoundError):
+                    self._put_memory(key_hash, validator, path.read_bytes())
+        finally:
+            # only now, so a file read to its end is cached for the next reader
+            fill.finish(error)
+
+    def _index_fill(
+        self,
+        key_hash: str,
+        file: File,
+        validator: str,
+        fill: CacheFill,
+        epoch: int,
+    ) -> bool:
+        """Move a fetched file into the cache, unless it went stale.  Holds the lock."""
+        size = fill.written
+        if file.size is not None and size != file.size:
+            logger.debug(f"file {file.file_uuid} changed while being cached")
+            return False
+        if epoch != self._epoch:
+            logger.debug(f"file {file.file_uuid} was invalidated while being cached")
+            return False
+        path = self._entry_path(key_hash, validator)
+        os.replace(fill.temp_path, path)
+        previous = self._disk.pop(key_hash, None)
+        if previous is not None:
+            self._disk_bytes -= previous.size
+            if previous.validator != validator:
+                self._entry_path(key_hash, previous.validator).unlink(missing_ok=True)
+        self._disk[key_hash] = CacheEntry(validator, size)
+        self._disk_bytes += size
+        self._evict()
+        return True
+
+    def _open_cached(self, key_hash: str, file: File) -> tuple[BinaryIO, int] | None:
+        """Open a file's disk cache entry, returning it and its size, or None."""
+        cached = self._get_disk(key_hash, file)
+        if cached is None:
+            return None
+        path, entry = cached
+        try:
+            f = open(path, "rb")  # noqa: SIM115
+        except FileNotFoundError:
+            # evicted in the meantime, or removed from DIR by hand
+            with self._lock:
+                if self._disk.get(key_hash) == entry:
+                    del self._disk[key_hash]
+                    self._disk_bytes -= entry.size
+            return None
+        return f, entry.size
+
+    def _promote(self, key_hash: str, file: File, f: BinaryIO, size: int) -> None:
+        if (
+            not self.cache_config["MEMORY_MAX_BYTES"]
+            or size > self.cache_config["MEMORY_MAX_ITEM_BYTES"]
+        ):
+            return
+        f.seek(0)
+        self._put_memory(key_hash, self.validator(file), f.read())
+
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None,
+    ) -> Iterator[bytes]:
+        chunk_size = chunk_size or self.chunk_size
+        key_hash = self._key_hash(file)
+
+        data = self._get_memory(key_hash, file)
+        if data is not None:
+            self._count("memory_hits")
+            data = data[start:end]
+            return iter(
+                [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+            )
+
+        opened = self._open_cached(key_hash, file)
+        if opened is not None:
+            self._count("disk_hits")
+            f, size = opened
+            self._promote(key_hash, file, f, size)
+            return iter_file_chunks(f, start, end, chunk_size)
+
+        if not self._cacheable(file):
+            self._count("bypassed")
+        else:
+            self._count("misses")
+            if start == 0 and end is None:
+                fill, f = self._read_through(key_hash, file)
+                return self._follow(fill, f, chunk_size)
+        return self.backend.read_file_stream(
+            file, start=start, end=end, chunk_size=chunk_size
+        )
+
+    def read_file(self, file: File) -> bytes:
+        return b"".join(self.read_file_stream(file))
+
+    def get_file_size(self, file: File) -> int:
+        key_hash = self._key_hash(file)
+        data = self._get_memory(key_hash, file)
+        if data is not None:
+            return len(data)
+        cached = self._get_disk(key_hash, file)
+        if cached is not None:
+            return cached[1].size
+        return self.backend.get_file_size(file)
+
+    def local_path(self, file: File) -> Path | None:
+        """Return the cached copy of a file, if it is cached, else the backend's."""
+        cached = self._get_disk(self._key_hash(file), file)
+        if cached is not None and cached[0].is_file():
+            self._count("disk_hits")
+            return cached[0]
+        return self.backend.local_path(file)
+
+    def get_cache_stats(self) -> dict:
+        """Hit and miss counts and current size of the cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+            )
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        reads = hits + stats["misses"]
+        stats["hit_ratio"] = round(hits / reads, 4) if reads else None
+        return stats
+
+    def store_file(self, file: File) -> str | None:
+        # dropped again afterwards, in case a read cached the old content meanwhile
+        self.invalidate(file)
+        try:
+            return self.backend.store_file(file)
+        finally:
+            self.invalidate(file)
+
+    def delete_file(self, file: File) -> bool:
+        self.invalidate(file)
+        try:
+            return self.backend.delete_file(file)
+        finally:
+            self.invalidate(file)
+
+    def file_exists(self, file: File) -> bool:
+        return self.backend.file_exists(file)
+
+    def list_keys(self, prefix: str = "") -> Iterator[StoredObject]:
+        return self.backend.list_keys(prefix)
+
+    def delete_key(self, key: str) -> bool:
+        # keys are only deleted for objects no file refers to, so none is cached
+        return self.backend.delete_key(key)
@@ -0,0 +1,122 @@
+"""tidepool/services/storage/fanout.py"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+
+from tidepool import File
+from tidepool.services.storage.base import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StorageResult:
+    """Outcome of a single storage operation for one file on one storage service."""
+
+    action: str
+    service: str
+    file_uuid: str
+    success: bool
+    result: Any = None
+    error: BaseException | None = None
+
+
+class StorageFanout:
+    """Run storage operations for many files against many services concurrently.
+
+    Every (file, service) pair is submitted to a bounded thread pool, so the wall
+    time of writing an item is roughly that of the slowest storage service rather
+    than the sum of all of them.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="tidepool-storage",
+            )
+        return self._executor
+
+    def store_files(
+        self,
+        files: list[File],
+        services: list[StorageService],
+    ) -> list[StorageResult]:
+        return self.run("store", files, services)
+
+    def delete_files(
+        self,
+        files: list[File],
+        services: list[StorageService],
+    ) -> list[StorageResult]:
+        return self.run("delete", files, services)
+
+    def run(
+        self,
+        action: str,
+        files: list[File],
+        services: list[StorageService],
+    ) -> list[StorageResult]:
+        """Apply an action ("store" or "delete") to every file on every service."""
+        return self.run_operations(
+            [(action, file, service) for file in files for service in services]
+        )
+
+    def run_operations(
+        self,
+        operations: list[tuple[str, File, StorageService]],
+    ) -> list[StorageResult]:
+        """Apply (action, file, service) operations concurrently.
+
+        Failures do not stop other operations; each is reported as a StorageResult
+        with success=False and the raised exception.
+        """
+        futures = {}
+        for action, file, service in operations:
+            operation = getattr(service, f"{action}_file")
+            future = self.executor.submit(operation, file)
+            futures[future] = (action, file, service)
+
+        results = []
+        for future in as_completed(futures):
+            action, file, service = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.exception(
+                    f"error during {action} of file {file.file_uuid} on storage "
+                    f"service: {service.name}"
+                )
+                results.append(
+                    StorageResult(
+                        action, service.name, file.file_uuid, success=False, error=exc
+                    )
+                )
+            else:
+                logger.debug(
+                    f"{action} of file {file.file_uuid} succeeded on storage service: "
+                    f"{service.name}"
+                )
+                success = result is not False
+                results.append(
+                    StorageResult(
+                        action,
+                        service.name,
+                        file.file_uuid,
+                        success=success,
+                        result=result,
+                    )
+                )
+        return results
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
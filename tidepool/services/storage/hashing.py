@@ -0,0 +1,98 @@
+"""tidepool/services/storage/hashing.py"""
+
+import hashlib
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+from tidepool import File
+from tidepool.settings.manager import settings
+
+CONTENT_DIGEST_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_source_chunks(file: File, chunk_size: int = HASH_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the bytes of a file about to be stored, from its data or filepath."""
+    if file.data:
+        data = file.data.encode() if isinstance(file.data, str) else file.data
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset : offset + chunk_size]
+    elif file.filepath:
+        with open(file.filepath, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+
+def compute_content_digest(
+    file: File,
+    chunk_size: int = HASH_CHUNK_SIZE,
+    stream_digest: "StreamDigest | None" = None,
+) -> str | None:
+    """Return the hex SHA-256 digest of a file's data or filepath, else None.
+
+    The source is read in chunks, so memory use does not grow with file size.  A
+    stream_digest, if passed, is updated in the same pass.
+    """
+    if not (file.data or file.filepath):
+        return None
+    digest = hashlib.new(CONTENT_DIGEST_ALGORITHM)
+    chunks = iter_source_chunks(file, chunk_size)
+    if stream_digest is not None:
+        chunks = stream_digest.wrap(chunks)
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StreamDigest:
+    """Byte size and checksum of data, updated chunk by chunk as it streams past."""
+
+    def __init__(self, algorithm: str | None = None) -> None:
+        self.algorithm = algorithm or settings.FIXITY["CHECKSUM_ALGORITHM"]
+        self._hash = hashlib.new(self.algorithm)
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield chunks unchanged, digesting each on the way through."""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def apply(self, file: File) -> None:
+        """Record the size and checksum on a file, for saving to FileDB."""
+        file.size = self.size
+        file.checksum = self.hexdigest()
+        file.checksum_algorithm = self.algorithm
+
+
+class DigestReader:
+    """Read-only, non-seekable file object that digests what is read from it.
+
+    Uploaders that accept a file object read it front to back, so the checksum is
+    computed in the same pass as the upload.
+    """
+
+    def __init__(self, fileobj: BinaryIO, digest: StreamDigest) -> None:
+        self.fileobj = fileobj
+        self.digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        self.fileobj.close()
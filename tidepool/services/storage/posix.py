@@ -1,12 +1,21 @@
 """tidepool/services/storage/posix.py"""
 
+import datetime
 import logging
+import mmap
 import os
-import shutil
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
 from pathlib import Path
 
 from tidepool import File
-from tidepool.services.storage.base import StorageService
+from tidepool.services.storage.base import (
+    StorageService,
+    StoredObject,
+    iter_file_chunks,
+)
+from tidepool.services.storage.hashing import StreamDigest, iter_source_chunks
 
 
 logger = logging.getLogger(__name__)
@@ -19,24 +28,87 @@ class POSIXStorageService(StorageService):
         Path(self.data_dir).mkdir(parents=True, exist_ok=True)
 
     def get_file_dir_and_path(self, file: File):
-        file_dir = Path(self.data_dir) / str(file.item_uuid)
-        file_path = file_dir / f"{file.file_uuid}__{file.filename}"
-        return file_dir, file_path
+        file_path = Path(self.data_dir) / self.get_storage_key(file)
+        return file_path.parent, file_path
+
+    def file_exists(self, file: File) -> bool:
+        _, file_path = self.get_file_dir_and_path(file)
+        return file_path.exists()
+
+    def local_path(self, file: File) -> Path | None:
+        _, file_path = self.get_file_dir_and_path(file)
+        return file_path if file_path.is_file() else None
+
+    def list_keys(self, prefix: str = "") -> Iterator[StoredObject]:
+        return self._walk(self.data_dir, "", prefix)
+
+    def _walk(
+        self,
+        directory: str,
+        key_prefix: str,
+        prefix: str,
+    ) -> Iterator[StoredObject]:
+        entries = []
+        with os.scandir(directory) as scanned:
+            for entry in scanned:
+                # skip blobs still being written, see store_file
+                if entry.name.startswith("."):
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                key = key_prefix + entry.name + ("/" if is_dir else "")
+                if key.startswith(prefix) or (is_dir and prefix.startswith(key)):
+                    entries.append((key, entry))
+
+        # a directory sorts by its name and a trailing "/", so that keys are yielded
+        # in the same order as a sort of the full keys
+        entries.sort(key=lambda key_entry: key_entry[0])
+        for key, entry in entries:
+            if key.endswith("/"):
+                yield from self._walk(entry.path, key, prefix)
+            else:
+                stat = entry.stat(follow_symlinks=False)
+                yield StoredObject(
+                    key,
+                    stat.st_size,
+                    datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.UTC),
+                )
+
+    def delete_key(self, key: str) -> bool:
+        file_path = Path(self.data_dir) / key
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            return False
+        logger.debug(f"removed object: {file_path}")
+        return True
 
     def store_file(
         self,
         file: File,
     ) -> str | None:
         file_dir, file_path = self.get_file_dir_and_path(file)
-        file_dir.mkdir(parents=True, exist_ok=True)
-
-        if file.data:
-            with open(file_path, "wb") as f:
-                f.write(file.data)
-        elif file.filepath:
-            shutil.copy(file.filepath, file_path)
-        else:
+        if not (file.data or file.filepath):
             return None
+
+        content_key = self.uses_content_key(file)
+        if content_key and file_path.exists():
+            logger.debug(f"blob already stored, skipping write: {file_path}")
+            return str(file_path)
+
+        file_dir.mkdir(parents=True, exist_ok=True)
+        # blobs are written under a temporary name and renamed into place, so a
+        # partially written blob is never mistaken for a stored one
+        target_path = (
+            file_dir / f".{file_path.name}.{uuid.uuid4().hex}.tmp"
+            if content_key
+            else file_path
+        )
+        digest = StreamDigest()
+        with open(target_path, "wb") as f:
+            f.writelines(digest.wrap(iter_source_chunks(file, self.chunk_size)))
+        digest.apply(file)
+        if content_key:
+            os.replace(target_path, file_path)
         return str(file_path)
 
     def delete_file(
@@ -51,14 +123,121 @@ class POSIXStorageService(StorageService):
             logger.debug(f"error deleting object '{file_path}': {e}")
             return False
 
-        if not os.listdir(file_dir):
+        # blob directories are shared, and may be written to concurrently
+        if not self.uses_content_key(file) and not os.listdir(file_dir):
             os.rmdir(file_dir)
             logger.debug(f"removed item files directory: {file_dir}")
 
         return True
 
-    # TODO: add a streaming version
     def read_file(self, file: File):
         file_dir, file_path = self.get_file_dir_and_path(file)
         with open(file_path, "rb") as f:
             return f.read()
+
+    @contextmanager
+    def read_file_mmap(self, file: File) -> Iterator[memoryview]:
+        """Map a stored file into memory, as a read-only memoryview.
+
+        Pages are read in by the OS as they are touched, so large files can be
+        scanned without being copied onto the heap.  The view is released when the
+        block exits; a slice of it kept past the block keeps the file mapped until
+        the slice itself is released.
+        """
+        _, file_path = self.get_file_dir_and_path(file)
+        with open(file_path, "rb") as f:
+            # an empty file cannot be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+                # slices still exported from the mapping stop it closing here; it
+                # is unmapped once the last of them is dropped
+                with suppress(BufferError):
+                    mapped.close()
+
+    def read_file_into(
+        self,
+        file: File,
+        buffer: bytearray | memoryview,
+        offset: int = 0,
+    ) -> int:
+        """Read a stored file from offset into buffer, returning the bytes read.
+
+        Fewer bytes than len(buffer) are read only at the end of the file.
+        """
+        _, file_path = self.get_file_dir_and_path(file)
+        view = memoryview(buffer).cast("B")
+        total = 0
+        with open(file_path, "rb", buffering=0) as f:
+            f.seek(offset)
+            while total < len(view):
+                read = f.readinto(view[total:])
+                if not read:
+                    break
+                total += read
+        return total
+
+    def read_file_chunks(
+        self,
+        file: File,
+        *,
+        buffer: bytearray | None = None,
+        start: int = 0,
+        end: int | None = None,
+    ) -> Iterator[memoryview]:
+        """Yield a stored file in chunks read into one reused buffer.
+
+        Each chunk is a memoryview of the buffer, so it is only valid until the next
+        one is read; copy it with bytes() to keep it.  The buffer is allocated with
+        the service's CHUNK_SIZE unless one is passed.
+        """
+        _, file_path = self.get_file_dir_and_path(file)
+        buffer = buffer if buffer is not None else bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        # open eagerly, so a missing file raises here and not on first iteration
+        f = open(file_path, "rb", buffering=0)  # noqa: SIM115
+        return self._iter_chunks_into(f, view, start, end)
+
+    @staticmethod
+    def _iter_chunks_into(
+        f,  # noqa: ANN001
+        view: memoryview,
+        start: int,
+        end: int | None,
+    ) -> Iterator[memoryview]:
+        with f:
+            f.seek(start)
+            remaining = None if end is None else max(end - start, 0)
+            while remaining is None or remaining > 0:
+                size = len(view) if remaining is None else min(len(view), remaining)
+                read = f.readinto(view[:size])
+                if not read:
+                    break
+                if remaining is not None:
+                    remaining -= read
+                yield view[:read]
+
+    def get_file_size(self, file: File) -> int:
+        _, file_path = self.get_file_dir_and_path(file)
+        return os.stat(file_path).st_size
+
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None,
+    ) -> Iterator[bytes]:
+        _, file_path = self.get_file_dir_and_path(file)
+        chunk_size = chunk_size or self.chunk_size
+
+        # open eagerly, so a missing file raises here and not on first iteration
+        f = open(file_path, "rb")  # noqa: SIM115
+        return iter_file_chunks(f, start, end, chunk_size)
@@ -0,0 +1,381 @@
+"""tidepool/services/storage/router.py"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Collection, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import chain
+from typing import TypeVar
+
+from tidepool import File
+from tidepool.services.storage.base import StorageService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_READ_ROUTING = {
+    "HEDGE_PERCENTILE": 95,
+    "HEDGE_MIN_DELAY_MS": 10,
+    "HEDGE_DEFAULT_DELAY_MS": 100,
+    "MAX_HEDGED_REQUESTS": 1,
+    "WINDOW_SECONDS": 300,
+    "WINDOW_SIZE": 200,
+    "MIN_SAMPLES": 20,
+    "FAILURE_THRESHOLD": 5,
+    "COOLDOWN_SECONDS": 30,
+    "MAX_WORKERS": 16,
+}
+
+
+def is_missing_error(exc: BaseException) -> bool:
+    """True when a read failed only because the service does not have the file.
+
+    A replica may not have a file yet, e.g. with write-behind replication, which
+    says nothing about the health of the service.
+    """
+    if isinstance(exc, FileNotFoundError):
+        return True
+    # botocore errors carry the parsed response, which may be None
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey")
+
+
+class ServiceHealth:
+    """Recent read latencies and outcomes of one storage service.
+
+    Samples older than window_seconds are dropped, so a service that was slow or
+    failing is measured afresh once it has been left alone for a while.  After
+    failure_threshold consecutive failures the service's circuit opens, and it is
+    tried only after every other service until cooldown_seconds have passed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window_seconds: float = 300,
+        window_size: int = 200,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 30,
+    ) -> None:
+        self.name = name
+        self.window_seconds = window_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        # (monotonic time, latency in seconds or None for a failure)
+        self._samples: deque[tuple[float, float | None]] = deque(maxlen=window_size)
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), latency))
+            self._consecutive_failures = 0
+            self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._samples.append((now, None))
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self._open_until = now + self.cooldown_seconds
+
+    def _recent(self) -> list[float | None]:
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            return [latency for at, latency in self._samples if at >= cutoff]
+
+    @property
+    def circuit_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def latencies(self) -> list[float]:
+        return [latency for latency in self._recent() if latency is not None]
+
+    def latency_percentile(self, percentile: float) -> float | None:
+        latencies = self.latencies()
+        if not latencies:
+            return None
+        if len(latencies) == 1:
+            return latencies[0]
+        return statistics.quantiles(latencies, n=100, method="inclusive")[
+            min(max(int(percentile), 1), 99) - 1
+        ]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(latency is None for latency in recent) / len(recent)
+
+    def to_dict(self) -> dict:
+        p50, p95 = self.latency_percentile(50), self.latency_percentile(95)
+        return {
+            "samples": len(self._recent()),
+            "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 3),
+            "error_rate": round(self.error_rate(), 4),
+            "circuit_open": self.circuit_open,
+        }
+
+
+class ReadRouter:
+    """Route file reads to the healthiest storage service, hedging slow reads.
+
+    Services are ranked by recent median time to first byte, penalized by their
+    error rate, with services whose circuit is open last; ties keep the order
+    given, so the primary is preferred until there is evidence against it.
+
+    A read goes to the best ranked service.  If it has not returned its first chunk
+    within the HEDGE_PERCENTILE latency of that service, a hedged request is sent
+    to the next service, and whichever answers first is used.  Failed reads fail
+    over to the remaining services, and a stream that fails part way resumes from
+    the same offset on another service.
+
+    Reads can exclude services by name, e.g. replicas that do not yet hold the
+    current content of a file.
+    """
+
+    def __init__(
+        self,
+        services: list[StorageService],
+        config: dict | None = None,
+    ) -> None:
+        self.services = services
+        self.config = {**DEFAULT_READ_ROUTING, **(config or {})}
+        self.health = {
+            service.name: ServiceHealth(
+                service.name,
+                window_seconds=float(self.config["WINDOW_SECONDS"]),
+                window_size=int(self.config["WINDOW_SIZE"]),
+                failure_threshold=int(self.config["FAILURE_THRESHOLD"]),
+                cooldown_seconds=float(self.config["COOLDOWN_SECONDS"]),
+            )
+            for service in services
+        }
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(self.config["MAX_WORKERS"]),
+                        thread_name_prefix="tidepool-read",
+                    )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def ranked_services(self) -> list[StorageService]:
+        default_latency = self.config["HEDGE_DEFAULT_DELAY_MS"] / 1000
+
+        def rank(service: StorageService) -> tuple[bool, float]:
+            health = self.health[service.name]
+            median = health.latency_percentile(50)
+            if median is None or len(health.latencies()) < self.config["MIN_SAMPLES"]:
+                median = default_latency
+            return health.circuit_open, median * (1 + 10 * health.error_rate())
+
+        return sorted(self.services, key=rank)
+
+    def hedge_delay(self, service: StorageService) -> float:
+        """Seconds to wait for a service before sending a hedged request."""
+        health = self.health[service.name]
+        delay = None
+        if len(health.latencies()) >= self.config["MIN_SAMPLES"]:
+            delay = health.latency_percentile(self.config["HEDGE_PERCENTILE"])
+        if delay is None:
+            return self.config["HEDGE_DEFAULT_DELAY_MS"] / 1000
+        return max(delay, self.config["HEDGE_MIN_DELAY_MS"] / 1000)
+
+    def get_health(self) -> dict[str, dict]:
+        return {name: health.to_dict() for name, health in self.health.items()}
+
+    def _record(
+        self,
+        service: StorageService,
+        started: float,
+        exc: BaseException | None,
+    ) -> None:
+        if exc is None:
+            self.health[service.name].record_success(time.monotonic() - started)
+        elif not is_missing_error(exc):
+            self.health[service.name].record_failure()
+
+    def _open_stream(
+        self,
+        service: StorageService,
+        file: File,
+        start: int,
+        end: int | None,
+    ) -> tuple[bytes, Iterator[bytes]]:
+        """Start reading from a service, returning its first chunk and the rest."""
+        started = time.monotonic()
+        try:
+            chunks = service.read_file_stream(file, start=start, end=end)
+            first_chunk = next(chunks, b"")
+        except Exception as exc:
+            self._record(service, started, exc)
+            raise
+        self._record(service, started, None)
+        return first_chunk, chunks
+
+    @staticmethod
+    def _close_unused(future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, chunks = future.result()
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+    def _open_hedged(
+        self,
+        file: File,
+        start: int,
+        end: int | None,
+        exclude: set[str],
+    ) -> tuple[bytes, Iterator[bytes], StorageService]:
+        candidates = [
+            service for service in self.ranked_services() if service.name not in exclude
+        ]
+        if not candidates:
+            raise FileNotFoundError(f"no storage service left to read {file.file_uuid}")
+
+        pending: dict[Future, StorageService] = {}
+        launched, hedges, errors = 0, 0, []
+
+        def launch() -> None:
+            nonlocal launched
+            service = candidates[launched]
+            launched += 1
+            future = self.executor.submit(self._open_stream, service, file, start, end)
+            pending[future] = service
+
+        launch()
+        while pending:
+            can_hedge = (
+                hedges < self.config["MAX_HEDGED_REQUESTS"]
+                and launched < len(candidates)
+            )
+            timeout = self.hedge_delay(candidates[launched - 1]) if can_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges += 1
+                logger.debug(
+                    f"hedging read of file {file.file_uuid} to "
+                    f"'{candidates[launched].name}'"
+                )
+                launch()
+                continue
+
+            for future in done:
+                service = pending.pop(future)
+                try:
+                    first_chunk, chunks = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    logger.debug(
+                        f"read of file {file.file_uuid} failed on '{service.name}': "
+                        f"{exc!r}"
+                    )
+                    errors.append(exc)
+                    continue
+                for other in pending:
+                    other.add_done_callback(self._close_unused)
+                return first_chunk, chunks, service
+
+            if not pending and launched < len(candidates):
+                launch()
+
+        raise errors[-1]
+
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+        exclude: Collection[str] = (),
+    ) -> Iterator[bytes]:
+        """Stream a file from the best ranked service not named in exclude."""
+        first_chunk, chunks, service = self._open_hedged(file, start, end, set(exclude))
+        return self._failover_stream(
+            file,
+            start,
+            end,
+            first_chunk=first_chunk,
+            chunks=chunks,
+            service=service,
+            exclude=exclude,
+        )
+
+    def _failover_stream(
+        self,
+        file: File,
+        start: int,
+        end: int | None,
+        *,
+        first_chunk: bytes,
+        chunks: Iterator[bytes],
+        service: StorageService,
+        exclude: Collection[str] = (),
+    ) -> Iterator[bytes]:
+        position = start
+        tried = {*exclude, service.name}
+        while True:
+            try:
+                for chunk in chain([first_chunk], chunks):
+                    if chunk:
+                        position += len(chunk)
+                        yield chunk
+            except Exception:
+                logger.exception(
+                    f"read of file {file.file_uuid} failed on '{service.name}' at "
+                    f"byte {position}, failing over"
+                )
+                self.health[service.name].record_failure()
+                first_chunk, chunks, service = self._open_hedged(
+                    file, position, end, tried
+                )
+                tried.add(service.name)
+            else:
+                return
+
+    def read_file(self, file: File, *, exclude: Collection[str] = ()) -> bytes:
+        return b"".join(self.read_file_stream(file, exclude=exclude))
+
+    def call(
+        self,
+        operation: Callable[[StorageService], T],
+        *,
+        exclude: Collection[str] = (),
+    ) -> T:
+        """Run an operation on the best ranked service, failing over on errors."""
+        error: BaseException = FileNotFoundError("no storage service left")
+        for service in self.ranked_services():
+            if service.name in exclude:
+                continue
+            started = time.monotonic()
+            try:
+                result = operation(service)
+            except Exception as exc:  # noqa: BLE001
+                self._record(service, started, exc)
+                error = exc
+                continue
+            self._record(service, started, None)
+            return result
+        raise error
+
+    def get_file_size(self, file: File, *, exclude: Collection[str] = ()) -> int:
+        return self.call(lambda service: service.get_file_size(file), exclude=exclude)
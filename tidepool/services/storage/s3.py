@@ -2,61 +2,143 @@
 
 import io
 import logging
+import threading
+from collections.abc import Iterator
 from typing import TYPE_CHECKING, BinaryIO
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import BotoCoreError, ClientError
 from botocore.response import StreamingBody
 
 from tidepool import File
-from tidepool.services.storage.base import StorageService
+from tidepool.services.storage.base import StorageService, StoredObject
+from tidepool.services.storage.hashing import DigestReader, StreamDigest
 
 if TYPE_CHECKING:
     from botocore.client import BaseClient
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
 
 class S3StorageService(StorageService):
     def __init__(self, config: dict, *, replication: bool = False) -> None:
         super().__init__(config, replication=replication)
+        self._s3_client: S3Client | None = None
+        self._s3_client_lock = threading.Lock()
+
+    def get_s3_client(self) -> "S3Client":
+        """Return the long-lived S3Client owned by this storage service.
+
+        The client, and its HTTP connection pool, is created on first use and then
+        shared by all operations; boto3 clients are safe to use across threads.
+        """
+        if self._s3_client is None:
+            with self._s3_client_lock:
+                if self._s3_client is None:
+                    self._s3_client = S3Client(
+                        self.config["BUCKET"],
+                        self.config["REGION"],
+                        self.config["ACCESS_KEY_ID"],
+                        self.config["SECRET_ACCESS_KEY"],
+                        endpoint_url=self.config.get("ENDPOINT"),
+                        transfer_config=self.get_transfer_config(),
+                        client_config=self.get_client_config(),
+                    )
+        return self._s3_client
 
-    def get_s3_client(self):
-        return S3Client(
-            self.config["BUCKET"],
-            self.config["REGION"],
-            self.config["ACCESS_KEY_ID"],
-            self.config["SECRET_ACCESS_KEY"],
-            endpoint_url=self.config.get("ENDPOINT"),
+    def get_client_config(self) -> BotoConfig:
+        """Build HTTP connection pool, keep-alive and retry settings from the config.
+
+        Optional config keys:
+            MAX_POOL_CONNECTIONS: size of the HTTP connection pool (default 50)
+            TCP_KEEPALIVE: enable TCP keep-alive on pooled connections (default True)
+            CONNECT_TIMEOUT: seconds to wait for a connection (default 10)
+            READ_TIMEOUT: seconds to wait for a response (default 60)
+            RETRY_MAX_ATTEMPTS: maximum attempts for a request (default 5)
+            RETRY_MODE: botocore retry mode, "standard" or "adaptive" (default
+                "standard")
+        """
+        return BotoConfig(
+            max_pool_connections=int(self.config.get("MAX_POOL_CONNECTIONS", 50)),
+            tcp_keepalive=bool(self.config.get("TCP_KEEPALIVE", True)),
+            connect_timeout=self.config.get("CONNECT_TIMEOUT", 10),
+            read_timeout=self.config.get("READ_TIMEOUT", 60),
+            retries={
+                "max_attempts": int(self.config.get("RETRY_MAX_ATTEMPTS", 5)),
+                "mode": self.config.get("RETRY_MODE", "standard"),
+            },
         )
 
-    def get_s3_key(self, file: File):
-        return f"{file.item_uuid}/{file.file_uuid}__{file.filename}"
+    def get_transfer_config(self) -> TransferConfig:
+        """Build multipart transfer settings from the service config.
+
+        Optional config keys:
+            MULTIPART_THRESHOLD: file size in bytes at which uploads switch to
+                multipart (default 8MB)
+            MULTIPART_PART_SIZE: size in bytes of each uploaded part (default 8MB)
+            MULTIPART_CONCURRENCY: number of parts uploaded in parallel (default 10)
+        """
+        return TransferConfig(
+            multipart_threshold=int(self.config.get("MULTIPART_THRESHOLD", 8 * MB)),
+            multipart_chunksize=int(self.config.get("MULTIPART_PART_SIZE", 8 * MB)),
+            max_concurrency=int(self.config.get("MULTIPART_CONCURRENCY", 10)),
+            use_threads=True,
+        )
+
+    def file_exists(self, file: File) -> bool:
+        return self.get_s3_client().exists(self.get_storage_key(file))
+
+    def list_keys(self, prefix: str = "") -> Iterator[StoredObject]:
+        for obj in self.get_s3_client().list_objects(prefix):
+            yield StoredObject(obj["Key"], int(obj["Size"]), obj["LastModified"])
+
+    def delete_key(self, key: str) -> bool:
+        self.get_s3_client().delete(key)
+        return True
 
     def store_file(
         self,
         file: File,
     ) -> str | None:
         s3client = self.get_s3_client()
-        s3_key = self.get_s3_key(file)
+        s3_key = self.get_storage_key(file)
+        mimetype = file.mimetype or "application/octet-stream"
+
+        has_source = bool(file.data or file.filepath)
+        if has_source and self.uses_content_key(file) and s3client.exists(s3_key):
+            logger.debug(f"blob already stored, skipping upload: {s3_key}")
+            return f"s3://{s3client.bucket}/{s3_key}"
 
+        digest = StreamDigest()
         if file.data:
             data = file.data
+            if isinstance(data, str):
+                data = data.encode()
+            location = s3client.upload(
+                s3_key, DigestReader(io.BytesIO(data), digest), mimetype=mimetype
+            )
         elif file.filepath:
-            # TODO: improve with streaming
+            # the file is read once, front to back, digesting each part as it is
+            # uploaded; parts are still sent concurrently, never the whole file
             with open(file.filepath, "rb") as f:
-                data = f.read()
+                location = s3client.upload(
+                    s3_key, DigestReader(f, digest), mimetype=mimetype
+                )
         else:
             return None
-
-        return s3client.upload(s3_key, data)
+        digest.apply(file)
+        return location
 
     def delete_file(
         self,
         file: File,
     ) -> bool:
         s3client = self.get_s3_client()
-        s3_key = self.get_s3_key(file)
+        s3_key = self.get_storage_key(file)
         s3client.delete(s3_key)
         return True
 
@@ -65,9 +147,42 @@ class S3StorageService(StorageService):
         file: File,
     ) -> bytes:
         s3client = self.get_s3_client()
-        s3_key = self.get_s3_key(file)
+        s3_key = self.get_storage_key(file)
         return s3client.read(s3_key)
 
+    def get_file_size(
+        self,
+        file: File,
+    ) -> int:
+        s3client = self.get_s3_client()
+        s3_key = self.get_storage_key(file)
+        return s3client.size(s3_key)
+
+    def read_file_stream(
+        self,
+        file: File,
+        *,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None,
+    ) -> Iterator[bytes]:
+        if end is not None and end <= start:
+            return iter(())
+        s3client = self.get_s3_client()
+        s3_key = self.get_storage_key(file)
+        byte_range = None
+        if start or end is not None:
+            byte_range = (start, None if end is None else end - 1)
+        stream = s3client.read_stream(s3_key, byte_range=byte_range)
+        return self._iter_stream_chunks(stream, chunk_size or self.chunk_size)
+
+    @staticmethod
+    def _iter_stream_chunks(stream: StreamingBody, chunk_size: int) -> Iterator[bytes]:
+        try:
+            yield from stream.iter_chunks(chunk_size=chunk_size)
+        finally:
+            stream.close()
+
 
 class S3Client:
     def __init__(
@@ -76,16 +191,22 @@ class S3Client:
         region_name: str,
         aws_access_key_id: str,
         aws_secret_access_key: str,
+        *,
         endpoint_url: str | None = None,
+        transfer_config: TransferConfig | None = None,
+        client_config: BotoConfig | None = None,
     ) -> None:
         """Initialize the S3 client."""
         self.bucket: str = bucket
-        self.s3: BaseClient = boto3.client(
+        self.transfer_config = transfer_config or TransferConfig()
+        # a dedicated session, as the default boto3 session is not thread-safe
+        self.s3: BaseClient = boto3.session.Session().client(
             "s3",
             region_name=region_name,
             endpoint_url=endpoint_url,
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
+            config=client_config,
         )
 
     def upload(
@@ -108,35 +229,83 @@ class S3Client:
                 Bucket=self.bucket,
                 Key=key,
                 ExtraArgs={"ContentType": mimetype},
+                Config=self.transfer_config,
             )
-            logger.debug(
-                f"Successfully uploaded object '{key}' to bucket '{self.bucket}'."
-            )
-            return f"s3://{self.bucket}/{key}"
-
         except (BotoCoreError, ClientError) as error:
             logger.debug(f"Error uploading object: {error}")
             raise
+        logger.debug(f"Successfully uploaded object '{key}' to bucket '{self.bucket}'.")
+        return f"s3://{self.bucket}/{key}"
 
     def read(self, key: str) -> bytes:
         """Read an object from the S3 bucket and return its contents as bytes."""
         try:
             response = self.s3.get_object(Bucket=self.bucket, Key=key)
             data: bytes = response["Body"].read()
-            return data
         except (BotoCoreError, ClientError) as error:
             logger.debug(f"error reading object '{key}': {error}")
             raise
+        return data
+
+    def read_stream(
+        self,
+        key: str,
+        byte_range: tuple[int, int | None] | None = None,
+    ) -> StreamingBody:
+        """Read an object from the S3 bucket and return a streaming object.
 
-    def read_stream(self, key: str) -> StreamingBody:
-        """Read an object from the S3 bucket and return a streaming object."""
+        Args:
+            key: S3 object key
+            byte_range: optional (first, last) byte positions to read, both inclusive
+                as with an HTTP Range header; a last position of None reads to the end
+        """
+        kwargs = {}
+        if byte_range is not None:
+            first, last = byte_range
+            kwargs["Range"] = f"bytes={first}-{'' if last is None else last}"
         try:
-            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+            response = self.s3.get_object(Bucket=self.bucket, Key=key, **kwargs)
             stream: StreamingBody = response["Body"]
-            return stream
         except (BotoCoreError, ClientError) as error:
             logger.debug(f"error reading object '{key}' as stream: {error}")
             raise
+        return stream
+
+    def exists(self, key: str) -> bool:
+        """Return True if an object exists in the S3 bucket."""
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            logger.debug(f"error checking for object '{key}': {error}")
+            raise
+        except BotoCoreError as error:
+            logger.debug(f"error checking for object '{key}': {error}")
+            raise
+        return True
+
+    def list_objects(self, prefix: str = "") -> Iterator[dict]:
+        """Yield the objects under a prefix, a page of list_objects_v2 at a time.
+
+        S3 returns keys in ascending order of their UTF-8 bytes.
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        try:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                yield from page.get("Contents", [])
+        except (BotoCoreError, ClientError) as error:
+            logger.debug(f"error listing objects under '{prefix}': {error}")
+            raise
+
+    def size(self, key: str) -> int:
+        """Return the size in bytes of an object in the S3 bucket."""
+        try:
+            response = self.s3.head_object(Bucket=self.bucket, Key=key)
+            return int(response["ContentLength"])
+        except (BotoCoreError, ClientError) as error:
+            logger.debug(f"error reading size of object '{key}': {error}")
+            raise
 
     def delete(self, key: str) -> None:
         """Delete an object from the S3 bucket."""
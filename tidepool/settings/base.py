@@ -43,16 +43,56 @@ DATABASE_CONNECTION_URI = os.environ.get(
     "TIDEPOOL_SQLITE_DB_CONNECTION_STRING",
     f"sqlite:///{os.path.join(DATABASE['DATA_DIR'], DATABASE['NAME'])}",
 )
+DATABASE_ENGINE_OPTIONS = {
+    # one engine and connection pool is shared per DATABASE_CONNECTION_URI
+    "pool_size": int(os.environ.get("TIDEPOOL_DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.environ.get("TIDEPOOL_DB_POOL_MAX_OVERFLOW", "10")),
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+    "pool_recycle": int(os.environ.get("TIDEPOOL_DB_POOL_RECYCLE", "1800")),
+}
+
+# top-level JSON-LD metadata properties queried often enough to index; create the
+# indexes with `tidepool metadata-ensure-indexes`
+METADATA_INDEXED_PROPERTIES = [
+    "dc:title",
+    "dc:creator",
+    "schema:dateCreated",
+]
+
+# maximum hops followed by relationship traversals
+RELATIONSHIP_TRAVERSAL_MAX_DEPTH = 25
 
 
 # -------------------------------------------------------------------
 # File Storage
 # -------------------------------------------------------------------
+# every storage service config accepts a "LAYOUT":
+#   - "uuid" (default): one object per file, at {item_uuid}/{file_uuid}__{filename}
+#   - "content": files are hashed as they are saved and stored once per distinct
+#     content, at blobs/ab/cd/{sha256}; a blob already on a service is not sent
+#     again, and is deleted only when no file references it
+# any storage service can be put behind a local read-through cache by wrapping its
+# settings; reads are then served from an LRU cache of up to MAX_BYTES in DIR, plus
+# an in-memory tier of up to MEMORY_MAX_BYTES (0 disables it) for small files:
+#   {
+#       "module": "tidepool.services.storage",
+#       "class": "CachingStorageService",
+#       "config": {
+#           "DIR": "$HOME/.tidepool/cache",
+#           "MAX_BYTES": 10 * 1024**3,
+#           "MAX_ITEM_BYTES": 100 * 1024**2,
+#           "MEMORY_MAX_BYTES": 64 * 1024**2,
+#           "MEMORY_MAX_ITEM_BYTES": 256 * 1024,
+#           "BACKEND": {"module": ..., "class": "S3StorageService", "config": ...},
+#       },
+#   }
 PRIMARY_STORAGE_SERVICE = {
     "module": "tidepool.services.storage",
     "class": "POSIXStorageService",
     "config": {
         "NAME": "primary local filesystem storage",
+        "LAYOUT": os.environ.get("TIDEPOOL_STORAGE_LAYOUT", "uuid"),
         "DATA_DIR": os.environ.get(
             "TIDEPOOL_POSIX_DATA_DIR", "$HOME/.tidepool/posix/data"
         ),
@@ -104,11 +144,113 @@ REPLICATION_STORAGE_SERVICES = [
     # },
 ]
 
+# maximum number of concurrent file writes/deletes across all storage services
+STORAGE_FANOUT_MAX_WORKERS = int(
+    os.environ.get("TIDEPOOL_STORAGE_FANOUT_MAX_WORKERS", "8")
+)
+
+# how files reach REPLICATION_STORAGE_SERVICES:
+#   - "sync": written to every replication service during save_item
+#   - "async": write-behind; save_item writes only to the primary and records
+#     replication tasks, which are drained by `tidepool replication-worker`
+REPLICATION_MODE = os.environ.get("TIDEPOOL_REPLICATION_MODE", "sync")
+REPLICATION_WORKER = {
+    "BATCH_SIZE": 100,
+    "CONCURRENCY_PER_SERVICE": 4,
+    "MAX_ATTEMPTS": 10,
+    "BACKOFF_BASE_SECONDS": 5,
+    "BACKOFF_MAX_SECONDS": 3600,
+    "LEASE_SECONDS": 300,
+    "POLL_INTERVAL_SECONDS": 5,
+}
+
+
+# -------------------------------------------------------------------
+# Fixity
+# -------------------------------------------------------------------
+# the size and checksum of every file are recorded as it is stored, and checked by
+# `tidepool fixity-audit`, which re-reads files from every storage service
+FIXITY = {
+    # any hashlib algorithm, e.g. "sha256", "sha512" or "blake2b"
+    "CHECKSUM_ALGORITHM": "sha256",
+    "AUDIT_WORKERS": 4,
+    "AUDIT_BATCH_SIZE": 100,
+    # shared by all audit workers, to leave I/O for everything else; 0 for no limit
+    "AUDIT_MAX_BYTES_PER_SECOND": 50 * 1024 * 1024,
+}
+# reads go to the healthiest of the primary and replication storage services, by
+# recent time to first byte and error rate; a read slower than HEDGE_PERCENTILE of
+# its service's latency is hedged with a second request to the next service, and
+# failed reads fail over to the others; replicas with unfinished write-behind
+# replication tasks for a file are never read from; when disabled, or without
+# replication storage services, every read goes straight to the primary
+READ_ROUTING = {
+    "ENABLED": os.environ.get("TIDEPOOL_READ_ROUTING_ENABLED", "true").lower()
+    == "true",
+    "HEDGE_PERCENTILE": 95,
+    "HEDGE_MIN_DELAY_MS": 10,
+    # used until a service has MIN_SAMPLES latencies within WINDOW_SECONDS
+    "HEDGE_DEFAULT_DELAY_MS": 100,
+    "MAX_HEDGED_REQUESTS": 1,
+    "WINDOW_SECONDS": 300,
+    "WINDOW_SIZE": 200,
+    "MIN_SAMPLES": 20,
+    # consecutive failures after which a service is tried last, for COOLDOWN_SECONDS
+    "FAILURE_THRESHOLD": 5,
+    "COOLDOWN_SECONDS": 30,
+    "MAX_WORKERS": 16,
+}
+
+
+# `tidepool reconcile` compares the file table with every storage service, in
+# parallel partitions of PREFIX_LENGTH (1 or 2) leading hex digits of item UUIDs
+# and content digests; objects modified in the last EXTRA_GRACE_SECONDS are never
+# reported as extra, as they may belong to a save still in progress
+RECONCILE = {
+    "WORKERS": 8,
+    "PREFIX_LENGTH": 2,
+    "EXTRA_GRACE_SECONDS": 3600,
+}
+
 
 # -------------------------------------------------------------------
 # Full-Text Search
 # -------------------------------------------------------------------
-# TODO...
+# items are indexed in the database itself: an FTS5 table on SQLite, a tsvector
+# column with a GIN index on Postgres
+SEARCH = {
+    "ENABLED": os.environ.get("TIDEPOOL_SEARCH_ENABLED", "true").lower() == "true",
+    # index the text of files with these mimetypes; "type/*" matches any subtype
+    "INDEX_FILE_TEXT": True,
+    "TEXT_MIMETYPES": [
+        "text/*",
+        "application/json",
+        "application/ld+json",
+        "application/xml",
+    ],
+    "MAX_TEXT_BYTES": 1_000_000,
+    # relative weight of matches in each field when ranking results
+    "WEIGHTS": {"title": 10.0, "metadata": 4.0, "content": 1.0},
+    "POSTGRES_TEXT_SEARCH_CONFIG": "english",
+    "REINDEX_BATCH_SIZE": 500,
+    "REINDEX_WORKERS": 4,
+}
+
+
+# -------------------------------------------------------------------
+# JSON-LD
+# -------------------------------------------------------------------
+# local context documents, by context URL, served in addition to the bundled copy
+# of the schema.org context, e.g. {"https://w3id.org/example": "/path/to/context.json"}
+JSONLD_CONTEXT_FILES = {}
+# fetch other context URLs over HTTP; when False, unknown remote contexts are an error
+JSONLD_ALLOW_REMOTE_CONTEXTS = (
+    os.environ.get("TIDEPOOL_JSONLD_ALLOW_REMOTE_CONTEXTS", "false").lower() == "true"
+)
+JSONLD_CONTEXT_CACHE = {
+    "MAX_ENTRIES": 256,
+    "TTL_SECONDS": 86_400,
+}
 
 
 # -------------------------------------------------------------------
@@ -119,6 +261,29 @@ API_PORT = 5000
 API_DEBUG = True
 API_BASE_URI = f"http://{API_HOST}:{API_PORT}/api"
 
+# Cache-Control sent by each API route, by endpoint name; these responses also
+# carry an ETag and Last-Modified, and are answered with 304 Not Modified when the
+# client's copy is current, checked without loading the item or reading storage
+API_CACHE_CONTROL = {
+    "items_item": "no-cache",
+    "items_item_files": "no-cache",
+    "items_item_files_file": "no-cache",
+    "item_file_data": "no-cache",
+}
+
+# how item_file_data sends files the primary storage service keeps on local disk:
+#   - "sendfile": from the open file, with sendfile(2) where the WSGI server
+#     supports it, e.g. gunicorn
+#   - "x-accel-redirect": nginx sends the file, from an internal location at
+#     X_ACCEL_REDIRECT_PREFIX aliased to X_ACCEL_REDIRECT_ROOT
+#   - "x-sendfile": Apache mod_xsendfile, or another server, sends the file
+#   - "stream": read in chunks through the storage services, like remote files
+API_FILE_SERVING = {
+    "MODE": os.environ.get("TIDEPOOL_API_FILE_SERVING_MODE", "sendfile"),
+    "X_ACCEL_REDIRECT_PREFIX": "/_tidepool/files/",
+    "X_ACCEL_REDIRECT_ROOT": PRIMARY_STORAGE_SERVICE["config"].get("DATA_DIR"),
+}
+
 
 # -------------------------------------------------------------------
 # UI
@@ -25,7 +25,7 @@ def before_request():
 
     api_url = f"{settings.API_BASE_URI}/{api_path}".removesuffix("/")
     logger.debug(api_url)
-    api_response = requests.get(api_url)
+    api_response = requests.get(api_url, params=request.args)
     logger.debug(f"API response: {api_response.status_code}")
     try:
         g.api = api_response.json()